@@ -1,11 +1,17 @@
-from .power_analysis import power_analysis
-from .power_analysis_workers import anova_oneway_simulation, plsda_simulation
-from .simulateLogNormal import simulateLogNormal
+from .power_analysis import power_analysis, find_sample_size
+from .power_analysis_workers import anova_oneway_simulation, plsda_simulation, oplsda_simulation, pls_simulation
+from .simulateLogNormal import simulateLogNormal, sparse_correlation
+from .multiple_testing import adjust_pvalues
+from .power_results import PowerAnalysisResults
+from .simulation_cache import cached_simulateLogNormal, simulation_cache_key
+from .instrumentation import PowerAnalysisMonitor
 
 __version__ = '0.1'
 
-__all__ = ['power_analysis', 'anova_oneway_simulation',
-           'simulateLogNormal', 'plsda_simulation']
+__all__ = ['power_analysis', 'find_sample_size', 'anova_oneway_simulation',
+           'simulateLogNormal', 'sparse_correlation', 'plsda_simulation',
+           'cached_simulateLogNormal', 'simulation_cache_key', 'adjust_pvalues',
+           'PowerAnalysisResults', 'PowerAnalysisMonitor', 'oplsda_simulation', 'pls_simulation']
 
 """
 
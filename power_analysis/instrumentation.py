@@ -0,0 +1,134 @@
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is then not reported
+    resource = None
+
+"""
+Progress, timing and memory instrumentation for the parallel simulation workers. Each worker task is timed in the
+worker process, and the parent process turns the task measurements into progress events (with throughput and
+estimated time remaining) and a summary of the whole run.
+"""
+
+
+def peak_rss():
+    """
+    Peak resident set size of the current process in bytes, or None if it is not available.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return int(maxrss)
+    return int(maxrss) * 1024
+
+
+def measure_task(function, *args, **kwargs):
+    """
+
+    Call function and measure its wall time and the peak memory of the process running it.
+
+    :param function: Function to call
+    :return: The return value of function, and a dictionary with the 'wall_time' in seconds and the 'peak_rss'
+    in bytes of the process (the peak over the life of the worker process, which can be reused between tasks)
+    :rtype: tuple
+    """
+    start = time.perf_counter()
+    output = function(*args, **kwargs)
+    return output, {'wall_time': time.perf_counter() - start, 'peak_rss': peak_rss()}
+
+
+def _repeats_run(output):
+    # Number of Monte Carlo repeats run by a worker, over all the effect and sample sizes
+    if isinstance(output, tuple):
+        output = output[0]
+    if 'Repeats' in output:
+        return int(np.sum(output['Repeats']))
+    return int(output['Effect Size'].size * output['Sample Size'].size * output['True Positive Rate'].shape[2])
+
+
+class PowerAnalysisMonitor:
+    """
+
+    Event log for a set of simulation worker tasks (one per variable). Every finished task produces an event
+    dictionary with:
+
+        - 'variable', 'wall_time' (seconds), 'peak_rss' (bytes) and 'neighbourhood_size' (number of variables
+          modified together with it) of the task
+        - 'cells' and 'repeats': effect and sample size combinations and Monte Carlo repeats run by the task
+        - 'completed' and 'total' tasks, 'cells_completed', the 'elapsed' time since the start, the throughput in
+          'repeats_per_second' and the estimated time remaining, 'eta' (seconds)
+
+    :param int n_tasks: Total number of tasks
+    :param callback: Function called with each event as tasks finish, for example to report progress
+    """
+
+    def __init__(self, n_tasks, callback=None):
+        self.n_tasks = n_tasks
+        self.callback = callback
+        self.events = list()
+        self._start = time.perf_counter()
+        self._repeats = 0
+        self._cells = 0
+
+    def task_done(self, variable, output, task_stats):
+        """
+
+        Record a finished task and call the callback.
+
+        :param int variable: Variable simulated by the task
+        :param output: Output of the simulation worker
+        :param dict task_stats: Measurements made in the worker, see :py:func:`measure_task`
+        :return: The event
+        :rtype: dict
+        """
+        reference = output[0] if isinstance(output, tuple) else output
+        cells = int(reference['Effect Size'].size * reference['Sample Size'].size)
+        repeats = _repeats_run(output)
+        self._cells += cells
+        self._repeats += repeats
+
+        elapsed = time.perf_counter() - self._start
+        completed = len(self.events) + 1
+        event = {'variable': int(variable), 'wall_time': task_stats['wall_time'],
+                 'peak_rss': task_stats['peak_rss'], 'neighbourhood_size': task_stats.get('neighbourhood_size', None),
+                 'cells': cells, 'repeats': repeats, 'completed': completed, 'total': self.n_tasks,
+                 'cells_completed': self._cells, 'elapsed': elapsed,
+                 'repeats_per_second': self._repeats / elapsed if elapsed > 0 else np.inf,
+                 'eta': elapsed / completed * (self.n_tasks - completed)}
+        self.events.append(event)
+        if self.callback is not None:
+            self.callback(event)
+        return event
+
+    def summary(self, n_slowest=5):
+        """
+
+        Summary of the run, with plain python types so it can be stored as JSON.
+
+        :param int n_slowest: Number of slowest tasks listed
+        :return: Dictionary with the number of 'tasks', total 'wall_time', summed 'task_time' over the workers,
+        'repeats', 'cells', 'repeats_per_second', the largest worker 'peak_rss', the 'slowest' tasks (variable,
+        wall time and neighbourhood size), and the 'task_wall_time' and 'neighbourhood_size' of every task in the
+        order of 'variables'
+        :rtype: dict
+        """
+        wall_time = time.perf_counter() - self._start
+        task_time = float(sum(event['wall_time'] for event in self.events))
+        rss = [event['peak_rss'] for event in self.events if event['peak_rss'] is not None]
+        slowest = sorted(self.events, key=lambda event: event['wall_time'], reverse=True)[:n_slowest]
+        return {'tasks': len(self.events), 'wall_time': wall_time, 'task_time': task_time,
+                'repeats': self._repeats, 'cells': self._cells,
+                'repeats_per_second': self._repeats / wall_time if wall_time > 0 else None,
+                'peak_rss': max(rss) if rss else None,
+                'slowest': [{'variable': event['variable'], 'wall_time': event['wall_time'],
+                             'neighbourhood_size': event['neighbourhood_size']} for event in slowest],
+                'variables': [event['variable'] for event in self.events],
+                'task_wall_time': [event['wall_time'] for event in self.events],
+                'neighbourhood_size': [event['neighbourhood_size'] for event in self.events]}
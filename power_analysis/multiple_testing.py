@@ -0,0 +1,107 @@
+import numpy as np
+from statsmodels.stats.multitest import multipletests
+
+"""
+Batched multiple testing correction of p-values. Equivalent to calling statsmodels' multipletests on each
+row of a p-value matrix, but with a single argsort and cumulative pass for the whole matrix. The other
+statsmodels methods are applied row by row with multipletests.
+"""
+
+# Methods corrected in a single batched pass
+correction_methods = ['bonferroni', 'holm', 'fdr_bh', 'fdr_by']
+
+
+def check_method(method):
+    """
+    Raise a ValueError if method is neither a batched correction method nor a method accepted by statsmodels'
+    multipletests.
+    """
+    if method in correction_methods:
+        return
+    try:
+        multipletests(np.array([0.5]), method=method)
+    except ValueError:
+        raise ValueError('Unknown multiple testing correction method')
+
+
+def _multipletests_rows(pvals_2d, missing, method):
+    """
+    Adjust each row of pvals_2d with statsmodels' multipletests, leaving out the missing p-values.
+    """
+    adjusted = np.full(pvals_2d.shape, np.nan)
+    for row in range(pvals_2d.shape[0]):
+        valid = ~missing[row]
+        if np.any(valid):
+            adjusted[row, valid] = multipletests(pvals_2d[row, valid], method=method)[1]
+    return adjusted
+
+
+def adjust_pvalues(pvals, method='fdr_by', axis=-1):
+    """
+
+    Adjust p-values for multiple testing along one axis of an array. Each 1D slice along `axis` is treated as an
+    independent family of tests. NaN p-values are left as NaN and do not count towards the number of tests.
+
+    :param numpy.ndarray pvals: Array of p-values, for example [n_repeats, n_variables].
+    :param str method: Correction method. Allowed methods are:
+        - bonferroni: Bonferroni family-wise error rate correction
+        - holm: Holm step-down family-wise error rate correction
+        - fdr_bh: Benjamini-Hochberg false discovery rate correction
+        - fdr_by (default): Benjamini-Yekutieli false discovery rate correction
+    These are calculated for all the families at once. Any other method of statsmodels' multipletests (for example
+    sidak, hommel or fdr_tsbh) is applied to each family in turn.
+    :param int axis: Axis along which the tests are corrected.
+    :return: Adjusted p-values, with the same shape as pvals.
+    :rtype: numpy.ndarray
+    """
+    try:
+        check_method(method)
+
+        pvals = np.asarray(pvals, dtype=float)
+        # Work on a 2D [n_families, n_tests] view
+        moved = np.moveaxis(pvals, axis, -1)
+        pvals_2d = moved.reshape(-1, moved.shape[-1])
+        n_families, n_tests = pvals_2d.shape
+
+        missing = np.isnan(pvals_2d)
+        # Number of (non missing) tests per family
+        n_valid = (n_tests - missing.sum(axis=1))[:, None]
+
+        if method not in correction_methods:
+            adjusted = _multipletests_rows(pvals_2d, missing, method)
+        elif method == 'bonferroni':
+            adjusted = np.minimum(pvals_2d * n_valid, 1)
+        else:
+            # Sort every family at once, missing values go last
+            order = np.argsort(pvals_2d, axis=1)
+            sorted_pvals = np.take_along_axis(pvals_2d, order, axis=1)
+            sorted_missing = np.take_along_axis(missing, order, axis=1)
+            rank = np.arange(1, n_tests + 1)[None, :]
+
+            if method == 'holm':
+                sorted_adj = sorted_pvals * (n_valid - rank + 1)
+                sorted_adj[sorted_missing] = 0
+                sorted_adj = np.maximum.accumulate(sorted_adj, axis=1)
+            else:
+                sorted_adj = sorted_pvals * n_valid / rank
+                if method == 'fdr_by':
+                    # Harmonic sum of the number of tests in each family
+                    harmonic = np.concatenate([[0], np.cumsum(1. / np.arange(1, n_tests + 1))])
+                    sorted_adj *= harmonic[n_valid]
+                sorted_adj[sorted_missing] = np.inf
+                sorted_adj = np.minimum.accumulate(sorted_adj[:, ::-1], axis=1)[:, ::-1]
+
+            sorted_adj = np.minimum(sorted_adj, 1)
+            adjusted = np.empty_like(sorted_adj)
+            np.put_along_axis(adjusted, order, sorted_adj, axis=1)
+
+        adjusted[missing] = np.nan
+
+        return np.moveaxis(adjusted.reshape(moved.shape), -1, axis)
+
+    except TypeError as terp:
+        raise terp
+    except ValueError as verr:
+        raise verr
+    except Exception as exp:
+        raise exp
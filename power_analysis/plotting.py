@@ -2,6 +2,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.collections import LineCollection
 
+from .power_results import PowerAnalysisResults
+
 # Define a labeling convention
 metric_label = {'True Positive Rate': 'Power', 'False Positive Rate': 'False Positive Rate',
                 'True Negative Rate': 'True Negative Rate', 'False Negative Rate': 'False Negative Rate',
@@ -16,7 +18,10 @@ def plot_metric_curve(analysis_output, metric='True Positive Rate',
                      fixed_sample_size=100, sd=2):
     """
 
-    :param analysis_output:
+    Plot a metric against sample size (or effect size). The curve is the mean over the variables of each variable's
+    mean metric, and the error bars are sd times the mean standard deviation over the variables, truncated to [0, 1].
+
+    :param analysis_output: Output of power_analysis, a PowerAnalysisResults object or a list of worker outputs
     :param metric:
     :param plot_multiple_testing:
     :param fixed_effect_size:
@@ -25,32 +30,28 @@ def plot_metric_curve(analysis_output, metric='True Positive Rate',
     :return:
     """
 
-    if plot_multiple_testing is True:
-        results_idx = 1
-    else:
-        results_idx = 0
+    analysis_output = PowerAnalysisResults.from_output(analysis_output)
+    means_metric = analysis_output.mean(metric, corrected=plot_multiple_testing)
+    stdev_metric = analysis_output.std(metric, corrected=plot_multiple_testing)
 
+    # Average over all the variables
     if fixed_effect_size is not None:
-        eff_index = np.where(analysis_output[0][0]['Effect Size'] == fixed_effect_size)[0]
-        means_metric = np.array([np.nanmean(analysis_output[x][results_idx][metric], axis=2)[eff_index, :] for x in range(len(analysis_output))])
-        stdev_metric = np.array([np.nanstd(analysis_output[x][results_idx][metric], axis=2)[eff_index, :] for x in range(len(analysis_output))])
-        x = analysis_output[0][0]['Sample Size']
-        y = np.nanstd(means_metric, axis=1)
-        y_err = np.nanmean(stdev_metric, axis=1) * sd
+        eff_index = np.where(analysis_output.effect_size == fixed_effect_size)[0]
+        x = analysis_output.sample_size
+        y = np.nanmean(means_metric[:, eff_index, :], axis=(0, 1))
+        y_err = np.nanmean(stdev_metric[:, eff_index, :], axis=(0, 1)) * sd
         x_lab = 'Sample Size'
 
     elif fixed_sample_size is not None:
-        samp_index = np.where(analysis_output[0][0]['Sample Size'] == fixed_sample_size)[0]
-        means_metric = np.array([np.nanmean(analysis_output[x][results_idx][metric], axis=2)[:, samp_index] for x in range(len(analysis_output))])
-        stdev_metric = np.array([np.nanstd(analysis_output[x][results_idx][metric], axis=2)[:, samp_index] for x in range(len(analysis_output))])
-        x = analysis_output[0][0]['Effect Size']
-        y = np.nanmean(means_metric, axis=0)
-        y_err = np.nanmean(stdev_metric, 0) * sd
-        # Truncate negative values for confidence intervals
+        samp_index = np.where(analysis_output.sample_size == fixed_sample_size)[0]
+        x = analysis_output.effect_size
+        y = np.nanmean(means_metric[:, :, samp_index], axis=(0, 2))
+        y_err = np.nanmean(stdev_metric[:, :, samp_index], axis=(0, 2)) * sd
         x_lab = 'Effect Size'
 
-    lower_error = np.amax(np.c_[y - y_err, np.zeros(y.size)])
-    upper_error = np.amin(np.c_[y + y_err, np.ones(y.size)])
+    # Truncate the error bars to the [0, 1] range of the metrics
+    lower_error = y - np.maximum(y - y_err, 0)
+    upper_error = np.minimum(y + y_err, 1) - y
     error_bar = [lower_error, upper_error]
     fig, ax = plt.subplots()
     ax.errorbar(x=x, y=y, yerr=error_bar)
@@ -63,7 +64,7 @@ def plot_metric_heatmap(analysis_output, which_var, metric='True Positive Rate',
                        plot_multiple_testing=False, interpolation='bicubic', contour_level=0.8):
     """
 
-    :param analysis_output:
+    :param analysis_output: Output of power_analysis, a PowerAnalysisResults object or a list of worker outputs
     :param which_var:
     :param metric:
     :param plot_multiple_testing:
@@ -72,25 +73,15 @@ def plot_metric_heatmap(analysis_output, which_var, metric='True Positive Rate',
     :return:
     """
 
-    if plot_multiple_testing is True:
-        results_idx = 1
-    else:
-        results_idx = 0
+    analysis_output = PowerAnalysisResults.from_output(analysis_output)
 
     fig, ax = plt.subplots()
 
-    if (len(analysis_output[0])) == 2:
-        means_metric = np.nanmean(analysis_output[which_var][results_idx][metric], axis=2)
-        n_samp_size = len(analysis_output[which_var][results_idx]['Sample Size'])
-        samp_size = analysis_output[which_var][results_idx]['Sample Size']
-        n_eff_size = len(analysis_output[which_var][results_idx]['Effect Size'])
-        eff_size = analysis_output[which_var][results_idx]['Effect Size']
-    else:
-        means_metric = np.nanmean(analysis_output[which_var][metric], axis=2)
-        n_samp_size = len(analysis_output[which_var]['Sample Size'])
-        samp_size = analysis_output[which_var]['Sample Size']
-        n_eff_size = len(analysis_output[which_var]['Effect Size'])
-        eff_size = analysis_output[which_var]['Effect Size']
+    means_metric = analysis_output.mean(metric, corrected=plot_multiple_testing)[which_var]
+    samp_size = analysis_output.sample_size
+    n_samp_size = samp_size.size
+    eff_size = analysis_output.effect_size
+    n_eff_size = eff_size.size
     color_norm = plt.Normalize(0, 1)
     heatmap = ax.imshow(means_metric, interpolation=interpolation, cmap='jet', norm=color_norm)
     if contour_level is not None:
@@ -111,7 +102,7 @@ def plot_metric_heatmap(analysis_output, which_var, metric='True Positive Rate',
 def plot_metric_spectrum(analysis_output, ref_spectrum, xvar, metric='True Positive Rate', plot_multiple_testing=False):
     """
 
-    :param analysis_output:
+    :param analysis_output: Output of power_analysis, a PowerAnalysisResults object or a list of worker outputs
     :param ref_spectrum:
     :param xvar:
     :param metric:
@@ -119,14 +110,11 @@ def plot_metric_spectrum(analysis_output, ref_spectrum, xvar, metric='True Posit
     :return:
     """
 
-    if plot_multiple_testing is True:
-        results_idx = 1
-    else:
-        results_idx = 0
+    analysis_output = PowerAnalysisResults.from_output(analysis_output)
 
     points = np.array([xvar, ref_spectrum]).T.reshape(-1, 1, 2)
     segments = np.concatenate([points[:-1], points[1:]], axis=1)
-    metric_value = np.array([np.nanmean(analysis_output[x][results_idx][metric], axis=2) for x in range(len(analysis_output))]).squeeze()
+    metric_value = analysis_output.mean(metric, corrected=plot_multiple_testing).squeeze()
 
     fig, ax = plt.subplots()
 
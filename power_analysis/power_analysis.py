@@ -1,20 +1,106 @@
-import os
-import shutil
-import tempfile
-
-
-
-from joblib import load, dump, Parallel, delayed
 from joblib import Parallel, delayed
 import numpy as np
+from scipy import sparse
+from sklearn.isotonic import IsotonicRegression
+from pyChemometrics.parallel_utils import thread_budget, call_with_thread_limit, SharedArrays, attach_shared_arrays
 
-from .simulateLogNormal import simulateLogNormal
-from .power_analysis_workers import anova_oneway_simulation, plsda_simulation
+from .simulation_cache import cached_simulateLogNormal
+from .power_results import PowerAnalysisResults
+from .power_analysis_workers import power_analysis_types
+from .scoreResults import binomial_ci_width
+from .instrumentation import PowerAnalysisMonitor, measure_task
 import warnings
 
 
+def _simulate_data(data, fakedata_size, weight_threshold, seed=None, cache_dir=None,
+                   max_cache_size=2 * 1024 ** 3, **kwargs):
+    """
+    Simulate the data used by all workers.
+
+    :return: The simulated data and the sparse thresholded correlation matrix.
+    """
+    ##Simulation of a new data set based on multivariate normal distribution
+    # add option here
+    # Only the correlations above the threshold are used by the workers, so the dense p x p matrix is not needed
+    simulated_data, correlation_matrix = cached_simulateLogNormal(data, 'Estimate', fakedata_size, seed=seed,
+                                                                  cache_dir=cache_dir,
+                                                                  max_cache_size=max_cache_size,
+                                                                  correlation_threshold=weight_threshold,
+                                                                  **kwargs)
+
+    return simulated_data, correlation_matrix
+
+
+def _share_simulation(shared, simulated_data, correlation_matrix):
+    """
+    Place the simulated data, the correlation matrix and the standard deviation of each variable in shared memory,
+    where the workers attach them.
+    """
+    shared.add('data', simulated_data)
+    shared.add('correlation', correlation_matrix)
+    # Population standard deviations used to standardize the effect sizes, computed once for all workers
+    shared.add('column_std', np.std(simulated_data, axis=0))
+    return shared.handles
+
+
+def _call_worker(worker, inner_threads, handles, variable, **worker_kwargs):
+    # Runs in the worker process: attach the shared arrays without copying them and run the simulation
+    with attach_shared_arrays(handles) as shared:
+        weight_values = shared['correlation'][:, variable]
+        output, task_stats = measure_task(call_with_thread_limit, worker, inner_threads, data=shared['data'],
+                                          variables=variable, modification_type='correlation',
+                                          weight_values=weight_values, column_std=shared['column_std'],
+                                          **worker_kwargs)
+        # Number of variables modified together with this one, large neighbourhoods make slow tasks
+        if sparse.issparse(weight_values):
+            task_stats['neighbourhood_size'] = int(weight_values.count_nonzero())
+        else:
+            task_stats['neighbourhood_size'] = int(np.sum(abs(weight_values) >=
+                                                          worker_kwargs.get('weight_threshold', 0.8)))
+        return output, task_stats
+
+
+def _run_workers(model, handles, variables_to_calculate, n_jobs=-1, inner_threads=None, verbose=0,
+                 callback=None, **worker_kwargs):
+    """
+    Run the simulation worker for the model in parallel - each worker will handle 1 variable.
+    The BLAS/OpenMP threads of each worker are limited according to the thread budget, and each task is timed.
+
+    :param dict handles: Handles of the shared simulated data and correlation matrix
+    :param int verbose: Verbosity of joblib. Off by default, progress is reported through the callback.
+    :param callback: Function called with the progress event of each finished task, see
+    :py:class:`PowerAnalysisMonitor`
+    :return: Results for all variables, with the summary of the run in the run_summary attribute
+    :rtype: PowerAnalysisResults
+    """
+    if model not in power_analysis_types:
+        raise ValueError("Unknown model type")
+    worker = power_analysis_types[model]
+    variables_to_calculate = list(variables_to_calculate)
+
+    budget = thread_budget(n_jobs, inner_threads, n_tasks=len(variables_to_calculate))
+
+    monitor = PowerAnalysisMonitor(len(variables_to_calculate), callback=callback)
+    # Tasks are returned as they finish (in order), so progress is reported during the run
+    tasks = Parallel(n_jobs=budget['n_jobs'], verbose=verbose, return_as='generator')(
+        delayed(_call_worker)(worker, budget['inner_threads'], handles, variable, **worker_kwargs)
+        for variable in variables_to_calculate)
+
+    output = list()
+    for variable, (var_output, task_stats) in zip(variables_to_calculate, tasks):
+        monitor.task_done(variable, var_output, task_stats)
+        output.append(var_output)
+
+    results = PowerAnalysisResults.from_output(output, variables=variables_to_calculate)
+    results.thread_budget = budget
+    results.run_summary = monitor.summary()
+    return results
+
+
 def power_analysis(data, effect_size, sample_size, alpha=0.05, model='ANOVA', simmodel='lognormal',
-                   fakedata_size=5000, n_repeats=10, variables_to_calculate=None, n_jobs=-1, **kwargs):
+                   fakedata_size=5000, n_repeats=10, variables_to_calculate=None, n_jobs=-1, weight_threshold=0.8,
+                   seed=None, cache_dir=None, max_cache_size=2 * 1024 ** 3, repeat_tolerance=None, repeat_batch=10,
+                   inner_threads=None, callback=None, **kwargs):
     """
 
     :param data:
@@ -26,9 +112,29 @@ def power_analysis(data, effect_size, sample_size, alpha=0.05, model='ANOVA', si
     :param fakedata_size:
     :param n_repeats:
     :param variables_to_calculate:
-    :param n_jobs:
+    :param int n_jobs: Number of worker processes. Negative values count back from the number of cores, as in joblib.
+    :param float weight_threshold: Absolute correlation threshold used to select the variables modified together
+    with each variable. Only correlations above this threshold are computed and kept (as a sparse matrix).
+    :param int seed: Seed used to simulate the data.
+    :param str cache_dir: Optional directory to cache the simulated data and correlation matrix. Requires a seed.
+    Later calls with the same data, fakedata_size and seed reuse the cached simulation instead of recomputing it.
+    :param int max_cache_size: Maximum size of the cache in bytes, least recently used simulations are removed first.
+    :param float repeat_tolerance: Enables adaptive Monte Carlo repeats. Each effect and sample size combination is
+    repeated in batches of repeat_batch until the binomial confidence interval of the target metric ('True Positive
+    Rate' by default, see the `target_metric` worker argument) is narrower than repeat_tolerance, with n_repeats as
+    the maximum. The number of repeats run per combination is reported under the 'Repeats' key of the results.
+    :param int repeat_batch: Number of repeats run between convergence checks in adaptive mode.
+    :param int inner_threads: Number of BLAS/OpenMP threads in each worker process. By default the cores are split
+    between the worker processes so they do not oversubscribe the machine. The split used is stored in the
+    thread_budget attribute of the results.
+    :param callback: Function called with a progress event (a dictionary with the wall time, peak memory and
+    correlation neighbourhood size of the task, the completed tasks, repeats per second and estimated time
+    remaining) every time a variable is finished. See :py:class:`PowerAnalysisMonitor`. A summary of the run is
+    stored in the run_summary attribute of the results.
     :param kwargs:
-    :return:
+    :return: Results for all variables. Indexing it with a variable position gives the output of the simulation
+    worker for that variable.
+    :rtype: PowerAnalysisResults
     """
     try:
 
@@ -39,51 +145,166 @@ def power_analysis(data, effect_size, sample_size, alpha=0.05, model='ANOVA', si
 
         n_vars = data.shape[1]
         # Generate the simulated data
+        simulated_data, correlation_matrix = _simulate_data(data, fakedata_size, weight_threshold, seed=seed,
+                                                            cache_dir=cache_dir, max_cache_size=max_cache_size,
+                                                            **kwargs)
+
+        if variables_to_calculate is None:
+            variables_to_calculate = range(n_vars)
+
+        # The shared memory is released when the with block exits, even if a worker fails
+        with SharedArrays() as shared:
+            handles = _share_simulation(shared, simulated_data, correlation_matrix)
+            results = _run_workers(model, handles, variables_to_calculate, n_jobs=n_jobs,
+                                   inner_threads=inner_threads, effect_size=effect_size, sample_size=sample_size,
+                                   alpha=alpha, n_repeats=n_repeats, weight_threshold=weight_threshold,
+                                   repeat_tolerance=repeat_tolerance, repeat_batch=repeat_batch,
+                                   callback=callback, **kwargs)
+
+        return results
+
+    except TypeError as terp:
+        raise terp
+    except ValueError as verr:
+        raise verr
+    except Exception as exp:
+        raise exp
+
+
+def _first_crossing(sample_sizes, curve, target):
+    """
+    Sample size where a monotone increasing curve first reaches the target, linearly interpolated between the
+    evaluated sample sizes. NaN if the target is never reached.
+    """
+    above = np.where(curve >= target)[0]
+    if above.size == 0:
+        return np.nan
+    first = above[0]
+    if first == 0 or curve[first] == curve[first - 1]:
+        return float(sample_sizes[first])
+    fraction = (target - curve[first - 1]) / (curve[first] - curve[first - 1])
+    return float(sample_sizes[first - 1] + fraction * (sample_sizes[first] - sample_sizes[first - 1]))
 
-        ##Simulation of a new data set based on multivariate normal distribution
-        # add option here
-        simulated_data, correlation_matrix = simulateLogNormal(data, 'Estimate', fakedata_size, **kwargs)
 
+def find_sample_size(data, effect_size, target_power=0.8, alpha=0.05, model='ANOVA', metric='True Positive Rate',
+                     corrected=False, min_sample_size=10, max_sample_size=None, tolerance=1, fakedata_size=5000,
+                     n_repeats=50, variables_to_calculate=None, confidence=0.95, n_jobs=-1, weight_threshold=0.8,
+                     seed=None, cache_dir=None, max_cache_size=2 * 1024 ** 3, inner_threads=None, callback=None,
+                     **kwargs):
+    """
 
-        # Generate a shared memory array to avoid duplicating the simulated data
-        temp_folder = tempfile.mkdtemp()
-        data_fname = os.path.join(temp_folder, 'simdata_mmap.mmap')
+    Find the smallest sample size that reaches a target power (or any other metric) for a fixed effect size, with a
+    bisection search over the sample size instead of a full grid of sample sizes.
 
-        if os.path.exists(data_fname):
-            os.unlink(data_fname)
-        dump(simulated_data, data_fname)
-        simdata_memmap = load(data_fname, mmap_mode='r+')
+    The data is simulated once and reused at every step. Each step runs the simulation workers at a single sample
+    size, and the power curve is made monotone (isotonic regression over all evaluated sample sizes) before deciding
+    in which half the target lies, so Monte Carlo noise does not send the bisection the wrong way.
 
+    :param numpy.ndarray data: Reference data matrix [n_samples, n_features]
+    :param float effect_size: Effect size to test
+    :param float target_power: Target value of the metric
+    :param float alpha: Significance threshold
+    :param str model: Type of model, one of the keys of `power_analysis_types`
+    :param str metric: Metric used as power, averaged over the variables and repeats
+    :param bool corrected: Use the multiple testing corrected results
+    :param int min_sample_size: Smallest sample size considered
+    :param int max_sample_size: Largest sample size considered. Defaults to half of fakedata_size
+    :param int tolerance: The search stops when the bracket around the sample size is this narrow
+    :param int fakedata_size: Number of simulated samples
+    :param int n_repeats: Number of Monte Carlo repeats at each evaluated sample size
+    :param variables_to_calculate: Variables to which the effect is added. Defaults to all
+    :param float confidence: Confidence level of the interval for the sample size
+    :param int n_jobs: Number of parallel jobs
+    :param int inner_threads: See :py:func:`power_analysis`
+    :param callback: See :py:func:`power_analysis`. Progress is reported separately for each evaluated sample size
+    :param float weight_threshold: See :py:func:`power_analysis`
+    :param int seed: See :py:func:`power_analysis`
+    :param str cache_dir: See :py:func:`power_analysis`
+    :param int max_cache_size: See :py:func:`power_analysis`
+    :param kwargs: Keyword arguments passed to the simulation workers
+    :return: Dictionary with the estimated 'Sample Size' (linearly interpolated between the evaluated sample sizes,
+    NaN if the target is not reached at max_sample_size), its 'Confidence Interval', and the 'Evaluated Sample Sizes' with their raw 'Power', 'Smoothed Power' and 'Trials'.
+    The split of the cores between processes and threads is under 'Thread Budget', and the summary of the run at
+    each evaluated sample size under 'Run Summary'.
+    :rtype: dict
+    """
+    try:
+        if max_sample_size is None:
+            max_sample_size = fakedata_size // 2
+        if min_sample_size < 4 or min_sample_size >= max_sample_size:
+            raise ValueError("min_sample_size must be at least 4 and smaller than max_sample_size")
+        if 2 * max_sample_size >= fakedata_size:
+            fakedata_size = max_sample_size + 500
+
+        n_vars = data.shape[1]
+        simulated_data, correlation_matrix = _simulate_data(data, fakedata_size, weight_threshold, seed=seed,
+                                                            cache_dir=cache_dir, max_cache_size=max_cache_size,
+                                                            **kwargs)
         if variables_to_calculate is None:
             variables_to_calculate = range(n_vars)
 
-        # Run the simulation in parallel - each worker will handle 1 variable
-        if model == 'ANOVA':
-            output = Parallel(n_jobs=n_jobs, verbose=10)(delayed(anova_oneway_simulation)(data=simdata_memmap,
-                                                                                          variables=variable,
-                                                                                          effect_size=effect_size,
-                                                                                          sample_size=sample_size,
-                                                                                          alpha=alpha, n_repeats=n_repeats,
-                                                                                          modification_type='correlation',
-                                                                                          weight_values=correlation_matrix[:, variable],
-                                                                                          weight_threshold=0.8, **kwargs) for variable in variables_to_calculate)
-        elif model == 'PLS-DA':
-            output = Parallel(n_jobs=n_jobs, verbose=10)(delayed(plsda_simulation)(data=simdata_memmap,
-                                                                                variables=variable,
-                                                                                effect_size=effect_size,
-                                                                                sample_size=sample_size,
-                                                                                alpha=alpha, n_repeats=n_repeats,
-                                                                                modification_type='correlation',
-                                                                                weight_values=correlation_matrix[:, variable],
-                                                                                weight_threshold=0.8, **kwargs) for variable in variables_to_calculate)
-    # Remove the temporary directory used to
-        # store the memmaps
-        try:
-            shutil.rmtree(temp_folder)
-        except OSError:
-            pass
-
-        return output
+        # Mean metric value and number of valid values for each evaluated sample size
+        evaluated = dict()
+        budget = dict()
+        run_summary = dict()
+
+        def evaluate(sample_size):
+            if sample_size not in evaluated:
+                results = _run_workers(model, handles, variables_to_calculate, n_jobs=n_jobs,
+                                       inner_threads=inner_threads, effect_size=np.array([effect_size]),
+                                       sample_size=np.array([sample_size]), alpha=alpha, n_repeats=n_repeats,
+                                       weight_threshold=weight_threshold, callback=callback, **kwargs)
+                budget.update(results.thread_budget)
+                run_summary[sample_size] = results.run_summary
+                values = results.metric(metric, corrected)
+                evaluated[sample_size] = (np.nanmean(values), np.sum(np.isfinite(values)))
+
+        def smoothed_curve():
+            sample_sizes = np.array(sorted(evaluated.keys()))
+            power = np.array([evaluated[size][0] for size in sample_sizes])
+            trials = np.array([evaluated[size][1] for size in sample_sizes])
+            smoothed = IsotonicRegression(increasing=True).fit_transform(sample_sizes, power,
+                                                                         sample_weight=trials)
+            return sample_sizes, power, trials, smoothed
+
+        def reaches_target(sample_size):
+            sample_sizes, power, trials, smoothed = smoothed_curve()
+            return smoothed[np.searchsorted(sample_sizes, sample_size)] >= target_power
+
+        with SharedArrays() as shared:
+            handles = _share_simulation(shared, simulated_data, correlation_matrix)
+            lower = int(min_sample_size)
+            upper = int(max_sample_size)
+            evaluate(lower)
+            evaluate(upper)
+            if not reaches_target(upper):
+                warnings.warn("Target not reached at max_sample_size")
+            elif reaches_target(lower):
+                upper = lower
+            else:
+                while upper - lower > tolerance:
+                    middle = (lower + upper) // 2
+                    evaluate(middle)
+                    if reaches_target(middle):
+                        upper = middle
+                    else:
+                        lower = middle
+
+        # The estimate is where the final smoothed curve reaches the target, interpolated between the evaluated
+        # sample sizes in the same way as the confidence limits so it always lies inside its interval
+        sample_sizes, power, trials, smoothed = smoothed_curve()
+        estimate = _first_crossing(sample_sizes, smoothed, target_power)
+
+        # Confidence interval: where the upper and lower confidence limits of the smoothed curve reach the target
+        half_width = binomial_ci_width(np.clip(smoothed, 0, 1), trials, confidence) / 2
+        lower_limit = np.maximum.accumulate(smoothed - half_width)
+        upper_limit = np.maximum.accumulate(smoothed + half_width)
+        confidence_interval = (_first_crossing(sample_sizes, upper_limit, target_power),
+                               _first_crossing(sample_sizes, lower_limit, target_power))
+
+        return {'Sample Size': estimate, 'Confidence Interval': confidence_interval, 'Target': target_power,
+                'Effect Size': effect_size, 'Evaluated Sample Sizes': sample_sizes, 'Power': power,
+                'Smoothed Power': smoothed, 'Trials': trials, 'Thread Budget': budget, 'Run Summary': run_summary}
 
     except TypeError as terp:
         raise terp
@@ -1,13 +1,18 @@
-from copy import deepcopy
-
 import numpy as np
+import pandas as pds
 import scipy.stats as scistats
-from statsmodels.stats.multitest import multipletests
+from scipy import sparse
+from sklearn.model_selection import KFold
 from pyChemometrics.ChemometricsPLSDA import ChemometricsPLSDA
+from pyChemometrics.ChemometricsOrthogonalPLSDA import ChemometricsOrthogonalPLSDA
+from pyChemometrics.ChemometricsPLS import ChemometricsPLS
+from pyChemometrics._model_utils import vip as _vip
 
 from .simulateLogNormal import simulateLogNormal
-from .simulateEffect import effect_cohen_d
-from .scoreResults import score_confusionmetrics, score_metrics, score_classification_metrics
+from .simulateEffect import effect_cohen_d_inplace, effect_cohen_d_batch
+from .multiple_testing import adjust_pvalues, check_method
+from .scoreResults import score_confusionmetrics_batch, score_metrics, score_classification_metrics, \
+    binomial_ci_width
 
 """
 Code templates for each type of simulation, containing data selection, effect size addition or outcome simulation, 
@@ -15,9 +20,178 @@ analysis with each specific model and scoring, for specific effect and sample si
 """
 
 
+def _dense_weights(weight_values):
+    """
+    Convert a sparse column (or set of columns) of the thresholded correlation matrix into the dense weight array
+    expected by the workers. Entries absent from the sparse structure are below the correlation threshold and
+    become 0.
+
+    :param weight_values: None, numpy.ndarray or scipy.sparse matrix with shape [n_features, k]
+    :return: None or numpy.ndarray, 1D if a single column is provided
+    """
+    if weight_values is None or not sparse.issparse(weight_values):
+        return weight_values
+    weight_values = weight_values.toarray()
+    if weight_values.shape[1] == 1:
+        weight_values = weight_values.ravel()
+    return weight_values
+
+
+def _repeats_converged(metric_values, tolerance, confidence=0.95):
+    """
+    Check if the Monte Carlo estimate of a metric is precise enough, treating its mean over repeats as a binomial
+    proportion. With more than one alpha value, all of them must have converged.
+
+    :param numpy.ndarray metric_values: Metric values for the repeats run so far [n_repeats] or [n_repeats, n_alpha]
+    :param float tolerance: Maximum width of the confidence interval
+    :param float confidence: Confidence level of the interval
+    :return: True if the confidence interval is narrower than tolerance
+    :rtype: bool
+    """
+    n_valid = np.sum(np.isfinite(metric_values), axis=0)
+    if np.any(n_valid == 0):
+        return False
+    proportion = np.clip(np.nanmean(metric_values, axis=0), 0, 1)
+    return bool(np.all(binomial_ci_width(proportion, n_valid, confidence) <= tolerance))
+
+
+def _common_random_draws(n_available, max_size, n_repeats):
+    """
+    Draw, for every repeat, one subsample of the largest size and one random key per subsampled position, for the
+    common random numbers mode. Smaller subsamples are the prefixes of the largest one, and the class assignment
+    for any size is derived from the keys (see :py:func:`_common_class_assignment`), so every effect and sample size
+    in a repeat sees the same random draws.
+
+    :param int n_available: Number of samples available
+    :param int max_size: Largest subsample size
+    :param int n_repeats: Number of Monte Carlo repeats
+    :return: Subsample indices [n_repeats, max_size] and random keys [n_repeats, max_size]
+    """
+    samples = np.array([np.random.choice(n_available, max_size, replace=False) for rep_idx in range(n_repeats)])
+    keys = np.random.random_sample((n_repeats, max_size))
+    return samples, keys
+
+
+def _common_class_assignment(keys, size, class_balance):
+    """
+    Samples assigned to the second class among the first `size` positions of a common random numbers draw: the
+    ones with the smallest keys. Assignments for neighbouring sizes mostly overlap.
+    """
+    return np.argsort(keys[:size], kind='stable')[:int(np.floor(class_balance * size))]
+
+
+def _variables_to_modify(variables, n_vars, weight_values, weight_threshold, modification_type):
+    """
+    0/1 vector marking the variables that get the effect: the requested variables and, with the correlation
+    modification types, the variables correlated with them above weight_threshold. With 'proportion', a random
+    proportion of all the variables.
+    """
+    var_to_mod = np.zeros(n_vars, dtype='int')
+    if modification_type == 'proportion':
+        var_to_mod[np.random.choice(n_vars, int(np.floor(variables * n_vars)), replace=False)] = 1
+        return var_to_mod
+
+    var_to_mod[variables] = 1
+    # If correlation and correlation_weighted
+    if weight_values is not None and modification_type in ["correlation", "correlation_weighted"]:
+        if weight_values.ndim == 1:
+            var_to_mod |= abs(weight_values) >= weight_threshold
+        else:
+            var_to_mod |= np.any(abs(weight_values) >= weight_threshold, axis=1)
+    return var_to_mod
+
+
+def _draw_subsamples(n_available, size, chunk, crn_samples=None):
+    """
+    Subsample indices for a chunk of repeats [len(chunk), size], taken from the common random numbers draws if given.
+    """
+    if crn_samples is not None:
+        return crn_samples[chunk.start:chunk.stop, :size]
+    return np.array([np.random.choice(n_available, size, replace=False) for rep_idx in chunk])
+
+
+def _draw_class_assignment(size, chunk, class_balance, crn_keys=None):
+    """
+    Samples assigned to the second class for a chunk of repeats [len(chunk), floor(class_balance * size)].
+    """
+    if crn_keys is not None:
+        return np.array([_common_class_assignment(crn_keys[rep_idx], size, class_balance) for rep_idx in chunk])
+    return np.array([np.random.choice(size, int(np.floor(class_balance * size)), replace=False)
+                     for rep_idx in chunk])
+
+
+def _scaled_pool(data, column_std=None):
+    """
+    Centre the simulated data and scale it to unit variance, once per task, so effects are added directly in
+    population standard deviation units. The models still unit variance scale each training set, as in a real analysis.
+    """
+    if column_std is None:
+        column_std = np.std(data, axis=0)
+    column_std = np.where(column_std > 0, column_std, 1)
+    return (data - np.mean(data, axis=0)) / column_std
+
+
+def _pls_vip(model, x, y):
+    """
+    VIP of a ChemometricsPLS model fitted on x and y with diagnostics=False. The Y sum of squares of each component
+    is obtained from _cummulativefit, as in fit, so the VIP is the one returned by model.VIP() on a full fit.
+    """
+    return _vip(model.weights_w, model._cummulativefit(x, y)['SSYcomp'])
+
+
+def _plsda_scree_selection(x, y, max_components, cv_method=KFold(n_splits=7, shuffle=True)):
+    """
+    Select the number of PLS-DA components with the Q2Y plateau rule used in `scree_cv`, fitting each
+    cross-validation fold only once with max_components. The predictions of all the smaller models are the partial
+    sums of the per component contributions (t_a q_a') of the largest model, so Q2Y is obtained for every number of
+    components from a single fit per fold. The selected model is a truncation of the model fitted to all the data.
+
+    :param numpy.ndarray x: Training data matrix
+    :param numpy.ndarray y: Training class labels
+    :param int max_components: Largest number of components considered
+    :param cv_method: An instance of a scikit-learn CrossValidator object.
+    :return: Selected number of components, the fitted PLS-DA model with that number of components and the Q2Y
+    for each number of components.
+    :rtype: tuple
+    """
+    if np.unique(y).size > 2:
+        y_pls = pds.get_dummies(y).values.astype(float)
+    else:
+        y_pls = y.reshape(-1, 1).astype(float)
+
+    press = np.zeros(max_components)
+    fold_model = ChemometricsPLSDA(n_components=max_components)
+    for train, test in cv_method.split(x, y):
+        fold_model.fit(x[train, :], y[train], diagnostics=False)
+        # Per component contributions to the centred predictions, [n_test, n_y, n_components]
+        test_scores = np.dot(fold_model.x_scaler.transform(x[test, :]), fold_model.rotations_ws)
+        contributions = test_scores[:, None, :] * fold_model.loadings_q[None, :, :]
+        residuals = (y_pls[test, :] - y_pls[train, :].mean(axis=0))[:, :, None] - np.cumsum(contributions, axis=2)
+        press += np.sum(residuals ** 2, axis=(0, 1))
+
+    q2 = 1 - press / np.sum((y_pls - y_pls.mean(axis=0)) ** 2)
+
+    n_components = max_components
+    if q2.size == 2:
+        plateau_index = np.where(np.diff(q2) / q2[0] < 0.05)[0]
+    else:
+        plateau_index = np.where((np.diff(q2) / q2[0:-1]) < 0.05)[0]
+    if plateau_index.size > 0:
+        n_components = np.min(plateau_index) + 1
+
+    full_model = ChemometricsPLSDA(n_components=max_components)
+    full_model.fit(x, y, diagnostics=False)
+    if n_components < max_components:
+        full_model = full_model._reduce_ncomps(n_components)
+
+    return n_components, full_model, q2
+
+
 def anova_oneway_simulation(data, variables, effect_size, sample_size, alpha=0.05, n_repeats=15, weight_values=None,
                              weight_threshold=0.8, modification_type='correlation', class_balance=0.5,
-                             multiple_testing_correction='fdr_by'):
+                             multiple_testing_correction='fdr_by', repeat_tolerance=None, repeat_batch=10,
+                             target_metric='True Positive Rate', confidence=0.95, common_random_numbers=False,
+                             column_std=None):
     """
     Worker function to perform power calculations for a one-way ANOVA model, with effect size added parametrized
     using Cohen's d measure.
@@ -27,13 +201,31 @@ def anova_oneway_simulation(data, variables, effect_size, sample_size, alpha=0.0
     with If a single `Float` value is provided interpreted as a proportion will all be modified by their effect size
     :param numpy.ndarray effect_size: array with effect size values to test
     :param numpy.ndarray sample_size: array with sample sizes to test
-    :param float alpha:
+    :param alpha: Significance threshold, or array of thresholds. With an array, every metric gets an extra
+    trailing dimension with one entry per alpha value.
+    :type alpha: float or numpy.ndarray
     :param int n_repeats:
-    :param numpy.ndarray weight: Can be
+    :param numpy.ndarray weight: Can be a dense array or a column of the sparse thresholded correlation matrix
     :param numpy.ndarray weight_threshold: Used in all modification methods invol
     :param str modification_type: How to mo. Single means only the variables requested are modified. Proportion means
     that a set of
     :param float class_balance:
+    :param str multiple_testing_correction: Method used to adjust the p-values, any method of statsmodels'
+    multipletests. 'bonferroni', 'holm', 'fdr_bh' and 'fdr_by' are calculated for all the repeats at once. If None,
+    only unadjusted results are returned.
+    :param float repeat_tolerance: If None (default), n_repeats are run for every effect and sample size.
+    Otherwise repeats are run in batches of repeat_batch until the width of the binomial confidence interval of
+    target_metric falls below repeat_tolerance, with n_repeats as the maximum. Repeats not run are NaN, and the
+    number of repeats run is returned under the 'Repeats' key.
+    :param int repeat_batch: Number of repeats run between convergence checks in adaptive mode.
+    :param str target_metric: Metric used to check convergence in adaptive mode.
+    :param float confidence: Confidence level of the binomial interval used in adaptive mode.
+    :param bool common_random_numbers: If True, each repeat draws a single subsample (of the largest sample size)
+    and class assignment, and reuses them for every effect size and, through nested prefixes, every sample size.
+    This makes the noise common between neighbouring cells, giving smoother power curves for the same number of
+    repeats.
+    :param numpy.ndarray column_std: Standard deviation of every variable in the whole simulated population, used
+    to standardize the effect size. If None, it is calculated from each subsample.
     :return:
     """
 
@@ -44,88 +236,127 @@ def anova_oneway_simulation(data, variables, effect_size, sample_size, alpha=0.0
             raise ValueError("modification_type argument not supported")
         if modification_type == 'proportion' and not isinstance(variables, float):
             raise TypeError("When using \'proportion\' as modification_type \'variables\' must be a float")
+        if multiple_testing_correction is not None:
+            check_method(multiple_testing_correction)
+        if repeat_tolerance is not None and target_metric not in score_metrics:
+            raise ValueError("target_metric must be one of the metrics in score_metrics")
+
+        weight_values = _dense_weights(weight_values)
 
         # get the list of metrics calculated in scoreResults and update
+        # With an array of alpha values, the results have an extra trailing dimension with one entry per alpha
+        # Repeats that are not run (adaptive mode) are left as NaN
+        n_alpha = np.size(alpha)
+        results_shape = (effect_size.size, sample_size.size, n_repeats)
+        if np.ndim(alpha) > 0:
+            results_shape += (n_alpha, )
+
         results = dict.fromkeys(score_metrics)
         for key in results.keys():
-            results[key] = np.zeros((effect_size.size, sample_size.size, n_repeats))
+            results[key] = np.full(results_shape, np.nan)
 
         if multiple_testing_correction is not None:
             adjusted_results = dict.fromkeys(score_metrics)
             for key in adjusted_results.keys():
-                adjusted_results[key] = np.zeros((effect_size.size, sample_size.size, n_repeats))
+                adjusted_results[key] = np.full(results_shape, np.nan)
             adjusted_results['method'] = multiple_testing_correction
 
+        repeats_used = np.zeros((effect_size.size, sample_size.size), dtype='int')
+
+        if common_random_numbers:
+            crn_samples, crn_keys = _common_random_draws(data.shape[0], np.max(sample_size), n_repeats)
+
         n_vars = data.shape[1]
+        var_to_mod = _variables_to_modify(variables, n_vars, weight_values, weight_threshold, modification_type)
+        expected_hits = var_to_mod
+
+        # Only the modified columns are copied for a whole chunk of repeats, the rest are read from data one repeat
+        # at a time, so the memory used per chunk is O(repeat_batch * sample size * modified variables)
+        mod_cols = np.flatnonzero(var_to_mod)
+        mod_mask = np.ones(mod_cols.size, dtype='int')
+        mod_weights = weight_values[mod_cols] if modification_type == 'correlation_weighted' else None
+        mod_std = None if column_std is None else np.asarray(column_std)[mod_cols]
+
         # Loop over effect size, sample size and finally each monte carlo repeat
         for eff_idx, curr_effect in np.ndenumerate(effect_size):
             for ssize_idx, curr_ssize in np.ndenumerate(sample_size):
-                for rep_idx in range(n_repeats):
-                    # Select samples to use
-                    ## Select a subset of the simulated spectra
-                    mod_data = np.copy(data[np.random.choice(data.shape[0], curr_ssize, replace=False), :])
-                    # if any option other than proportion
-                    if modification_type != 'proportion':
-                        # Modify only variables above a certain threshold of correlation
-                        var_to_mod = np.zeros(n_vars, dtype='int')
-                        var_to_mod[variables] = 1
-
-                        expected_hits = np.zeros(n_vars, dtype='int')
-                        expected_hits[var_to_mod == 1] = 1
-                        # If correlation and correlation_weighted
-                        if weight_values is not None and modification_type in ["correlation", "correlation_weighted"]:
-                            if weight_values.ndim == 1:
-                                var_to_mod |= abs(weight_values) >= weight_threshold
-                            else:
-                                var_to_mod |= np.any(abs(weight_values) >= weight_threshold, axis=1)
-
-                        expected_hits = var_to_mod
-                    # Select a subset of samples to add the effect on
-                    which_samples = np.random.choice(range(curr_ssize), int(np.floor(class_balance * curr_ssize)),
-                                                     replace=False)
-
+                # p-values for the repeats of this effect and sample size, scored together after each batch
+                pvals = np.zeros((n_repeats, n_vars))
+                n_done = 0
+                while n_done < n_repeats:
+                    if repeat_tolerance is None:
+                        batch_end = n_repeats
+                    else:
+                        batch_end = min(n_done + repeat_batch, n_repeats)
+
+                    # The repeats are run in chunks: the subsamples of a chunk are stacked and the effect is added to
+                    # all of them at once
+                    for chunk_start in range(n_done, batch_end, repeat_batch):
+                        chunk = range(chunk_start, min(chunk_start + repeat_batch, batch_end))
+                        # Select samples to use
+                        ## Select a subset of the simulated spectra, and a subset of samples to add the effect on
+                        if common_random_numbers:
+                            chunk_samples = _draw_subsamples(data.shape[0], curr_ssize, chunk, crn_samples)
+                            which_samples = _draw_class_assignment(curr_ssize, chunk, class_balance, crn_keys)
+                        else:
+                            chunk_samples = _draw_subsamples(data.shape[0], curr_ssize, chunk)
+                            which_samples = _draw_class_assignment(curr_ssize, chunk, class_balance)
+                        mod_data = data[chunk_samples[:, :, None], mod_cols]
+                        effect_cohen_d_batch(mod_data, curr_effect, which_vars=mod_mask,
+                                             which_samples=which_samples, standardized=True,
+                                             noise=0, weight=mod_weights, column_std=mod_std)
+
+                        # Would it be possible to pass a model selection criteria?
+                        # P-values for the one-way ANOVA
+                        for chunk_idx, rep_idx in enumerate(chunk):
+                            rep_data = data[chunk_samples[chunk_idx], :]
+                            rep_data[:, mod_cols] = mod_data[chunk_idx]
+                            rep_samples = which_samples[chunk_idx]
+                            pvals[rep_idx, :] = scistats.f_oneway(np.delete(rep_data, rep_samples, axis=0),
+                                                                  rep_data[rep_samples, :])[1]
+
+                    batch_pvals = pvals[n_done:batch_end, :]
                     if modification_type == 'correlation_weighted':
-                        mod_data = effect_cohen_d(mod_data, curr_effect, which_vars=var_to_mod,
-                                                  which_samples=which_samples, standardized=True,
-                                                  noise=0, weight=weight_values)
+                        scored_res = score_confusionmetrics_batch(batch_pvals, expected_hits=expected_hits,
+                                                                  alpha=alpha, weight_vector=weight_values)
                     else:
-                        mod_data = effect_cohen_d(mod_data, curr_effect, which_vars=var_to_mod,
-                                                  which_samples=which_samples, standardized=True,
-                                                  noise=0, weight=None)
+                        scored_res = score_confusionmetrics_batch(batch_pvals, expected_hits=expected_hits,
+                                                                  alpha=alpha, weight_vector=None)
 
-                    # Would it be possible to pass a model selection criteria?
-                    # P-values for the one-way ANOVA
-                    pvals = scistats.f_oneway(np.delete(mod_data, which_samples, axis=0),
-                                              mod_data[which_samples, :])[1]
+                    batch_shape = (batch_end - n_done, ) + results_shape[3:]
+                    for metric_idx, key in enumerate(score_metrics):
+                        results[key][eff_idx, ssize_idx, n_done:batch_end] = \
+                            scored_res[:, :, metric_idx].reshape(batch_shape)
 
-                    if modification_type == 'correlation_weighted':
-                        scored_res = score_confusionmetrics(result_vector=pvals, expected_hits=expected_hits,
-                                               weight_vector=weight_values,
-                                               alpha=alpha)
-                    else:
-                        scored_res = score_confusionmetrics(result_vector=pvals, expected_hits=expected_hits,
-                                               weight_vector=None,
-                                               alpha=alpha)
-
-                    for key in scored_res.keys():
-                        results[key][eff_idx, ssize_idx, rep_idx] = scored_res[key]
-                    # Would it be possible to pass a model selection criteria?
-                    # P-values for the one-way ANOVA
                     if multiple_testing_correction is not None:
-                        adjusted_pvalues = multipletests(pvals, alpha=0.05, method=multiple_testing_correction)[1]
+                        # Correct all repeats at once, each row is an independent family of tests
+                        adjusted_pvalues = adjust_pvalues(batch_pvals, method=multiple_testing_correction, axis=1)
+
+                        scored_res = score_confusionmetrics_batch(adjusted_pvalues, expected_hits=expected_hits,
+                                                                  alpha=alpha, weight_vector=None)
+                        for metric_idx, key in enumerate(score_metrics):
+                            adjusted_results[key][eff_idx, ssize_idx, n_done:batch_end] = \
+                                scored_res[:, :, metric_idx].reshape(batch_shape)
+
+                    n_done = batch_end
+                    if repeat_tolerance is not None and \
+                            _repeats_converged(results[target_metric][eff_idx[0], ssize_idx[0], :n_done],
+                                               repeat_tolerance, confidence):
+                        break
+
+                repeats_used[eff_idx, ssize_idx] = n_done
 
-                        scored_res = score_confusionmetrics(result_vector=adjusted_pvalues, expected_hits=expected_hits,
-                                                weight_vector=None,
-                                                alpha=alpha)
-                        for key in scored_res.keys():
-                            adjusted_results[key][eff_idx, ssize_idx, rep_idx] = scored_res[key]
 
         results['Sample Size'] = sample_size
         results['Effect Size'] = effect_size
+        results['Alpha'] = alpha
+        results['Repeats'] = repeats_used
 
         if multiple_testing_correction is not None:
             adjusted_results['Sample Size'] = sample_size
             adjusted_results['Effect Size'] = effect_size
+            adjusted_results['Alpha'] = alpha
+            adjusted_results['Repeats'] = repeats_used
 
         # process the results...
         if multiple_testing_correction is None:
@@ -143,7 +374,9 @@ def anova_oneway_simulation(data, variables, effect_size, sample_size, alpha=0.0
 
 def plsda_simulation(data, variables, effect_size, sample_size, alpha=0.05, n_repeats=15, weight_values=None,
                              weight_threshold=0.8, modification_type='correlation', class_balance=0.5,
-                      test_set_proportion=1, n_components=10, n_components_criteria='fixed'):
+                      test_set_proportion=1, n_components=10, n_components_criteria='fixed', repeat_tolerance=None,
+                      repeat_batch=10, target_metric='True Positive Rate', confidence=0.95,
+                      common_random_numbers=False, column_std=None):
     """
 
     :param data:
@@ -152,13 +385,23 @@ def plsda_simulation(data, variables, effect_size, sample_size, alpha=0.05, n_re
     :param sample_size:
     :param alpha:
     :param n_repeats:
-    :param weight_values:
+    :param weight_values: Dense array or column of the sparse thresholded correlation matrix
     :param weight_threshold:
     :param modification_type:
     :param class_balance:
     :param test_set_proportion:
     :param n_comps:
     :param n_components_criteria:
+    :param float repeat_tolerance: If not None, run repeats in batches until the binomial confidence interval of
+    target_metric is narrower than this value, with n_repeats as the maximum. See :py:func:`anova_oneway_simulation`.
+    :param int repeat_batch: Number of repeats run between convergence checks in adaptive mode.
+    :param str target_metric: Metric used to check convergence in adaptive mode.
+    :param float confidence: Confidence level of the binomial interval used in adaptive mode.
+    :param bool common_random_numbers: If True, each repeat draws a single training set, test set and class
+    assignment of the largest sample size, and reuses them for all effect sizes and sample sizes. See
+    :py:func:`anova_oneway_simulation`.
+    :param numpy.ndarray column_std: Standard deviation of every variable in the whole simulated population, used
+    to standardize the effect size. If None, it is calculated from each training and test set.
     :return:
     """
 
@@ -170,105 +413,392 @@ def plsda_simulation(data, variables, effect_size, sample_size, alpha=0.05, n_re
         if modification_type == 'proportion' and not isinstance(variables, float):
             raise TypeError("When using \'proportion\' as modification_type \'variables\' must be a float")
 
+        if repeat_tolerance is not None and target_metric not in score_metrics:
+            raise ValueError("target_metric must be one of the metrics in score_metrics")
+
+        weight_values = _dense_weights(weight_values)
+
         # get the list of metrics calculated in scoreResults and update
+        # Repeats that are not run (adaptive mode) are left as NaN
         results = dict.fromkeys(score_metrics)
         for key in results.keys():
-            results[key] = np.zeros((effect_size.size, sample_size.size, n_repeats))
+            results[key] = np.full((effect_size.size, sample_size.size, n_repeats), np.nan)
+
+        repeats_used = np.zeros((effect_size.size, sample_size.size), dtype='int')
+
+        if common_random_numbers:
+            crn_train, crn_train_keys = _common_random_draws(data.shape[0], np.max(sample_size), n_repeats)
+            crn_test, crn_test_keys = _common_random_draws(data.shape[0],
+                                                           int(np.floor(test_set_proportion * np.max(sample_size))),
+                                                           n_repeats)
+
+        var_to_mod = _variables_to_modify(variables, data.shape[1], weight_values, weight_threshold,
+                                          modification_type)
 
-        n_vars = data.shape[1]
         # Loop over effect size, sample size and finally each monte carlo repeat
         for eff_idx, curr_effect in np.ndenumerate(effect_size):
             for ssize_idx, curr_ssize in np.ndenumerate(sample_size):
-                for rep_idx in range(n_repeats):
-                    # Select samples to use
-                    ## Select a subset of the simulated spectra to make up training and test sets
-                    train_x = np.copy(data[np.random.choice(data.shape[0], curr_ssize, replace=False), :])
-                    test_x = np.copy(data[np.random.choice(data.shape[0],
-                                                              int(np.floor(test_set_proportion*curr_ssize)), replace=False), :])
-
-                    # Select a subset of samples to assign to class 2
-                    which_samples_train = np.random.choice(range(curr_ssize), int(np.floor(class_balance * curr_ssize)),
-                                                     replace=False)
-                    which_samples_test = np.random.choice(test_x.shape[0], int(np.floor(class_balance * test_x.shape[0])),
-                                                     replace=False)
-
-                    train_y = np.zeros(train_x.shape[0])
-                    train_y[which_samples_train] = 1
-                    test_y = np.zeros(test_x.shape[0])
-                    test_y[which_samples_test] = 1
-
-                    if modification_type != 'proportion':
-                        # Modify only variables above a certain threshold of correlation
-                        var_to_mod = np.zeros(n_vars, dtype='int')
-                        var_to_mod[variables] = 1
-
-                        expected_hits = np.zeros(n_vars, dtype='int')
-                        expected_hits[var_to_mod == 1] = 1
-                        # If correlation and correlation_weighted
-                        if weight_values is not None and modification_type in ["correlation", "correlation_weighted"]:
-                            if weight_values.ndim == 1:
-                                var_to_mod |= abs(weight_values) >= weight_threshold
-                            else:
-                                var_to_mod |= np.any(abs(weight_values) >= weight_threshold, axis=1)
+                n_done = 0
+                while n_done < n_repeats:
+                    if repeat_tolerance is None:
+                        batch_end = n_repeats
                     else:
-                        var_to_mod = np.random.choice(n_vars, int(np.floor(variables*n_vars)))
+                        batch_end = min(n_done + repeat_batch, n_repeats)
+
+                    for rep_idx in range(n_done, batch_end):
+                        # Select samples to use
+                        ## Select a subset of the simulated spectra to make up training and test sets
+                        n_test = int(np.floor(test_set_proportion * curr_ssize))
+                        if common_random_numbers:
+                            train_x = data[crn_train[rep_idx, :curr_ssize], :]
+                            test_x = data[crn_test[rep_idx, :n_test], :]
+                            which_samples_train = _common_class_assignment(crn_train_keys[rep_idx], curr_ssize,
+                                                                           class_balance)
+                            which_samples_test = _common_class_assignment(crn_test_keys[rep_idx], n_test,
+                                                                          class_balance)
+                        else:
+                            train_x = data[np.random.choice(data.shape[0], curr_ssize, replace=False), :]
+                            test_x = data[np.random.choice(data.shape[0], n_test, replace=False), :]
+
+                            # Select a subset of samples to assign to class 2
+                            which_samples_train = np.random.choice(range(curr_ssize),
+                                                                   int(np.floor(class_balance * curr_ssize)),
+                                                                   replace=False)
+                            which_samples_test = np.random.choice(n_test, int(np.floor(class_balance * n_test)),
+                                                                  replace=False)
+
+                        train_y = np.zeros(train_x.shape[0])
+                        train_y[which_samples_train] = 1
+                        test_y = np.zeros(test_x.shape[0])
+                        test_y[which_samples_test] = 1
+
+                        # The training and test sets are copies of the data, so the effect is added in place
+                        if modification_type == 'correlation_weighted':
+                            effect_cohen_d_inplace(train_x, curr_effect, which_vars=var_to_mod,
+                                                   which_samples=which_samples_train, standardized=True,
+                                                   noise=0, weight=weight_values, column_std=column_std)
+                            effect_cohen_d_inplace(test_x, curr_effect, which_vars=var_to_mod,
+                                                   which_samples=which_samples_test, standardized=True,
+                                                   noise=0, weight=weight_values, column_std=column_std)
+                        else:
+                            effect_cohen_d_inplace(train_x, curr_effect, which_vars=var_to_mod,
+                                                   which_samples=which_samples_train, standardized=True,
+                                                   noise=0, weight=None, column_std=column_std)
+                            effect_cohen_d_inplace(test_x, curr_effect, which_vars=var_to_mod,
+                                                   which_samples=which_samples_test, standardized=True,
+                                                   noise=0, weight=None, column_std=column_std)
+
+                        if n_components_criteria == 'scree':
+                            # Automatically assess number of components, fitting each CV fold only once
+                            pls_da_model = _plsda_scree_selection(train_x, train_y, n_components)[1]
+                        else:
+                            pls_da_model = ChemometricsPLSDA(n_components=n_components)
+                            pls_da_model.fit(train_x, train_y, diagnostics=False)
+                        predicted_y = pls_da_model.predict(test_x)
 
-                    if modification_type == 'correlation_weighted':
-                        train_x = effect_cohen_d(train_x, curr_effect, which_vars=var_to_mod,
-                                                 which_samples=which_samples_train, standardized=True,
-                                                 noise=0, weight=weight_values)
+                        scored_res = score_classification_metrics(predicted_y, test_y, None, 1)
+
+                        for key in scored_res.keys():
+                            results[key][eff_idx, ssize_idx, rep_idx] = scored_res[key]
+
+                    n_done = batch_end
+                    if repeat_tolerance is not None and \
+                            _repeats_converged(results[target_metric][eff_idx[0], ssize_idx[0], :n_done],
+                                               repeat_tolerance, confidence):
+                        break
+
+                repeats_used[eff_idx, ssize_idx] = n_done
+
+        results['Sample Size'] = sample_size
+        results['Effect Size'] = effect_size
+        results['Test Set Size'] = sample_size * test_set_proportion
+        results['Repeats'] = repeats_used
+        return results
+
+    except TypeError as terp:
+        raise terp
+    except ValueError as verr:
+        raise verr
+    except Exception as exp:
+        raise exp
+
+
+def oplsda_simulation(data, variables, effect_size, sample_size, alpha=0.05, n_repeats=15, weight_values=None,
+                      weight_threshold=0.8, modification_type='correlation', class_balance=0.5,
+                      test_set_proportion=1, n_components=2, repeat_tolerance=None, repeat_batch=10,
+                      target_metric='True Positive Rate', confidence=0.95, common_random_numbers=False,
+                      column_std=None):
+    """
+
+    Worker function to perform power calculations for an OPLS-DA classifier, with effect size added parametrized
+    using Cohen's d measure to the samples of the second class. Power is measured as the classification performance
+    in an independent test set.
+
+    The simulated data is centred and scaled to unit variance once per task, and the training and test sets of a
+    chunk of repeat_batch repeats are drawn and modified together. The models use their default unit variance
+    scaling of each training set, as in the PLS-DA worker.
+
+    :param numpy.ndarray data: X data matrix (real or simulated) to use in the simulation
+    :param variables: Variables to modify. See :py:func:`anova_oneway_simulation`
+    :param numpy.ndarray effect_size: array with effect size values to test
+    :param numpy.ndarray sample_size: array with sample sizes (of the training set) to test
+    :param alpha: Not used, kept for a common interface with the other workers
+    :param int n_repeats: Number of Monte Carlo repeats
+    :param weight_values: Dense array or column of the sparse thresholded correlation matrix
+    :param float weight_threshold: Correlation threshold to select the variables modified together
+    :param str modification_type: See :py:func:`anova_oneway_simulation`
+    :param float class_balance: Proportion of samples in the second class
+    :param float test_set_proportion: Size of the test set, as a proportion of the training set size
+    :param int n_components: Number of components of the OPLS-DA model (1 predictive and n_components - 1
+    orthogonal)
+    :param float repeat_tolerance: See :py:func:`anova_oneway_simulation`
+    :param int repeat_batch: Number of repeats drawn together, and run between convergence checks in adaptive mode.
+    :param str target_metric: Metric used to check convergence in adaptive mode.
+    :param float confidence: Confidence level of the binomial interval used in adaptive mode.
+    :param bool common_random_numbers: See :py:func:`plsda_simulation`
+    :param numpy.ndarray column_std: Standard deviation of every variable in the whole simulated population, used
+    to scale the data. If None, it is calculated from data.
+    :return: Dictionary with the classification metrics [n_effect, n_sample, n_repeats]
+    :rtype: dict
+    """
 
-                        test_x = effect_cohen_d(test_x, curr_effect, which_vars=var_to_mod,
-                                                  which_samples=which_samples_test, standardized=True,
-                                                  noise=0, weight=weight_values)
+    try:
+        import warnings
+        warnings.filterwarnings('ignore')
+        if modification_type not in ['correlation', 'manual', 'proportion', 'correlation_weighted']:
+            raise ValueError("modification_type argument not supported")
+        if modification_type == 'proportion' and not isinstance(variables, float):
+            raise TypeError("When using \'proportion\' as modification_type \'variables\' must be a float")
+        if repeat_tolerance is not None and target_metric not in score_metrics:
+            raise ValueError("target_metric must be one of the metrics in score_metrics")
+
+        weight_values = _dense_weights(weight_values)
+        effect_weight = weight_values if modification_type == 'correlation_weighted' else None
+
+        # Repeats that are not run (adaptive mode) are left as NaN
+        results = dict.fromkeys(score_metrics)
+        for key in results.keys():
+            results[key] = np.full((effect_size.size, sample_size.size, n_repeats), np.nan)
+
+        repeats_used = np.zeros((effect_size.size, sample_size.size), dtype='int')
+
+        pool = _scaled_pool(data, column_std)
+        var_to_mod = _variables_to_modify(variables, pool.shape[1], weight_values, weight_threshold,
+                                          modification_type)
+
+        crn_train = crn_train_keys = crn_test = crn_test_keys = None
+        if common_random_numbers:
+            crn_train, crn_train_keys = _common_random_draws(pool.shape[0], np.max(sample_size), n_repeats)
+            crn_test, crn_test_keys = _common_random_draws(pool.shape[0],
+                                                           int(np.floor(test_set_proportion * np.max(sample_size))),
+                                                           n_repeats)
+
+        # Loop over effect size, sample size and finally each chunk of monte carlo repeats
+        for eff_idx, curr_effect in np.ndenumerate(effect_size):
+            for ssize_idx, curr_ssize in np.ndenumerate(sample_size):
+                n_test = int(np.floor(test_set_proportion * curr_ssize))
+                n_done = 0
+                while n_done < n_repeats:
+                    if repeat_tolerance is None:
+                        batch_end = n_repeats
                     else:
-                        train_x = effect_cohen_d(train_x, curr_effect, which_vars=var_to_mod,
-                                                  which_samples=which_samples_train, standardized=True,
-                                                  noise=0, weight=None)
-                        test_x = effect_cohen_d(test_x, curr_effect, which_vars=var_to_mod,
-                                                  which_samples=which_samples_test, standardized=True,
-                                                  noise=0, weight=None)
-
-                    if n_components_criteria == 'scree':
-
-                        # Fit a PLS-DA model
-                        pls_da_model = ChemometricsPLSDA(ncomps=1)
-                        # Automatically assess number of components
-
-                        models = list()
-                        for ncomps in range(1, n_components + 1):
-                            currmodel = deepcopy(pls_da_model)
-                            currmodel.ncomps = ncomps
-                            currmodel.fit(train_x, train_y)
-                            currmodel.cross_validation(train_x, train_y)
-                            models.append(currmodel)
-
-                        q2 = np.array([x.cvParameters['PLS']['Q2Y'] for x in models])
-                        if q2.size == 2:
-                            plateau_index = np.where(np.diff(q2) / q2[0] < 0.05)[0]
-                            if plateau_index.size == 0:
-                                n_components = n_components
-                            else:
-                                n_components = np.min(np.where(np.diff(q2) / q2[0] < 0.05)[0]) + 1
-                        else:
-                            plateau_index = np.where((np.diff(q2) / q2[0:-1]) < 0.05)[0]
-                            if plateau_index.size == 0:
-                                n_components = n_components
-                            else:
-                                n_components = np.min(plateau_index) + 1
+                        batch_end = min(n_done + repeat_batch, n_repeats)
+
+                    for chunk_start in range(n_done, batch_end, repeat_batch):
+                        chunk = range(chunk_start, min(chunk_start + repeat_batch, batch_end))
+                        ## Select the training and test sets and the samples of class 2 for the whole chunk
+                        train_x = pool[_draw_subsamples(pool.shape[0], curr_ssize, chunk, crn_train), :]
+                        test_x = pool[_draw_subsamples(pool.shape[0], n_test, chunk, crn_test), :]
+                        which_train = _draw_class_assignment(curr_ssize, chunk, class_balance, crn_train_keys)
+                        which_test = _draw_class_assignment(n_test, chunk, class_balance, crn_test_keys)
+
+                        # The pool has unit variance, so the effect size is already in standard deviation units
+                        effect_cohen_d_batch(train_x, curr_effect, which_vars=var_to_mod, which_samples=which_train,
+                                             standardized=False, noise=0, weight=effect_weight)
+                        effect_cohen_d_batch(test_x, curr_effect, which_vars=var_to_mod, which_samples=which_test,
+                                             standardized=False, noise=0, weight=effect_weight)
+
+                        for chunk_idx, rep_idx in enumerate(chunk):
+                            train_y = np.zeros(curr_ssize)
+                            train_y[which_train[chunk_idx]] = 1
+                            test_y = np.zeros(n_test)
+                            test_y[which_test[chunk_idx]] = 1
+
+                            oplsda_model = ChemometricsOrthogonalPLSDA(n_components=n_components)
+                            oplsda_model.fit(train_x[chunk_idx], train_y, diagnostics=False)
+                            predicted_y = oplsda_model.predict(test_x[chunk_idx])
+
+                            scored_res = score_classification_metrics(predicted_y, test_y, None, 1)
+                            for key in scored_res.keys():
+                                results[key][eff_idx, ssize_idx, rep_idx] = scored_res[key]
+
+                    n_done = batch_end
+                    if repeat_tolerance is not None and \
+                            _repeats_converged(results[target_metric][eff_idx[0], ssize_idx[0], :n_done],
+                                               repeat_tolerance, confidence):
+                        break
+
+                repeats_used[eff_idx, ssize_idx] = n_done
 
-                    pls_da_model = ChemometricsPLSDA(ncomps=n_components)
-                    pls_da_model.fit(train_x, train_y)
-                    predicted_y = pls_da_model.predict(test_x)
+        results['Sample Size'] = sample_size
+        results['Effect Size'] = effect_size
+        results['Test Set Size'] = sample_size * test_set_proportion
+        results['Repeats'] = repeats_used
+        return results
 
-                    scored_res = score_classification_metrics(predicted_y, test_y, None, 1)
+    except TypeError as terp:
+        raise terp
+    except ValueError as verr:
+        raise verr
+    except Exception as exp:
+        raise exp
 
-                    for key in scored_res.keys():
-                        results[key][eff_idx, ssize_idx, rep_idx] = scored_res[key]
+
+def pls_simulation(data, variables, effect_size, sample_size, alpha=0.05, n_repeats=15, weight_values=None,
+                   weight_threshold=0.8, modification_type='correlation', test_set_proportion=1, n_components=2,
+                   vip_threshold=1, repeat_tolerance=None, repeat_batch=10, target_metric='True Positive Rate',
+                   confidence=0.95, common_random_numbers=False, column_std=None):
+    """
+
+    Worker function to perform power calculations for a PLS regression model with a continuous outcome.
+
+    The outcome is simulated from the modified variables: y = effect_size * s + e, where s is the (weighted) sum
+    of the modified variables, scaled to unit variance in the simulated population, and e is standard normal noise.
+    The effect size is therefore the standardized regression coefficient of the outcome on s, and the population
+    R2 of the outcome is effect_size^2 / (1 + effect_size^2).
+
+    Power is measured as the recovery of the modified variables: the variables with a VIP above vip_threshold are
+    taken as hits and scored against the modified variables, as in :py:func:`anova_oneway_simulation`. The
+    predictive Q2Y in an independent test set is also returned.
+
+    The simulated data is centred and scaled to unit variance once per task, and the training and test sets of a
+    chunk of repeat_batch repeats are drawn together. The models use their default unit variance scaling of each
+    training set.
+
+    :param numpy.ndarray data: X data matrix (real or simulated) to use in the simulation
+    :param variables: Variables that determine the outcome. See :py:func:`anova_oneway_simulation`
+    :param numpy.ndarray effect_size: array with effect size values to test
+    :param numpy.ndarray sample_size: array with sample sizes (of the training set) to test
+    :param alpha: Not used, kept for a common interface with the other workers
+    :param int n_repeats: Number of Monte Carlo repeats
+    :param weight_values: Dense array or column of the sparse thresholded correlation matrix
+    :param float weight_threshold: Correlation threshold to select the variables modified together
+    :param str modification_type: See :py:func:`anova_oneway_simulation`. With 'correlation_weighted' each
+    variable contributes to the outcome in proportion to its correlation weight.
+    :param float test_set_proportion: Size of the test set, as a proportion of the training set size
+    :param int n_components: Number of components of the PLS model
+    :param float vip_threshold: VIP value above which a variable is selected
+    :param float repeat_tolerance: See :py:func:`anova_oneway_simulation`
+    :param int repeat_batch: Number of repeats drawn and scored together, and run between convergence checks in
+    adaptive mode.
+    :param str target_metric: Metric used to check convergence in adaptive mode.
+    :param float confidence: Confidence level of the binomial interval used in adaptive mode.
+    :param bool common_random_numbers: If True, each repeat draws a single training and test set of the largest
+    sample size and a single outcome noise vector, and reuses them for all effect and sample sizes.
+    :param numpy.ndarray column_std: Standard deviation of every variable in the whole simulated population, used
+    to scale the data. If None, it is calculated from data.
+    :return: Dictionary with the variable selection metrics and the test set 'Q2Y' [n_effect, n_sample, n_repeats]
+    :rtype: dict
+    """
+
+    try:
+        import warnings
+        warnings.filterwarnings('ignore')
+        if modification_type not in ['correlation', 'manual', 'proportion', 'correlation_weighted']:
+            raise ValueError("modification_type argument not supported")
+        if modification_type == 'proportion' and not isinstance(variables, float):
+            raise TypeError("When using \'proportion\' as modification_type \'variables\' must be a float")
+        if repeat_tolerance is not None and target_metric not in score_metrics:
+            raise ValueError("target_metric must be one of the metrics in score_metrics")
+
+        weight_values = _dense_weights(weight_values)
+
+        results_shape = (effect_size.size, sample_size.size, n_repeats)
+        results = dict.fromkeys(score_metrics)
+        for key in results.keys():
+            results[key] = np.full(results_shape, np.nan)
+        results['Q2Y'] = np.full(results_shape, np.nan)
+
+        repeats_used = np.zeros((effect_size.size, sample_size.size), dtype='int')
+
+        pool = _scaled_pool(data, column_std)
+        expected_hits = _variables_to_modify(variables, pool.shape[1], weight_values, weight_threshold,
+                                             modification_type)
+
+        # Outcome signal of every sample in the pool, scaled to unit variance
+        signal_weights = np.zeros(pool.shape[1])
+        signal_weights[expected_hits == 1] = 1
+        if modification_type == 'correlation_weighted' and weight_values is not None:
+            signal_weights *= weight_values if weight_values.ndim == 1 else np.max(abs(weight_values), axis=1)
+        signal = np.dot(pool, signal_weights)
+        signal /= np.std(signal)
+
+        max_test = int(np.floor(test_set_proportion * np.max(sample_size)))
+        if common_random_numbers:
+            crn_train = _common_random_draws(pool.shape[0], np.max(sample_size), n_repeats)[0]
+            crn_test = _common_random_draws(pool.shape[0], max_test, n_repeats)[0]
+            crn_noise_train = np.random.randn(n_repeats, np.max(sample_size))
+            crn_noise_test = np.random.randn(n_repeats, max_test)
+        else:
+            crn_train = crn_test = None
+
+        # Loop over effect size, sample size and finally each chunk of monte carlo repeats
+        for eff_idx, curr_effect in np.ndenumerate(effect_size):
+            for ssize_idx, curr_ssize in np.ndenumerate(sample_size):
+                n_test = int(np.floor(test_set_proportion * curr_ssize))
+                n_done = 0
+                while n_done < n_repeats:
+                    if repeat_tolerance is None:
+                        batch_end = n_repeats
+                    else:
+                        batch_end = min(n_done + repeat_batch, n_repeats)
+
+                    for chunk_start in range(n_done, batch_end, repeat_batch):
+                        chunk = range(chunk_start, min(chunk_start + repeat_batch, batch_end))
+                        ## Select the training and test sets and simulate the outcome for the whole chunk
+                        train_idx = _draw_subsamples(pool.shape[0], curr_ssize, chunk, crn_train)
+                        test_idx = _draw_subsamples(pool.shape[0], n_test, chunk, crn_test)
+                        if common_random_numbers:
+                            train_noise = crn_noise_train[chunk.start:chunk.stop, :curr_ssize]
+                            test_noise = crn_noise_test[chunk.start:chunk.stop, :n_test]
+                        else:
+                            train_noise = np.random.randn(len(chunk), curr_ssize)
+                            test_noise = np.random.randn(len(chunk), n_test)
+                        train_y = curr_effect * signal[train_idx] + train_noise
+                        test_y = curr_effect * signal[test_idx] + test_noise
+
+                        # Variables selected in each repeat of the chunk
+                        selected = np.zeros((len(chunk), pool.shape[1]), dtype=bool)
+                        for chunk_idx, rep_idx in enumerate(chunk):
+                            pls_model = ChemometricsPLS(n_components=n_components)
+                            train_x = pool[train_idx[chunk_idx], :]
+                            pls_model.fit(train_x, train_y[chunk_idx], diagnostics=False)
+                            selected[chunk_idx] = _pls_vip(pls_model, train_x, train_y[chunk_idx]) >= vip_threshold
+
+                            predicted_y = pls_model.predict(pool[test_idx[chunk_idx], :]).ravel()
+                            results['Q2Y'][eff_idx, ssize_idx, rep_idx] = \
+                                1 - np.sum((test_y[chunk_idx] - predicted_y) ** 2) / \
+                                np.sum((test_y[chunk_idx] - np.mean(test_y[chunk_idx])) ** 2)
+
+                        # Selected variables are scored as positives (0 is below the cutoff, 1 is not)
+                        scored_res = score_confusionmetrics_batch(np.where(selected, 0., 1.),
+                                                                  expected_hits=expected_hits, alpha=0.5,
+                                                                  weight_vector=None)
+                        for metric_idx, key in enumerate(score_metrics):
+                            results[key][eff_idx, ssize_idx, chunk.start:chunk.stop] = scored_res[:, 0, metric_idx]
+
+                    n_done = batch_end
+                    if repeat_tolerance is not None and \
+                            _repeats_converged(results[target_metric][eff_idx[0], ssize_idx[0], :n_done],
+                                               repeat_tolerance, confidence):
+                        break
+
+                repeats_used[eff_idx, ssize_idx] = n_done
 
         results['Sample Size'] = sample_size
         results['Effect Size'] = effect_size
         results['Test Set Size'] = sample_size * test_set_proportion
+        results['Repeats'] = repeats_used
         return results
 
     except TypeError as terp:
@@ -279,5 +809,6 @@ def plsda_simulation(data, variables, effect_size, sample_size, alpha=0.05, n_re
         raise exp
 
 
-power_analysis_types = {'ANOVA': anova_oneway_simulation, 'PLS-DA': plsda_simulation}
+power_analysis_types = {'ANOVA': anova_oneway_simulation, 'PLS-DA': plsda_simulation,
+                        'OPLS-DA': oplsda_simulation, 'PLS': pls_simulation}
 
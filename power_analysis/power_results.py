@@ -0,0 +1,261 @@
+import json
+import os
+
+import numpy as np
+from scipy.stats import norm
+
+from .scoreResults import score_metrics
+
+"""
+Compact, labelled container for the output of power_analysis. All the metrics for all variables are stored in a
+single contiguous array, with vectorised reductions over the Monte Carlo repeats.
+"""
+
+
+class PowerAnalysisResults:
+    """
+
+    Results of a power analysis, stored in a single array with dimensions
+    [variable, correction, metric, effect size, sample size, repeat] (plus a trailing alpha dimension when several
+    alpha values are scored). The correction axis holds the uncorrected results first and, if a multiple testing
+    correction was used, the corrected results second.
+
+    Indexing the object with a variable position returns the per variable structure produced by the simulation
+    workers (a dictionary, or a tuple of uncorrected and corrected dictionaries), so code written for the list
+    output of power_analysis keeps working.
+
+    :param numpy.ndarray values: Metric values, [n_variables, n_corrections, n_metrics, n_effect, n_sample, n_repeats]
+    :param numpy.ndarray variables: Index of each variable in the original data
+    :param list metrics: Names of the metrics, in the order of the metric axis
+    :param numpy.ndarray effect_size: Effect sizes
+    :param numpy.ndarray sample_size: Sample sizes
+    :param alpha: Significance threshold(s)
+    :param str method: Multiple testing correction method, or None
+    :param numpy.ndarray repeats: Number of repeats run per variable, effect and sample size
+    :param numpy.ndarray test_set_size: Size of the test sets (classification models only)
+    :param dict thread_budget: Number of worker processes ('n_jobs') and BLAS/OpenMP threads per worker
+    ('inner_threads') used to compute the results
+    :param dict run_summary: Timing, throughput and memory summary of the run, see :py:class:`PowerAnalysisMonitor`
+    """
+
+    def __init__(self, values, variables, metrics, effect_size, sample_size, alpha=0.05, method=None, repeats=None,
+                 test_set_size=None, thread_budget=None, run_summary=None):
+        self.values = values
+        self.variables = np.asarray(variables)
+        self.metrics = list(metrics)
+        self.effect_size = np.asarray(effect_size)
+        self.sample_size = np.asarray(sample_size)
+        self.alpha = alpha
+        self.method = method
+        if repeats is None:
+            repeats = np.full(values.shape[0:1] + values.shape[3:5], values.shape[5], dtype='int')
+        self.repeats = repeats
+        self.test_set_size = test_set_size
+        self.thread_budget = thread_budget
+        self.run_summary = run_summary
+
+    @classmethod
+    def from_output(cls, output, variables=None):
+        """
+
+        Build the results object from the list returned by the simulation workers, one entry per variable.
+
+        :param list output: List with the output of the simulation workers (for example anova_oneway_simulation or
+        plsda_simulation) for each variable. All the arrays of the metric shape are kept.
+        :param variables: Index of each variable in the original data. Defaults to range(len(output))
+        :return: The results object
+        :rtype: PowerAnalysisResults
+        """
+        try:
+            if isinstance(output, cls):
+                return output
+
+            first = output[0]
+            corrected = isinstance(first, tuple)
+            reference = first[0] if corrected else first
+            metrics = [metric for metric in score_metrics if metric in reference]
+            metric_shape = reference[metrics[0]].shape
+            # Other per repeat metrics of the worker, for example the test set 'Q2Y' of pls_simulation
+            metrics += [key for key, value in reference.items() if key not in metrics and
+                        isinstance(value, np.ndarray) and value.shape == metric_shape]
+            n_corrections = 2 if corrected else 1
+
+            values = np.empty((len(output), n_corrections, len(metrics)) + metric_shape)
+            repeats = np.empty((len(output), ) + metric_shape[0:2], dtype='int')
+            for var_idx, var_output in enumerate(output):
+                if not corrected:
+                    var_output = (var_output, )
+                for corr_idx, corr_output in enumerate(var_output):
+                    for metric_idx, metric in enumerate(metrics):
+                        values[var_idx, corr_idx, metric_idx] = corr_output[metric]
+                repeats[var_idx] = var_output[0].get('Repeats', metric_shape[2])
+
+            if variables is None:
+                variables = np.arange(len(output))
+
+            return cls(values, variables, metrics, reference['Effect Size'], reference['Sample Size'],
+                       alpha=reference.get('Alpha', 0.05), method=first[1]['method'] if corrected else None,
+                       repeats=repeats, test_set_size=reference.get('Test Set Size', None))
+
+        except TypeError as terp:
+            raise terp
+        except ValueError as verr:
+            raise verr
+        except Exception as exp:
+            raise exp
+
+    @property
+    def corrected(self):
+        """
+        True if the results include a multiple testing corrected set.
+        """
+        return self.values.shape[1] == 2
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def _labels(self, correction_idx=0):
+        labels = {'Sample Size': self.sample_size, 'Effect Size': self.effect_size, 'Alpha': self.alpha}
+        if self.test_set_size is not None:
+            labels['Test Set Size'] = self.test_set_size
+        if correction_idx == 1:
+            labels['method'] = self.method
+        return labels
+
+    def __getitem__(self, variable):
+        """
+        Per variable results, with the same structure as the output of the simulation workers. The metric arrays
+        are views of the results array.
+        """
+        var_results = list()
+        for corr_idx in range(self.values.shape[1]):
+            var_dict = dict(zip(self.metrics, self.values[variable, corr_idx]))
+            var_dict.update(self._labels(corr_idx))
+            var_dict['Repeats'] = self.repeats[variable]
+            var_results.append(var_dict)
+
+        if self.corrected:
+            return tuple(var_results)
+        return var_results[0]
+
+    def metric(self, metric='True Positive Rate', corrected=False):
+        """
+
+        All the values of a metric.
+
+        :param str metric: Name of the metric
+        :param bool corrected: Use the multiple testing corrected results
+        :return: View of the results array, [n_variables, n_effect, n_sample, n_repeats]
+        :rtype: numpy.ndarray
+        """
+        if corrected and not self.corrected:
+            raise ValueError("No multiple testing corrected results available")
+        return self.values[:, int(corrected), self.metrics.index(metric)]
+
+    def mean(self, metric='True Positive Rate', corrected=False):
+        """
+
+        Mean of a metric over the Monte Carlo repeats.
+
+        :param str metric: Name of the metric
+        :param bool corrected: Use the multiple testing corrected results
+        :return: Array [n_variables, n_effect, n_sample]
+        :rtype: numpy.ndarray
+        """
+        return np.nanmean(self.metric(metric, corrected), axis=3)
+
+    def std(self, metric='True Positive Rate', corrected=False):
+        """
+
+        Standard deviation of a metric over the Monte Carlo repeats.
+
+        :param str metric: Name of the metric
+        :param bool corrected: Use the multiple testing corrected results
+        :return: Array [n_variables, n_effect, n_sample]
+        :rtype: numpy.ndarray
+        """
+        return np.nanstd(self.metric(metric, corrected), axis=3)
+
+    def confidence_interval(self, metric='True Positive Rate', corrected=False, confidence=0.95):
+        """
+
+        Normal approximation confidence interval for the mean of a metric over the Monte Carlo repeats.
+
+        :param str metric: Name of the metric
+        :param bool corrected: Use the multiple testing corrected results
+        :param float confidence: Confidence level
+        :return: Lower and upper limits, each [n_variables, n_effect, n_sample]
+        :rtype: tuple of numpy.ndarray
+        """
+        values = self.metric(metric, corrected)
+        n_valid = np.sum(np.isfinite(values), axis=3)
+        mean = np.nanmean(values, axis=3)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            half_width = norm.ppf(1 - (1 - confidence) / 2) * np.nanstd(values, axis=3, ddof=1) / np.sqrt(n_valid)
+        return mean - half_width, mean + half_width
+
+    def _metadata(self):
+        return {'variables': self.variables.tolist(), 'metrics': self.metrics,
+                'effect_size': self.effect_size.tolist(), 'sample_size': self.sample_size.tolist(),
+                'alpha': np.asarray(self.alpha).tolist(), 'method': self.method,
+                'test_set_size': None if self.test_set_size is None else np.asarray(self.test_set_size).tolist(),
+                'thread_budget': self.thread_budget, 'run_summary': self.run_summary}
+
+    @classmethod
+    def _from_metadata(cls, values, repeats, metadata):
+        return cls(values, metadata['variables'], metadata['metrics'], metadata['effect_size'],
+                   metadata['sample_size'], alpha=metadata['alpha'], method=metadata['method'], repeats=repeats,
+                   test_set_size=metadata['test_set_size'], thread_budget=metadata.get('thread_budget', None),
+                   run_summary=metadata.get('run_summary', None))
+
+    def to_npz(self, fname):
+        """
+
+        Save the results to a single .npz file.
+
+        :param str fname: Path of the file
+        """
+        np.savez(fname, values=self.values, repeats=self.repeats, metadata=json.dumps(self._metadata()))
+
+    @classmethod
+    def from_npz(cls, fname):
+        """
+
+        Load results saved with :py:meth:`to_npz`.
+
+        :param str fname: Path of the file
+        :return: The results object
+        :rtype: PowerAnalysisResults
+        """
+        with np.load(fname) as npz_file:
+            return cls._from_metadata(npz_file['values'], npz_file['repeats'],
+                                      json.loads(str(npz_file['metadata'])))
+
+    def save(self, directory):
+        """
+
+        Save the results to a directory as .npy files, which can be memory mapped by :py:meth:`load`.
+
+        :param str directory: Path of the directory, created if needed
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'values.npy'), self.values)
+        np.save(os.path.join(directory, 'repeats.npy'), self.repeats)
+        with open(os.path.join(directory, 'metadata.json'), 'w') as metadata_handle:
+            json.dump(self._metadata(), metadata_handle)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """
+
+        Load results saved with :py:meth:`save`. By default the values are memory mapped, not read into memory.
+
+        :param str directory: Path of the directory
+        :param str mmap_mode: Memory map mode passed to numpy.load, or None to read the values into memory
+        :return: The results object
+        :rtype: PowerAnalysisResults
+        """
+        with open(os.path.join(directory, 'metadata.json'), 'r') as metadata_handle:
+            metadata = json.load(metadata_handle)
+        return cls._from_metadata(np.load(os.path.join(directory, 'values.npy'), mmap_mode=mmap_mode),
+                                  np.load(os.path.join(directory, 'repeats.npy')), metadata)
@@ -1,5 +1,6 @@
 import sys
 import numpy as np
+from scipy.stats import norm
 
 score_metrics = ['True Positive Rate', 'False Positive Rate', 'True Negative Rate', 'False Negative Rate',
            'Positive Predictive Value', 'Negative Predictive Value', 'False Discovery Rate', 'False Omission Rate',
@@ -85,6 +86,83 @@ def score_confusionmetrics(result_vector, expected_hits, weight_vector, alpha=0.
         raise exp
 
 
+def score_confusionmetrics_batch(result_matrix, expected_hits, alpha=0.05, weight_vector=None):
+    """
+
+    Vectorised version of :py:func:`score_confusionmetrics`, scoring many repeats at many significance thresholds
+    in a single pass. Each row of result_matrix is sorted once, and the number of (weighted) true and false
+    positives at every threshold is read from the cumulative counts of expected hits and non-hits.
+
+    :param numpy.ndarray result_matrix: Matrix [n_repeats, n_variables] with the p-value for each variable in
+    each repeat. A 1D vector is treated as a single repeat. NaN values are left out of all counts, as in
+    :py:func:`score_confusionmetrics`.
+    :param numpy.ndarray expected_hits: Vector [n_variables] of 0/1 or Boolean values, or a matrix with the same
+    shape as result_matrix if the expected hits change between repeats.
+    :param alpha: Significance threshold or array of thresholds.
+    :type alpha: float or numpy.ndarray
+    :param numpy.ndarray weight_vector: Weight vector [n_variables] to weight each hit if required
+    :return: Tensor [n_repeats, n_alpha, n_metrics] with the statistics, in the order of `score_metrics`.
+    :rtype: numpy.ndarray
+    """
+
+    try:
+        result_matrix = np.atleast_2d(result_matrix)
+        n_repeats, n_vars = result_matrix.shape
+        alpha = np.atleast_1d(np.asarray(alpha, dtype=float))
+
+        expected_hits = np.broadcast_to(np.asarray(expected_hits, dtype=bool), (n_repeats, n_vars))
+        if weight_vector is None:
+            weights = np.ones(n_vars)
+        else:
+            weights = np.asarray(weight_vector, dtype=float)
+        # NaN values are neither hits nor non-hits
+        weights = np.where(np.isnan(result_matrix), 0, weights)
+
+        # Sort each repeat once, NaN values go last and are never below alpha
+        order = np.argsort(result_matrix, axis=1)
+        sorted_res = np.take_along_axis(result_matrix, order, axis=1)
+        sorted_hits = np.take_along_axis(expected_hits, order, axis=1)
+        sorted_weights = np.take_along_axis(weights, order, axis=1)
+
+        # Weighted cumulative counts of expected hits and non-hits, with a leading 0 for "no positives"
+        cum_pos = np.zeros((n_repeats, n_vars + 1))
+        cum_neg = np.zeros((n_repeats, n_vars + 1))
+        np.cumsum(sorted_weights * sorted_hits, axis=1, out=cum_pos[:, 1:])
+        np.cumsum(sorted_weights * ~sorted_hits, axis=1, out=cum_neg[:, 1:])
+
+        # Number of values strictly below each alpha, for every repeat, with a single searchsorted call.
+        # Each row is shifted by an offset larger than the range of the values so the flattened array stays sorted.
+        finite = np.isfinite(sorted_res)
+        upper = max(np.max(sorted_res[finite], initial=0), np.max(alpha)) + 1
+        shift = 2 * upper * np.arange(n_repeats)[:, None]
+        flat_res = (np.where(finite, sorted_res, upper) + shift).ravel()
+        n_positives = np.searchsorted(flat_res, (alpha[None, :] + shift).ravel(), side='left')
+        n_positives = n_positives.reshape(n_repeats, alpha.size) - n_vars * np.arange(n_repeats)[:, None]
+
+        tp = np.take_along_axis(cum_pos, n_positives, axis=1)
+        fp = np.take_along_axis(cum_neg, n_positives, axis=1)
+        fn = cum_pos[:, -1:] - tp
+        tn = cum_neg[:, -1:] - fp
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tpr = tp / (tp + fn)
+            tnr = tn / (tn + fp)
+            ppv = tp / (tp + fp)
+            npv = tn / (fn + tn)
+            accuracy = (tp + tn) / (fp + tp + tn + fn)
+            f1 = 2 * ((ppv * tpr) / (ppv + tpr))
+
+        # Same order as score_metrics
+        return np.stack([tpr, 1 - tnr, tnr, 1 - tpr, ppv, npv, 1 - ppv, 1 - npv, accuracy, f1], axis=2)
+
+    except TypeError as terr:
+        raise terr
+    except ValueError as verr:
+        raise verr
+    except Exception as exp:
+        raise exp
+
+
 def score_classification_metrics(classification_results, true_label, weight_vector, positive_class=1):
     """
 
@@ -159,3 +237,33 @@ def score_classification_metrics(classification_results, true_label, weight_vect
         raise verr
     except Exception as exp:
         raise exp
+
+
+def binomial_ci_width(proportion, n_trials, confidence=0.95):
+    """
+
+    Width of the Wilson score confidence interval for a binomial proportion. Unlike the normal approximation,
+    the width does not collapse to 0 when the observed proportion is 0 or 1 after only a few trials.
+
+    :param proportion: Observed proportion(s) of successes.
+    :type proportion: float or numpy.ndarray
+    :param n_trials: Number of trials.
+    :type n_trials: int or numpy.ndarray
+    :param float confidence: Confidence level of the interval.
+    :return: Width of the confidence interval.
+    :rtype: float or numpy.ndarray
+    """
+
+    try:
+        z = norm.ppf(1 - (1 - confidence) / 2)
+        n_trials = np.asarray(n_trials, dtype=float)
+        proportion = np.asarray(proportion, dtype=float)
+        return 2 * z / (1 + z ** 2 / n_trials) * np.sqrt(proportion * (1 - proportion) / n_trials +
+                                                        z ** 2 / (4 * n_trials ** 2))
+
+    except TypeError as terr:
+        raise terr
+    except ValueError as verr:
+        raise verr
+    except Exception as exp:
+        raise exp
@@ -1,7 +1,43 @@
 import numpy as np
 
 
-def effect_cohen_d(x, effect_size, which_vars=0, which_samples=0, standardized=True, noise=0, weight=None):
+def _effect_values(x, effect_size, which_vars, standardized, weight, column_std):
+    """
+    Index of the variables to modify and the (standardized and weighted) effect to add to each of them.
+    """
+    # if float, which_vars is interpreted as a proportion of variables, randomly selected
+    if isinstance(which_vars, float):
+        n_vars = int(which_vars * x.shape[-1])
+        selected = np.zeros(x.shape[-1], dtype=bool)
+        selected[np.random.choice(x.shape[-1], n_vars, replace=False)] = True
+        which_vars = selected
+    which_vars = np.asarray(which_vars)
+    if which_vars.dtype in [float, int, bool]:
+        which_vars = np.where(which_vars)[0]
+    # Work on a copy, so the effect_size passed by the caller is never modified
+    effect_size = np.array(effect_size, dtype=float)
+    # Use a standardized effect size
+    if standardized is True:
+        if column_std is None:
+            column_std = np.std(x[..., which_vars], axis=-2)
+        else:
+            column_std = np.asarray(column_std)[which_vars]
+        effect_size = effect_size * column_std
+    # Option to use weights  - ie, correlation weights
+    if weight is not None:
+        effect_size = effect_size * weight[which_vars]
+    return which_vars, effect_size
+
+
+def _effect_noise(shape, noise):
+    # Detect if noise is constant or a covariance matrix
+    if isinstance(noise, np.ndarray):
+        return np.dot(np.random.randn(*shape), noise)
+    return np.random.randn(*shape) * noise
+
+
+def effect_cohen_d(x, effect_size, which_vars=0, which_samples=0, standardized=True, noise=0, weight=None,
+                   column_std=None):
     """
 
     Modify a data matrix adding an artificial effect parametrized by Cohen's d measure.
@@ -14,37 +50,99 @@ def effect_cohen_d(x, effect_size, which_vars=0, which_samples=0, standardized=T
     :param boolean standardized: If True, use standardized effect size.
     :param float or numpy.ndarray noise: Noise value to add or noise covariance matrix.
     :param numpy.ndarray weight: Vector of values to weight the effect size (for example, pearson correlation).
+    :param numpy.ndarray column_std: Precomputed standard deviation of every column (for example, of the whole
+    simulated population). If None, it is calculated from x for the required variables.
     :return: Modified data matrix, with the added effect in the requested rows and columns
     and spiked in gaussian noise (optional).
     :rtype: numpy.ndarray
     """
 
     try:
+        return effect_cohen_d_inplace(np.copy(x), effect_size, which_vars=which_vars, which_samples=which_samples,
+                                      standardized=standardized, noise=noise, weight=weight, column_std=column_std)
 
-        # if float, which_vars is interpreted as a proportion of variables, randomly selected
-        if isinstance(which_vars, float):
-            n_vars = which_samples * x.shape[1]
-            which_vars = np.random.choice(x.shape[1], n_vars, replace=False)
-        if which_vars.dtype in [float, int]:
-            which_vars = np.where(which_vars)[0]
-        # Use a standardized effect size
-        if standardized is True:
-            effect_size *= np.std(x[:, which_vars], axis=0)
-        # Option to use weights  - ie, correlation weights
-        if weight is not None:
-            effect_size *= weight[which_vars]
-
-        # Detect if noise is constant or a covariance matrix
-        if isinstance(noise, np.ndarray):
-            noise = np.dot(np.random.randn(np.array(which_samples).size, np.array(which_vars).size), noise)
-        else:
-            noise = np.random.randn(np.array(which_samples).size, np.array(which_vars).size) * noise
-        # Add the effect and generate the output matrix
-        x_modified = np.copy(x)
-        x_modified[np.ix_(which_samples, which_vars)] = x_modified[np.ix_(which_samples, which_vars)] \
-                                                        + effect_size + noise
+    except TypeError as terr:
+        raise terr
+    except ValueError as verr:
+        raise verr
+    except Exception as exp:
+        raise exp
+
+
+def effect_cohen_d_inplace(x, effect_size, which_vars=0, which_samples=0, standardized=True, noise=0, weight=None,
+                           column_std=None):
+    """
+
+    In-place version of :py:func:`effect_cohen_d`. Only the which_samples x which_vars cells of x are touched, and
+    with precomputed column_std the work done does not depend on the size of x.
+
+    :param numpy.ndarray x: Data matrix, modified in place
+    :param numpy.ndarray or float effect_size: Value or vector of effect size to add
+    :param numpy.ndarray, int which_vars: Index of variables to modify.
+    :param numpy.ndarray or int which_samples: Index of samples to modify.
+    :param boolean standardized: If True, use standardized effect size.
+    :param float or numpy.ndarray noise: Noise value to add or noise covariance matrix.
+    :param numpy.ndarray weight: Vector of values to weight the effect size (for example, pearson correlation).
+    :param numpy.ndarray column_std: Precomputed standard deviation of every column. See :py:func:`effect_cohen_d`
+    :return: x, with the added effect in the requested rows and columns
+    :rtype: numpy.ndarray
+    """
+
+    try:
+        which_vars, effect_size = _effect_values(x, effect_size, which_vars, standardized, weight, column_std)
+        which_samples = np.atleast_1d(which_samples)
+
+        cells = np.ix_(which_samples, which_vars)
+        x[cells] += effect_size + _effect_noise((which_samples.size, which_vars.size), noise)
+
+        return x
+
+    except TypeError as terr:
+        raise terr
+    except ValueError as verr:
+        raise verr
+    except Exception as exp:
+        raise exp
+
+
+def effect_cohen_d_batch(x, effect_size, which_vars=0, which_samples=0, standardized=True, noise=0, weight=None,
+                         column_std=None):
+    """
+
+    Add an artificial effect parametrized by Cohen's d measure to a stack of data matrices (one per Monte Carlo
+    repeat) at once, in place.
+
+    :param numpy.ndarray x: Stack of data matrices [n_repeats, n_samples, n_features], modified in place
+    :param numpy.ndarray or float effect_size: Value or vector of effect size to add
+    :param numpy.ndarray, int which_vars: Index of variables to modify, the same for all repeats.
+    :param numpy.ndarray which_samples: Index of samples to modify in each repeat, [n_repeats, n_modified]. A 1D
+    array modifies the same samples in all repeats.
+    :param boolean standardized: If True, use standardized effect size. Without column_std, the standard deviation
+    is calculated separately for each repeat.
+    :param float or numpy.ndarray noise: Noise value to add or noise covariance matrix.
+    :param numpy.ndarray weight: Vector of values to weight the effect size (for example, pearson correlation).
+    :param numpy.ndarray column_std: Precomputed standard deviation of every column. See :py:func:`effect_cohen_d`
+    :return: x, with the added effect in the requested rows and columns of every repeat
+    :rtype: numpy.ndarray
+    """
+
+    try:
+        if x.ndim != 3:
+            raise ValueError("x must be a stack of data matrices [n_repeats, n_samples, n_features]")
+        which_vars, effect_size = _effect_values(x, effect_size, which_vars, standardized, weight, column_std)
+        n_repeats = x.shape[0]
+        which_samples = np.asarray(which_samples)
+        if which_samples.ndim < 2:
+            which_samples = np.broadcast_to(np.atleast_1d(which_samples), (n_repeats, which_samples.size))
+
+        # Per repeat standard deviations have shape [n_repeats, n_vars], add the sample axis to broadcast them
+        if effect_size.ndim == 2:
+            effect_size = effect_size[:, None, :]
+
+        cells = (np.arange(n_repeats)[:, None, None], which_samples[:, :, None], which_vars[None, None, :])
+        x[cells] += effect_size + _effect_noise((n_repeats, which_samples.shape[1], which_vars.size), noise)
 
-        return x_modified
+        return x
 
     except TypeError as terr:
         raise terr
@@ -1,9 +1,57 @@
 import numpy as np
+from scipy import sparse
 from sklearn.covariance import LedoitWolf, OAS
 import sys
 
 
-def simulateLogNormal(data, covtype='Estimate', nsamples=2000, **kwargs):
+def sparse_correlation(data, threshold=0.8, block_size=1000):
+    """
+
+    Compute the variable-wise Pearson correlation matrix of a data matrix block by block, keeping only the
+    entries with an absolute value equal to or above a threshold. The dense [n_features, n_features] matrix is
+    never formed; at most [n_features, block_size] correlations are held in memory at any time.
+
+    :param numpy.ndarray data: Data matrix [n_samples, n_features], each column is a variable
+    :param float threshold: Absolute correlation value below which entries are discarded
+    :param int block_size: Number of columns of the correlation matrix computed in each block
+    :return: Sparse correlation matrix [n_features, n_features] in CSC format. Column j holds the
+    correlation neighbours of variable j. The diagonal is always stored.
+    :rtype: scipy.sparse.csc_matrix
+    """
+    try:
+        n_samples, n_vars = data.shape
+        # Standardise the columns once, so each block is a single matrix product
+        zdata = data - np.mean(data, axis=0)
+        std = np.std(zdata, axis=0)
+        constant = std == 0
+        std[constant] = 1
+        zdata /= std
+        zdata[:, constant] = 0
+
+        rows = list()
+        cols = list()
+        vals = list()
+        for start in range(0, n_vars, block_size):
+            stop = min(start + block_size, n_vars)
+            block_corr = np.dot(zdata.T, zdata[:, start:stop]) / n_samples
+            # Variables with no variance only correlate with themselves
+            block_corr[start + np.arange(stop - start), np.arange(stop - start)] = 1
+            row_idx, col_idx = np.nonzero(np.abs(block_corr) >= threshold)
+            rows.append(row_idx)
+            cols.append(col_idx + start)
+            vals.append(np.clip(block_corr[row_idx, col_idx], -1, 1))
+
+        corrMatrix = sparse.csc_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                                       shape=(n_vars, n_vars))
+
+        return corrMatrix
+
+    except Exception as exp:
+        raise exp
+
+
+def simulateLogNormal(data, covtype='Estimate', nsamples=2000, correlation_threshold=None, block_size=1000,
+                      seed=None, **kwargs):
     """
 
     :param data:
@@ -12,6 +60,11 @@ def simulateLogNormal(data, covtype='Estimate', nsamples=2000, **kwargs):
         - Diagonal:
         - Shrinkage OAS:
     :param int nsamples: Number of simulated samples to draw
+    :param float correlation_threshold: If None (default) the dense correlation matrix is returned. Otherwise,
+    the correlation matrix is computed blockwise and returned as a sparse matrix with only the entries where the
+    absolute correlation is above this threshold. See :py:func:`sparse_correlation`.
+    :param int block_size: Number of columns per block when computing the sparse correlation matrix.
+    :param int seed: Seed for the random number generator. If None (default) the global numpy random state is used.
     :return: simulated data and empirical covariance est
     """
 
@@ -46,14 +99,20 @@ def simulateLogNormal(data, covtype='Estimate', nsamples=2000, **kwargs):
         else:
             raise ValueError('Unknown Covariance type')
 
-        simData = np.random.multivariate_normal(meanslog, covlog, nsamples)
+        if seed is None:
+            simData = np.random.multivariate_normal(meanslog, covlog, nsamples)
+        else:
+            simData = np.random.RandomState(seed).multivariate_normal(meanslog, covlog, nsamples)
         simData = np.exp(simData)
         simData -= offset
 
         ##Set to 0 negative values
         simData[np.where(simData < 0)] = 0
         # work out the correlation of matrix by columns, each column is a variable
-        corrMatrix = np.corrcoef(simData, rowvar=0)
+        if correlation_threshold is None:
+            corrMatrix = np.corrcoef(simData, rowvar=0)
+        else:
+            corrMatrix = sparse_correlation(simData, threshold=correlation_threshold, block_size=block_size)
 
         return simData, corrMatrix
 
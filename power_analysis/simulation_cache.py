@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from scipy import sparse
+
+from .simulateLogNormal import simulateLogNormal
+
+"""
+On-disk, content-addressed cache of simulated datasets. Each entry holds the simulated data matrix and its
+correlation structure as .npy files, which are loaded back as read-only memory maps. Entries are evicted in least
+recently used order when the total size of the cache exceeds a limit.
+"""
+
+_metadata_file = 'metadata.json'
+
+
+def simulation_cache_key(data, covtype='Estimate', nsamples=2000, seed=None, correlation_threshold=None,
+                         block_size=1000):
+    """
+
+    Hash of everything that determines the output of :py:func:`simulateLogNormal`.
+
+    :param numpy.ndarray data: Reference data matrix [n_samples, n_features]
+    :param str covtype: Type of covariance matrix estimator
+    :param int nsamples: Number of simulated samples
+    :param int seed: Seed for the random number generator
+    :param float correlation_threshold: Threshold for the sparse correlation matrix, or None for the dense matrix
+    :param int block_size: Block size used for the sparse correlation matrix
+    :return: Hexadecimal digest
+    :rtype: str
+    """
+    data = np.ascontiguousarray(data)
+    digest = hashlib.sha256()
+    digest.update(str(data.dtype).encode())
+    digest.update(str(data.shape).encode())
+    digest.update(data.tobytes())
+    digest.update(json.dumps([covtype, int(nsamples), seed, correlation_threshold,
+                              int(block_size) if correlation_threshold is not None else None]).encode())
+    return digest.hexdigest()
+
+
+def _entry_size(entry_path):
+    return sum(os.path.getsize(os.path.join(entry_path, fname)) for fname in os.listdir(entry_path))
+
+
+def _evict(cache_dir, max_cache_size, keep=None):
+    """
+    Remove the least recently used entries until the total cache size is below max_cache_size.
+    The entry named keep is never evicted.
+    """
+    entries = list()
+    for key in os.listdir(cache_dir):
+        entry_path = os.path.join(cache_dir, key)
+        metadata_path = os.path.join(entry_path, _metadata_file)
+        if not os.path.isfile(metadata_path):
+            continue
+        entries.append((os.path.getmtime(metadata_path), key, _entry_size(entry_path)))
+
+    total_size = sum(entry[2] for entry in entries)
+    for last_used, key, size in sorted(entries):
+        if total_size <= max_cache_size:
+            break
+        if key == keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+        total_size -= size
+
+
+def _save_entry(entry_path, simulated_data, correlation_matrix):
+    np.save(os.path.join(entry_path, 'simdata.npy'), simulated_data)
+    if sparse.issparse(correlation_matrix):
+        correlation_matrix = sparse.csc_matrix(correlation_matrix)
+        np.save(os.path.join(entry_path, 'corr_data.npy'), correlation_matrix.data)
+        np.save(os.path.join(entry_path, 'corr_indices.npy'), correlation_matrix.indices)
+        np.save(os.path.join(entry_path, 'corr_indptr.npy'), correlation_matrix.indptr)
+        metadata = {'correlation': 'sparse', 'shape': correlation_matrix.shape}
+    else:
+        np.save(os.path.join(entry_path, 'corr.npy'), correlation_matrix)
+        metadata = {'correlation': 'dense', 'shape': correlation_matrix.shape}
+    with open(os.path.join(entry_path, _metadata_file), 'w') as metadata_handle:
+        json.dump(metadata, metadata_handle)
+
+
+def _load_entry(entry_path):
+    with open(os.path.join(entry_path, _metadata_file), 'r') as metadata_handle:
+        metadata = json.load(metadata_handle)
+    simulated_data = np.load(os.path.join(entry_path, 'simdata.npy'), mmap_mode='r')
+    if metadata['correlation'] == 'sparse':
+        # The sparse matrix constructor needs writable index arrays, the values themselves stay memory mapped
+        correlation_matrix = sparse.csc_matrix((np.load(os.path.join(entry_path, 'corr_data.npy'), mmap_mode='r'),
+                                                np.load(os.path.join(entry_path, 'corr_indices.npy')),
+                                                np.load(os.path.join(entry_path, 'corr_indptr.npy'))),
+                                               shape=tuple(metadata['shape']))
+    else:
+        correlation_matrix = np.load(os.path.join(entry_path, 'corr.npy'), mmap_mode='r')
+    return simulated_data, correlation_matrix
+
+
+def cached_simulateLogNormal(data, covtype='Estimate', nsamples=2000, seed=None, cache_dir=None,
+                             max_cache_size=2 * 1024 ** 3, correlation_threshold=None, block_size=1000, **kwargs):
+    """
+
+    Cached version of :py:func:`simulateLogNormal`. The simulated data and correlation matrix are stored in
+    cache_dir, keyed by a hash of the reference data, covtype, nsamples, seed and correlation settings, and loaded
+    as read-only memory maps on later calls with the same arguments.
+
+    Without a seed the simulation is not reproducible, so nothing is cached.
+
+    :param numpy.ndarray data: Reference data matrix [n_samples, n_features]
+    :param str covtype: Type of covariance matrix estimator. See :py:func:`simulateLogNormal`
+    :param int nsamples: Number of simulated samples to draw
+    :param int seed: Seed for the random number generator. Required for caching
+    :param str cache_dir: Directory where the cache entries are stored. If None, nothing is cached
+    :param int max_cache_size: Maximum total size of the cache in bytes. Least recently used entries are removed
+    when this is exceeded.
+    :param float correlation_threshold: See :py:func:`simulateLogNormal`
+    :param int block_size: See :py:func:`simulateLogNormal`
+    :return: simulated data and correlation matrix
+    """
+    try:
+        if cache_dir is None or seed is None:
+            return simulateLogNormal(data, covtype, nsamples, correlation_threshold=correlation_threshold,
+                                     block_size=block_size, seed=seed, **kwargs)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        key = simulation_cache_key(data, covtype, nsamples, seed, correlation_threshold, block_size)
+        entry_path = os.path.join(cache_dir, key)
+        metadata_path = os.path.join(entry_path, _metadata_file)
+
+        if os.path.isfile(metadata_path):
+            # Mark the entry as recently used
+            os.utime(metadata_path, None)
+            return _load_entry(entry_path)
+
+        simulated_data, correlation_matrix = simulateLogNormal(data, covtype, nsamples,
+                                                               correlation_threshold=correlation_threshold,
+                                                               block_size=block_size, seed=seed, **kwargs)
+
+        # Write to a temporary folder first, so other processes never see a partially written entry
+        temp_folder = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp_')
+        try:
+            _save_entry(temp_folder, simulated_data, correlation_matrix)
+            os.rename(temp_folder, entry_path)
+        except OSError:
+            # Another process stored the same entry in the meantime
+            shutil.rmtree(temp_folder, ignore_errors=True)
+            if not os.path.isfile(metadata_path):
+                raise
+        os.utime(metadata_path, (time.time(), time.time()))
+
+        _evict(cache_dir, max_cache_size, keep=key)
+
+        return _load_entry(entry_path)
+
+    except Exception as exp:
+        raise exp
@@ -5,6 +5,8 @@ from sklearn.model_selection import BaseCrossValidator, KFold
 from sklearn.model_selection._split import BaseShuffleSplit
 from .ChemometricsScaler import ChemometricsScaler
 from ._ortho_filter_pls import OrthogonalPLSRegression
+from ._model_utils import score_samples as _score_samples, cv_sample_list as _cv_sample_list, \
+    align_signs as _align_signs, apply_signs as _apply_signs, vip as _vip
 from matplotlib.colors import Normalize
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
@@ -83,7 +85,7 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
             self.rotations_cs = None
             self.beta_coeffs = None
 
-            self.n_components = n_components
+            self._n_components = n_components
             self.x_scaler = x_scaler
             self._y_scaler = yscaler
             self.cvParameters = None
@@ -98,6 +100,9 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
 
         Perform model fitting on the provided x and y data and calculate basic goodness-of-fit metrics.
         Similar to scikit-learn's BaseEstimator method.
+        The combined loadings_p, loadings_q, scores_t, scores_u, weights_w and weights_c have the predictive component
+        first and the orthogonal components after it. The rotations_ws and rotations_cs, and the t and u scores (the
+        ones returned by transform), have the orthogonal components first and the predictive component last.
 
         :param x: Data matrix to fit the Orthogonal PLS model.
         :type x: numpy.ndarray, shape [n_samples, n_features].
@@ -139,6 +144,14 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
             self.u_ortho = self.pls_algorithm.u_ortho
             self.q_ortho = self.pls_algorithm.q_ortho
 
+            # Predictive and orthogonal parameters together, as in ChemometricsOrthogonalPLSDA
+            self.loadings_p = np.c_[self.p_pred, self.p_ortho]
+            self.loadings_q = np.c_[self.q_pred, self.q_ortho]
+            self.scores_t = np.c_[self.t_pred, self.t_ortho]
+            self.scores_u = np.c_[self.u_pred, self.u_ortho]
+            self.weights_w = np.c_[self.w_pred, self.w_ortho]
+            self.weights_c = np.c_[self.c_pred, self.c_ortho]
+
             self.b_t = self.pls_algorithm.b_t
             self.b_u = self.pls_algorithm.b_u
             # scores so everything can be calculated easily
@@ -153,7 +166,17 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
             R2Y = ChemometricsOrthogonalPLS.score(self, x=x, y=y, block_to_score='y')
             R2X = ChemometricsOrthogonalPLS.score(self, x=x, y=y, block_to_score='x')
 
-            self.modelParameters = {'R2Y': R2Y, 'R2X': R2X}
+            # Obtain residual sum of squares for whole data set and per component
+            cm_fit = self._cummulativefit(x, y)
+
+            self.modelParameters = {'R2Y': R2Y, 'R2X': R2X, 'SSX': cm_fit['SSX'], 'SSY': cm_fit['SSY'],
+                                    'SSXcomp': cm_fit['SSXcomp'], 'SSYcomp': cm_fit['SSYcomp'],
+                                    'SSYcompResponse': cm_fit['SSYcompResponse']}
+
+            # For "Normalised" DmodX calculation
+            resid_ssx = self._residual_ssx(x)
+            s0 = np.sqrt(resid_ssx.sum() / ((self.t.shape[0] - self.n_components - 1) * (x.shape[1] - self.n_components)))
+            self.modelParameters['S0X'] = s0
 
         except ValueError as verr:
             raise verr
@@ -189,7 +212,8 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
         :type x: numpy.ndarray, shape [n_samples, n_features] or None
         :param y: Data matrix to fit the PLS model.
         :type y: numpy.ndarray, shape [n_samples, n_features] or None
-        :return: Latent Variable scores (T) for the X matrix and for the Y vector/matrix (U).
+        :return: Latent Variable scores (T) for the X matrix and for the Y vector/matrix (U), with the orthogonal
+        components first and the predictive component last (the column order of t and u, not of scores_t and scores_u).
         :rtype: tuple with 2 numpy.ndarray, shape [n_samples, n_comps]
         :raise ValueError: If dimensions of input data are mismatched.
         :raise AttributeError: When calling the method before the model is fitted.
@@ -240,9 +264,10 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
         Transform scores to the original data space using their corresponding loadings.
         Same logic as in scikit-learn's TransformerMixin method.
 
-        :param t: T scores corresponding to the X data matrix.
+        :param t: T scores corresponding to the X data matrix, with the orthogonal components first and the predictive
+        component last, as returned by transform.
         :type t: numpy.ndarray, shape [n_samples, n_comps] or None
-        :param u: Y scores corresponding to the Y data vector/matrix.
+        :param u: Y scores corresponding to the Y data vector/matrix, in the same column order as t.
         :type u: numpy.ndarray, shape [n_samples, n_comps] or None
         :return x: X Data matrix in the original data space.
         :rtype: numpy.ndarray, shape [n_samples, n_features] or None
@@ -418,7 +443,8 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
         :param y: Data matrix to fit the PLS model.
         :type y: numpy.ndarray, shape [n_samples, n_features]
         :return: dictionary object containing the total Regression Sum of Squares and the Sum of Squares
-        per components, for both the X and Y data blocks.
+        per components, for both the X and Y data blocks, and the Y Sum of Squares per component for each
+        response ('SSYcompResponse', shape [n_components, n_responses]).
         :rtype: dict
         """
 
@@ -443,12 +469,14 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
 
             ypred = self.y_scaler.transform(ChemometricsOrthogonalPLS.predict(model, x, y=None, reduce_ncomps = True))
             xpred = self.x_scaler.transform(ChemometricsOrthogonalPLS.predict(model, x=None, y=y, reduce_ncomps = True))
-            rssy = np.sum(np.square(yscaled - ypred))
+            rssy_response = np.sum(np.square(yscaled - ypred), axis=0)
             rssx = np.sum(np.square(xscaled - xpred))
             ssx_comp.append(rssx)
-            ssy_comp.append(rssy)
+            ssy_comp.append(rssy_response)
 
-        cumulative_fit = {'SSX': SSX, 'SSY': SSY, 'SSXcomp': np.array(ssx_comp), 'SSYcomp': np.array(ssy_comp)}
+        ssy_comp = np.array(ssy_comp)
+        cumulative_fit = {'SSX': SSX, 'SSY': SSY, 'SSXcomp': np.array(ssx_comp), 'SSYcomp': ssy_comp.sum(axis=1),
+                          'SSYcompResponse': ssy_comp}
 
         return cumulative_fit
     
@@ -554,10 +582,61 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
         :param x: data matrix [n samples, m variables]
         :return: The Normalised DmodX measure for each sample
         """
-        resids_ssx = self._residual_ssx(x)
-        s = np.sqrt(resids_ssx/(self.p_pred.shape[1] - self.n_components))
-        dmodx = np.sqrt((s/self.modelParameters['S0X'])**2)
-        return dmodx
+        return self.score_samples(x)['DmodX']
+
+    def _residual_ssx(self, x):
+        """
+
+        :param x: Data matrix [n samples, m variables]
+        :return: The residual Sum of Squares per sample
+        """
+        return self.score_samples(x)['RSS']
+
+    def _projection_parameters(self):
+        """
+
+        Linear projection of the X block used by the model: the scaler, the rotations and loadings, the training scores
+        and the S0X used to normalise the DmodX. The rotations, loadings and scores all have the orthogonal components
+        first and the predictive component last, the column order of transform (not of loadings_p).
+
+        :return: Dictionary with the keyword arguments of :py:func:`pyChemometrics._model_utils.score_samples`
+        :rtype: dict
+        :raise AttributeError: If the model is not fitted
+        """
+        if self._isfitted is False:
+            raise AttributeError("Model is not fitted")
+        if self.p_ortho is not None:
+            p_loadings = np.c_[self.p_ortho, self.p_pred]
+        else:
+            p_loadings = self.p_pred
+        s0 = None
+        if self.modelParameters is not None:
+            s0 = self.modelParameters.get('S0X', None)
+
+        return {'rotations': self.rotations_ws, 'loadings': p_loadings, 'reference_scores': self.t, 's0': s0,
+                'scaler': self.x_scaler, 'offset': None}
+
+    def score_samples(self, x, chunk_size=1000):
+        """
+
+        Calculate the scores (orthogonal and predictive), Hotelling T2, normalised DmodX and X residual sum of squares
+        of each observation in a single pass. The data is processed in blocks of chunk_size rows with preallocated
+        buffers, so large batches can be screened in bounded memory.
+
+        :param x: Data matrix [n samples, m variables]
+        :param int chunk_size: Number of observations processed at a time. If None, all at once.
+        :return: Dictionary with the 'Scores', 'T2', 'DmodX' and 'RSS' of each observation. The 'Scores' have the
+        orthogonal components first and the predictive component last, as returned by transform.
+        :rtype: dict
+        :raise AttributeError: If the model is not fitted
+        """
+        try:
+            return _score_samples(x, chunk_size=chunk_size, **self._projection_parameters())
+
+        except AttributeError as atter:
+            raise atter
+        except ValueError as verr:
+            raise verr
 
     def outlier(self, x, comps=None, measure='T2', alpha=0.05):
         """
@@ -956,7 +1035,7 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
             raise typerr
 
     def cross_validation(self, x, y, cv_method=KFold(n_splits=7, shuffle=True), outputdist=False,
-                         **crossval_kwargs):
+                         collect='all', **crossval_kwargs):
         """
 
         Cross-validation method for the model. Calculates Q2 and cross-validated estimates for all model parameters.
@@ -968,16 +1047,21 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
         :param cv_method: An instance of a scikit-learn CrossValidator object.
         :type cv_method: BaseCrossValidator or BaseShuffleSplit
         :param bool outputdist: Output the whole distribution for. Useful when ShuffleSplit or CrossValidators other than KFold.
+        :param str collect: 'all' to calculate cross-validated estimates of all the model parameters, or 'metrics' to
+        calculate only the Q2 and R2, which is faster when only these are needed (for example, to choose the number
+        of components or in permutation tests).
         :param kwargs crossval_kwargs: Keyword arguments to be passed to the sklearn.Pipeline during cross-validation
         :return:
         :rtype: dict
         :raise TypeError: If the cv_method passed is not a scikit-learn CrossValidator object.
-        :raise ValueError: If the x and y data matrices are invalid.
+        :raise ValueError: If the x and y data matrices are invalid or collect is not 'all' or 'metrics'.
         """
 
         try:
             if not (isinstance(cv_method, BaseCrossValidator) or isinstance(cv_method, BaseShuffleSplit)):
                 raise TypeError("Scikit-learn cross-validation object please")
+            if collect not in ('all', 'metrics'):
+                raise ValueError("collect must be 'all' or 'metrics'")
 
             # Check if global model is fitted... and if not, fit it using all of X
             if self._isfitted is False:
@@ -1000,19 +1084,21 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
                 y = y.reshape(-1, 1)
 
             # Initialize arrays
-            cv_loadings_p = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_loadings_q = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_weights_w = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_weights_c = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_rotations_ws = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_rotations_cs = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_betacoefs = np.zeros((ncvrounds, x_nvars))
-            cv_vipsw = np.zeros((ncvrounds, x_nvars))
+            keep_parameters = collect == 'all'
+            if keep_parameters:
+                cv_loadings_p = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_loadings_q = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_weights_w = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_weights_c = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_rotations_ws = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_rotations_cs = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_betacoefs = np.zeros((ncvrounds, x_nvars))
+                cv_ssy_comp = np.zeros((ncvrounds, self.n_components))
             
-            cv_train_scores_t = list()
-            cv_train_scores_u = list()
-            cv_test_scores_t = list()
-            cv_test_scores_u = list()
+                cv_train_scores_t = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
+                cv_train_scores_u = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
+                cv_test_scores_t = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
+                cv_test_scores_u = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
 
             # Initialise predictive residual sum of squares variable (for whole CV routine)
             pressy = 0
@@ -1083,38 +1169,29 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
                 pressx += curr_pressx
                 pressy += curr_pressy
 
-                cv_loadings_p[cvround, :, :] = cv_pipeline.loadings_p
-                cv_loadings_q[cvround, :, :] = cv_pipeline.loadings_q
-                cv_weights_w[cvround, :, :] = cv_pipeline.weights_w
-                cv_weights_c[cvround, :, :] = cv_pipeline.weights_c
-                cv_rotations_ws[cvround, :, :] = cv_pipeline.rotations_ws
-                cv_rotations_cs[cvround, :, :] = cv_pipeline.rotations_cs
-                cv_betacoefs[cvround, :] = cv_pipeline.beta_coeffs.T
-                cv_vipsw[cvround, :] = cv_pipeline.VIP()
-
-            for cvround in range(0, ncvrounds):
-                for currload in range(0, self.n_components):
-                    # evaluate based on loadings _p
-                    choice = np.argmin(
-                        np.array([np.sum(np.abs(self.loadings_p[:, currload] - cv_loadings_p[cvround, :, currload])),
-                                  np.sum(np.abs(
-                                      self.loadings_p[:, currload] - cv_loadings_p[cvround, :, currload] * -1))]))
-                    if choice == 1:
-                        cv_loadings_p[cvround, :, currload] = -1 * cv_loadings_p[cvround, :, currload]
-                        cv_loadings_q[cvround, :, currload] = -1 * cv_loadings_q[cvround, :, currload]
-                        cv_weights_w[cvround, :, currload] = -1 * cv_weights_w[cvround, :, currload]
-                        cv_weights_c[cvround, :, currload] = -1 * cv_weights_c[cvround, :, currload]
-                        cv_rotations_ws[cvround, :, currload] = -1 * cv_rotations_ws[cvround, :, currload]
-                        cv_rotations_cs[cvround, :, currload] = -1 * cv_rotations_cs[cvround, :, currload]
-                        cv_train_scores_t.append([*zip(train, -1 * cv_pipeline.scores_t)])
-                        cv_train_scores_u.append([*zip(train, -1 * cv_pipeline.scores_u)])
-                        cv_test_scores_t.append([*zip(test, -1 * cv_pipeline.scores_t)])
-                        cv_test_scores_u.append([*zip(test, -1 * cv_pipeline.scores_u)])
-                    else:
-                        cv_train_scores_t.append([*zip(train, cv_pipeline.scores_t)])
-                        cv_train_scores_u.append([*zip(train, cv_pipeline.scores_u)])
-                        cv_test_scores_t.append([*zip(test, cv_pipeline.scores_t)])
-                        cv_test_scores_u.append([*zip(test, cv_pipeline.scores_u)])
+                if keep_parameters:
+                    cv_loadings_p[cvround, :, :] = cv_pipeline.loadings_p
+                    cv_loadings_q[cvround, :, :] = cv_pipeline.loadings_q
+                    cv_weights_w[cvround, :, :] = cv_pipeline.weights_w
+                    cv_weights_c[cvround, :, :] = cv_pipeline.weights_c
+                    cv_rotations_ws[cvround, :, :] = cv_pipeline.rotations_ws
+                    cv_rotations_cs[cvround, :, :] = cv_pipeline.rotations_cs
+                    cv_betacoefs[cvround, :] = cv_pipeline.beta_coeffs.T
+                    cv_ssy_comp[cvround, :] = cv_pipeline.modelParameters['SSYcomp']
+
+                    # Scores of the samples used in this round, the ones left out stay NaN
+                    cv_train_scores_t[cvround, train, :] = cv_pipeline.t
+                    cv_train_scores_u[cvround, train, :] = cv_pipeline.u
+                    cv_test_scores_t[cvround, test, :] = cv_pipeline.transform(xtest, None)
+                    cv_test_scores_u[cvround, test, :] = cv_pipeline.transform(None, ytest)
+
+            if keep_parameters:
+                # VIP of all the rounds in a single matrix product
+                cv_vipsw = _vip(cv_weights_w, cv_ssy_comp)
+                signs = _align_signs(self.loadings_p, cv_loadings_p, cv_loadings_q, cv_weights_w, cv_weights_c)
+                # The rotations and scores have the orthogonal components first and the predictive component last
+                _apply_signs(np.roll(signs, -1, axis=1), cv_rotations_ws, cv_rotations_cs, cv_train_scores_t,
+                             cv_train_scores_u, cv_test_scores_t, cv_test_scores_u)
 
             # Calculate total sum of squares
             q_squaredy = 1 - (pressy / ssy)
@@ -1125,16 +1202,20 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
                                  'MeanR2Y_Training': np.mean(R2Y_training), 'StdevR2X_Training': np.std(R2X_training),
                                  'StdevR2Y_Training': np.std(R2Y_training), 'MeanR2X_Test': np.mean(R2X_test),
                                  'MeanR2Y_Test': np.mean(R2Y_test), 'StdevR2X_Test': np.std(R2X_test),
-                                 'StdevR2Y_Test': np.std(R2Y_test), 'Mean_Loadings_q': cv_loadings_q.mean(0),
-                                 'Stdev_Loadings_q': cv_loadings_q.std(0), 'Mean_Loadings_p': cv_loadings_p.mean(0),
-                                 'Stdev_Loadings_p': cv_loadings_q.std(0), 'Mean_Weights_c': cv_weights_c.mean(0),
-                                 'Stdev_Weights_c': cv_weights_c.std(0), 'Mean_Weights_w': cv_weights_w.mean(0),
-                                 'Stdev_Weights_w': cv_weights_w.std(0), 'Mean_Rotations_ws': cv_rotations_ws.mean(0),
-                                 'Stdev_Rotations_ws': cv_rotations_ws.std(0),
-                                 'Mean_Rotations_cs': cv_rotations_cs.mean(0),
-                                 'Stdev_Rotations_cs': cv_rotations_cs.std(0), 'Mean_Beta': cv_betacoefs.mean(0),
-                                 'Stdev_Beta': cv_betacoefs.std(0), 'Mean_VIP': cv_vipsw.mean(0),
-                                 'Stdev_VIP': cv_vipsw.std(0)}
+                                 'StdevR2Y_Test': np.std(R2Y_test)}
+            if keep_parameters:
+                self.cvParameters.update({'Mean_Loadings_q': cv_loadings_q.mean(0),
+                                          'Stdev_Loadings_q': cv_loadings_q.std(0),
+                                          'Mean_Loadings_p': cv_loadings_p.mean(0),
+                                          'Stdev_Loadings_p': cv_loadings_q.std(0),
+                                          'Mean_Weights_c': cv_weights_c.mean(0), 'Stdev_Weights_c': cv_weights_c.std(0),
+                                          'Mean_Weights_w': cv_weights_w.mean(0), 'Stdev_Weights_w': cv_weights_w.std(0),
+                                          'Mean_Rotations_ws': cv_rotations_ws.mean(0),
+                                          'Stdev_Rotations_ws': cv_rotations_ws.std(0),
+                                          'Mean_Rotations_cs': cv_rotations_cs.mean(0),
+                                          'Stdev_Rotations_cs': cv_rotations_cs.std(0),
+                                          'Mean_Beta': cv_betacoefs.mean(0), 'Stdev_Beta': cv_betacoefs.std(0),
+                                          'Mean_VIP': cv_vipsw.mean(0), 'Stdev_VIP': cv_vipsw.std(0)})
 
             # Save everything found during CV
             if outputdist is True:
@@ -1142,53 +1223,71 @@ class ChemometricsOrthogonalPLS(BaseEstimator, RegressorMixin, TransformerMixin)
                 self.cvParameters['CVR2Y_Training'] = R2Y_training
                 self.cvParameters['CVR2X_Test'] = R2X_test
                 self.cvParameters['CVR2Y_Test'] = R2Y_test
-                self.cvParameters['CV_Loadings_q'] = cv_loadings_q
-                self.cvParameters['CV_Loadings_p'] = cv_loadings_p
-                self.cvParameters['CV_Weights_c'] = cv_weights_c
-                self.cvParameters['CV_Weights_w'] = cv_weights_w
-                self.cvParameters['CV_Rotations_ws'] = cv_rotations_ws
-                self.cvParameters['CV_Rotations_cs'] = cv_rotations_cs
-                self.cvParameters['CV_Train_Scores_t'] = cv_train_scores_t
-                self.cvParameters['CV_Train_Scores_u'] = cv_test_scores_u
-                self.cvParameters['CV_Beta'] = cv_betacoefs
-                self.cvParameters['CV_VIPw'] = cv_vipsw
+                if keep_parameters:
+                    self.cvParameters['CV_Loadings_q'] = cv_loadings_q
+                    self.cvParameters['CV_Loadings_p'] = cv_loadings_p
+                    self.cvParameters['CV_Weights_c'] = cv_weights_c
+                    self.cvParameters['CV_Weights_w'] = cv_weights_w
+                    self.cvParameters['CV_Rotations_ws'] = cv_rotations_ws
+                    self.cvParameters['CV_Rotations_cs'] = cv_rotations_cs
+                    self.cvParameters['CV_Train_Scores_t'] = cv_train_scores_t
+                    self.cvParameters['CV_Train_Scores_u'] = cv_train_scores_u
+                    self.cvParameters['CV_Test_Scores_t'] = cv_test_scores_t
+                    self.cvParameters['CV_Test_Scores_u'] = cv_test_scores_u
+                    self.cvParameters['CV_Beta'] = cv_betacoefs
+                    self.cvParameters['CV_VIPw'] = cv_vipsw
 
             return None
 
         except TypeError as terp:
             raise terp
-            
-    def VIP(self):
+
+    def cv_sample_list(self, parameter):
         """
 
-        Output the Variable importance for projection metric (VIP). With the default values it is calculated
-        using the x variable weights and the variance explained of y.
+        Per sample cross-validation output (for example 'CV_TestScores_t' or 'CV_TestSamplePrediction') as lists of
+        (sample index, value) pairs for each cross-validation round. The cross_validation method stores these as arrays
+        [n_rounds, n_samples, ...] with NaN for the samples not used in a round.
 
-        Note: Code not adequate to obtain a VIP for each individual variable in the multi-Y case, as SSY should be changed
-        so that it is calculated for each y and not for the whole Y matrix
+        :param str parameter: Key of the parameter in cvParameters (or in cvParameters['DA'])
+        :return: List (one per round) of lists of (sample index, value) tuples
+        :rtype: list
+        :raise AttributeError: If the model has not been cross-validated
+        :raise KeyError: If the parameter was not stored by the cross-validation (requires outputdist=True)
+        """
+        try:
+            if self.cvParameters is None:
+                raise AttributeError("Run cross_validation with outputdist=True first")
+            if parameter in self.cvParameters:
+                return _cv_sample_list(self.cvParameters[parameter])
+            return _cv_sample_list(self.cvParameters['DA'][parameter])
+
+        except AttributeError as atter:
+            raise atter
+        except KeyError as kerr:
+            raise kerr
 
-        :param mode: The type of model parameter to use in calculating the VIP. Default value is weights (w), and other acceptable arguments are p, ws, cs, c and q.
-        :type mode: str
-        :param str direction: The data block to be used to calculated the model fit and regression sum of squares.
+    def VIP(self, per_response=False):
+        """
+
+        Output the Variable importance for projection metric (VIP). It is calculated using the x variable weights
+        and the Y sum of squares of each component, as a single matrix product.
+
+        :param bool per_response: If True, calculate a VIP for each Y variable (multi-Y models), using the sum of
+        squares of each Y variable instead of the whole Y matrix.
         :return numpy.ndarray VIP: The vector with the calculated VIP values.
-        :rtype: numpy.ndarray, shape [n_features]
-        :raise ValueError: If mode or direction is not a valid option.
-        :raise AttributeError: Calling method without a fitted model.
+        :rtype: numpy.ndarray, shape [n_features], or [n_features, n_responses] if per_response is True
+        :raise AttributeError: Calling method without a fitted model, or fitted with diagnostics=False.
         """
         try:
-            # Code not really adequate for each Y variable in the multi-Y case - SSy should be changed so
-            # that it is calculated for each y and not for the whole bloc
             if self._isfitted is False:
                 raise AttributeError("Model is not fitted")
+            if self.modelParameters is None:
+                raise AttributeError("The VIP needs the model fitted with diagnostics=True")
 
-            nvars = self.loadings_p.shape[0]
-            vipnum = np.zeros(nvars)
-            for comp in range(0, self.n_components):
-                vipnum += (self.weights_w[:, comp] ** 2) * (self.modelParameters['SSYcomp'][comp])
-
-            vip = np.sqrt(vipnum * nvars / self.modelParameters['SSYcomp'].sum())
-
-            return vip
+            if per_response:
+                return _vip(self.weights_w, self.modelParameters['SSYcompResponse'])
+            return _vip(self.weights_w, self.modelParameters['SSYcomp'])
 
         except AttributeError as atter:
             raise atter
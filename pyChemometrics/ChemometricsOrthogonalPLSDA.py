@@ -1,7 +1,6 @@
 from copy import deepcopy
 import numpy as np
 import pandas as pds
-from numpy import interp
 from sklearn.base import TransformerMixin, ClassifierMixin, clone
 from pyChemometrics._ortho_filter_pls import OrthogonalPLSRegression
 from pyChemometrics.ChemometricsOrthogonalPLS import ChemometricsOrthogonalPLS
@@ -9,6 +8,9 @@ from sklearn.model_selection import BaseCrossValidator, KFold
 from sklearn.model_selection._split import BaseShuffleSplit
 from sklearn import metrics
 from pyChemometrics.ChemometricsScaler import ChemometricsScaler
+from pyChemometrics._model_utils import centroid_distances as _centroid_distances, \
+    class_probabilities as _class_probabilities, class_means as _class_means, roc_curves as _roc_curves, \
+    align_signs as _align_signs, apply_signs as _apply_signs, vip as _vip, _row_blocks
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 import matplotlib.cm as cm
@@ -114,16 +116,22 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
         except AttributeError as atre:
             raise atre
 
-    def fit(self, x, y, **fit_params):
+    def fit(self, x, y, diagnostics=True, **fit_params):
         """
 
         Perform model fitting on the provided x and y data and calculate basic goodness-of-fit metrics.
         Similar to scikit-learn's BaseEstimator method.
+        The combined loadings_p, loadings_q, scores_t, scores_u, weights_w and weights_c have the predictive component
+        first and the orthogonal components after it. The rotations_ws and rotations_cs, and the t and u scores (the
+        ones returned by transform), have the orthogonal components first and the predictive component last.
 
         :param x: Data matrix to fit the PLS model.
         :type x: numpy.ndarray, shape [n_samples, n_features].
         :param y: Data matrix to fit the PLS model.
         :type y: numpy.ndarray, shape [n_samples, n_features].
+        :param bool diagnostics: If False, stop after the model parameters needed for prediction and skip all the
+        goodness-of-fit and classification metrics (modelParameters is set to None). Useful when the model is only
+        used to predict, as in simulations.
         :param kwargs fit_params: Keyword arguments to be passed to the .fit() method of the core sklearn model.
         :raise ValueError: If any problem occurs during fitting.
         """
@@ -199,17 +207,18 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
             self.beta_coeffs = self.pls_algorithm.coef_
 
 
-            # # this does not make sense to me... I'll remove it for the moment - flsoares232
-            # # Get the mean score per class to use in prediction
-            # # To use im a simple rule on how to turn PLS prediction into a classifier for multiclass PLS-DA
-            # self.class_means = np.zeros((n_classes, self.n_components))
-            # for curr_class in range(self.n_classes):
-            #     curr_class_idx = np.where(y == curr_class)
-            #     self.class_means[curr_class, :] = np.mean(self.scores_t[curr_class_idx])
+            # Get the mean score per class to use in prediction
+            # To use im a simple rule on how to turn PLS prediction into a classifier for multiclass PLS-DA
+            self.class_means = _class_means(self.t, y, n_classes)
 
             # Needs to come here for the method shortcuts down the line to work...
             self._isfitted = True
 
+            # Lean fit, nothing else is needed to predict new samples
+            if diagnostics is False:
+                self.modelParameters = None
+                return None
+
             # Calculate RSSy/RSSx, R2Y/R2X
             # Method inheritance from parent, as in this case we really want the "PLS" only metrics
             if self.n_classes > 2:
@@ -224,12 +233,13 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
             # This will make it easier to average and compare multiple models, especially during cross-validation
             fpr_grid = np.linspace(0, 1, num=20)
 
-            # Obtain the class score
-            class_score = ChemometricsOrthogonalPLS.predict(self, x=x)
+            # Obtain the class score, and the class predictions from it
+            class_score = self.decision_function(x)
+            y_pred = self._decision_to_class(class_score)
+            # Interpolated ROC curves and rank-based AUC, one-vs-rest for all the classes at once
+            roc_curve, auc_area, exact_auc_area = _roc_curves(y, class_score, fpr_grid)
 
             if n_classes == 2:
-                y_pred = self.predict(x)
-                # y_pred = np.argmin(np.abs(ypred - np.array([0, 1])), axis=1)
                 accuracy = metrics.accuracy_score(y, y_pred)
                 precision = metrics.precision_score(y, y_pred)
                 recall = metrics.recall_score(y, y_pred)
@@ -238,18 +248,8 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                 conf_matrix = metrics.confusion_matrix(y, y_pred)
                 zero_oneloss = metrics.zero_one_loss(y, y_pred)
                 matthews_mcc = metrics.matthews_corrcoef(y, y_pred)
-            
-                # Interpolated ROC curve and AUC
-                roc_curve = metrics.roc_curve(y, class_score.ravel())
-                tpr = roc_curve[1]
-                fpr = roc_curve[0]
-                interpolated_tpr = np.zeros_like(fpr_grid)
-                interpolated_tpr += interp(fpr_grid, fpr, tpr)
-                roc_curve = (fpr_grid, interpolated_tpr, roc_curve[2])
-                auc_area = metrics.auc(fpr_grid, interpolated_tpr)
-            
+
             else:
-                y_pred = self.predict(x)
                 accuracy = metrics.accuracy_score(y, y_pred)
                 precision = metrics.precision_score(y, y_pred, average='weighted')
                 recall = metrics.recall_score(y, y_pred, average='weighted')
@@ -258,21 +258,6 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                 conf_matrix = metrics.confusion_matrix(y, y_pred)
                 zero_oneloss = metrics.zero_one_loss(y, y_pred)
                 matthews_mcc = np.nan
-                roc_curve = list()
-                auc_area = list()
-            
-                # Generate multiple ROC curves - one for each class the multiple class case
-                for predclass in range(self.n_classes):
-                    current_roc = metrics.roc_curve(y, class_score[:, predclass], pos_label=predclass)
-                    # Interpolate all ROC curves to a finite grid
-                    #  Makes it easier to average and compare multiple models - with CV in mind
-                    tpr = current_roc[1]
-                    fpr = current_roc[0]
-            
-                    interpolated_tpr = np.zeros_like(fpr_grid)
-                    interpolated_tpr += interp(fpr_grid, fpr, tpr)
-                    roc_curve.append([fpr_grid, interpolated_tpr, current_roc[2]])
-                    auc_area.append(metrics.auc(fpr_grid, interpolated_tpr))
             # Obtain residual sum of squares for whole data set and per component
             # Same as Chemometrics PLS, this is so we can use VIP's and other metrics as usual
             if self.n_classes > 2:
@@ -283,12 +268,18 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
             # Assemble the dictionary for storing the model parameters
             self.modelParameters = {'R2Y': R2Y, 'R2X': R2X, 'SSX': cm_fit['SSX'], 'SSY': cm_fit['SSY'],
                                             'SSXcomp': cm_fit['SSXcomp'], 'SSYcomp': cm_fit['SSYcomp'],
-                                    'DA': {'Accuracy': accuracy, 'AUC': auc_area,
+                                            'SSYcompResponse': cm_fit['SSYcompResponse'],
+                                    'DA': {'Accuracy': accuracy, 'AUC': auc_area, 'ExactAUC': exact_auc_area,
                                                  'ConfusionMatrix': conf_matrix, 'ROC': roc_curve,
                                                  'MisclassifiedSamples': misclassified_samples,
                                                  'Precision': precision, 'Recall': recall,
                                                  'F1': f1_score, '0-1Loss': zero_oneloss, 'MatthewsMCC': matthews_mcc,
                                                  'ClassPredictions': y_pred}}
+
+            # For "Normalised" DmodX calculation
+            resid_ssx = self._residual_ssx(x)
+            s0 = np.sqrt(resid_ssx.sum() / ((self.t.shape[0] - self.n_components - 1) * (x.shape[1] - self.n_components)))
+            self.modelParameters['S0X'] = s0
             
 
         except ValueError as verr:
@@ -326,7 +317,8 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
         :type x: numpy.ndarray, shape [n_samples, n_features] or None
         :param y: Data matrix to fit the PLS model.
         :type y: numpy.ndarray, shape [n_samples, n_features] or None
-        :return: Latent Variable scores (T) for the X matrix and for the Y vector/matrix (U).
+        :return: Latent Variable scores (T) for the X matrix and for the Y vector/matrix (U), with the orthogonal
+        components first and the predictive component last (the column order of t and u, not of scores_t and scores_u).
         :rtype: tuple with 2 numpy.ndarray, shape [n_samples, n_comps]
         :raise ValueError: If dimensions of input data are mismatched.
         :raise AttributeError: When calling the method before the model is fitted.
@@ -390,9 +382,10 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
         Transform scores to the original data space using their corresponding loadings.
         Same logic as in scikit-learn's TransformerMixin method.
 
-        :param t: T scores corresponding to the X data matrix.
+        :param t: T scores corresponding to the X data matrix, with the orthogonal components first and the predictive
+        component last, as returned by transform.
         :type t: numpy.ndarray, shape [n_samples, n_comps] or None
-        :param u: Y scores corresponding to the Y data vector/matrix.
+        :param u: Y scores corresponding to the Y data vector/matrix, in the same column order as t.
         :type u: numpy.ndarray, shape [n_samples, n_comps] or None
         :return x: X Data matrix in the original data space.
         :rtype: numpy.ndarray, shape [n_samples, n_features] or None
@@ -454,39 +447,77 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
             raise verr
             
             
-    def predict(self, x):
+    def decision_function(self, x):
         """
 
-        Predict the values in one data block using the other. Same as its scikit-learn's RegressorMixin namesake method.
+        Class scores used by the prediction rule. For two classes, the predicted value of the class vector (encoded as
+        0 and 1). For more classes, minus the squared euclidean distance between the scores of each sample and each
+        class mean (centroid) in the score space, calculated for all samples and classes with a single matrix product.
 
         :param x: Data matrix to fit the PLS model.
-        :type x: numpy.ndarray, shape [n_samples, n_features] or None
-        :param y: Data matrix to fit the PLS model.
-        :type y: numpy.ndarray, shape [n_samples, n_features] or None
-        :return: Predicted data block (X or Y) obtained from the other data block.
-        :rtype: numpy.ndarray, shape [n_samples, n_features]
-        :raise ValueError: If no data matrix is passed, or dimensions mismatch issues with the provided data.
+        :type x: numpy.ndarray, shape [n_samples, n_features]
+        :return: Class scores, higher for the more likely classes.
+        :rtype: numpy.ndarray, shape [n_samples] for two classes or [n_samples, n_classes]
         :raise AttributeError: Calling the method without fitting the model before.
         """
-
         try:
             if self._isfitted is False:
                 raise AttributeError("Model is not fitted")
 
             # based on original encoding as 0, 1, etc
             if self.n_classes == 2:
-                y_pred = ChemometricsOrthogonalPLS.predict(self, x)
-                class_pred = np.argmin(np.abs(y_pred - np.array([0, 1])), axis=1)
+                return ChemometricsOrthogonalPLS.predict(self, x).ravel()
+            if self.class_means is None:
+                raise AttributeError("The model has no class means for multiclass prediction")
+            pred_scores = self.transform(x, None)
+            return -_centroid_distances(pred_scores, self.class_means)
 
-            else:
-                # euclidean distance to mean of class for multiclass PLS-DA
-                # probably better to use a Logistic/Multinomial or PLS-LDA anyway...
-                # project X onto T - so then we can get
-                pred_scores = self.transform(x=x)
-                # prediction rule - find the closest class mean (centroid) for each sample in the score space
-                closest_class_mean = lambda x: np.argmin(np.linalg.norm((x - self.class_means), axis=1))
-                class_pred = np.apply_along_axis(closest_class_mean, axis=1, arr=pred_scores)
-            return class_pred
+        except ValueError as verr:
+            raise verr
+        except AttributeError as atter:
+            raise atter
+
+    def predict_proba(self, x):
+        """
+
+        Class membership scores of each sample, derived from :py:meth:`decision_function`. They sum to one for each
+        sample but are not calibrated probabilities.
+
+        :param x: Data matrix to fit the PLS model.
+        :type x: numpy.ndarray, shape [n_samples, n_features]
+        :return: Class membership scores
+        :rtype: numpy.ndarray, shape [n_samples, n_classes]
+        :raise AttributeError: Calling the method without fitting the model before.
+        """
+        try:
+            return _class_probabilities(self.decision_function(x))
+        except ValueError as verr:
+            raise verr
+        except AttributeError as atter:
+            raise atter
+
+    def _decision_to_class(self, decision):
+        # Closest class value for two classes, closest class mean (centroid) otherwise
+        if decision.ndim == 1:
+            return (decision > 0.5).astype(int)
+        return np.argmax(decision, axis=1)
+
+    def predict(self, x):
+        """
+
+        Predict the class of each sample. For two classes, the closest class value (0 or 1) to the predicted class
+        vector, otherwise the class with the closest mean in the score space.
+
+        :param x: Data matrix to fit the PLS model.
+        :type x: numpy.ndarray, shape [n_samples, n_features]
+        :return: Predicted classes
+        :rtype: numpy.ndarray, shape [n_samples]
+        :raise ValueError: If no data matrix is passed, or dimensions mismatch issues with the provided data.
+        :raise AttributeError: Calling the method without fitting the model before.
+        """
+
+        try:
+            return self._decision_to_class(self.decision_function(x))
 
         except ValueError as verr:
             raise verr
@@ -575,7 +606,7 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
 
     # Added flsoares 24-10-2023
     def cross_validation(self, x, y, cv_method=KFold(n_splits=7, shuffle=False), outputdist=False, testset_scale=False,
-                         **crossval_kwargs):
+                         collect='all', **crossval_kwargs):
         """
 
         Cross-validation method for the model. Calculates Q2 and cross-validated estimates for all model parameters.
@@ -587,17 +618,22 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
         :param cv_method: An instance of a scikit-learn CrossValidator object.
         :type cv_method: BaseCrossValidator or BaseShuffleSplit
         :param bool outputdist: Output the whole distribution for. Useful when ShuffleSplit or CrossValidators other than KFold.
+        :param str collect: 'all' to calculate cross-validated estimates of all the model parameters, or 'metrics' to
+        calculate only the Q2, R2 and classification metrics, which is faster when only these are needed (for example,
+        to choose the number of components or in permutation tests).
         :param bool testset_scale: Scale the test sets using its own mean and standard deviation instead of the scaler fitted on training set.
         :param kwargs crossval_kwargs: Keyword arguments to be passed to the sklearn.Pipeline during cross-validation
         :return:
         :rtype: dict
         :raise TypeError: If the cv_method passed is not a scikit-learn CrossValidator object.
-        :raise ValueError: If the x and y data matrices are invalid.
+        :raise ValueError: If the x and y data matrices are invalid or collect is not 'all' or 'metrics'.
         """
 
         try:
             if not (isinstance(cv_method, BaseCrossValidator) or isinstance(cv_method, BaseShuffleSplit)):
                 raise TypeError("Scikit-learn cross-validation object please")
+            if collect not in ('all', 'metrics'):
+                raise ValueError("collect must be 'all' or 'metrics'")
 
             # Check if global model is fitted... and if not, fit it using all of X
             if self._isfitted is False:
@@ -633,45 +669,49 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                 raise TypeError('Please supply a dummy vector with integer as class membership')
 
             # Initialize list structures to contain the fit
-            cv_loadings_p = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_loadings_q = np.zeros((ncvrounds, y_nvars, self.n_components))
-            cv_weights_w = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_weights_c = np.zeros((ncvrounds, y_nvars, self.n_components))
-            cv_train_scores_t = list()
-            cv_train_scores_u = list()
-
-            # CV test scores more informative for ShuffleSplit than KFold but kept here anyway
-            cv_test_scores_t = list()
-            cv_test_scores_u = list()
-
-            cv_rotations_ws = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_rotations_cs = np.zeros((ncvrounds, y_nvars, self.n_components))
-            cv_betacoefs = np.zeros((ncvrounds, y_nvars, x_nvars))
-            cv_vipsw = np.zeros((ncvrounds, x_nvars))
-
-            cv_trainprecision = np.zeros(ncvrounds)
-            cv_trainrecall = np.zeros(ncvrounds)
-            cv_trainaccuracy = np.zeros(ncvrounds)
-            cv_trainauc = np.zeros((ncvrounds, y_nvars))
-            cv_trainmatthews_mcc = np.zeros(ncvrounds)
-            cv_trainzerooneloss = np.zeros(ncvrounds)
-            cv_trainf1 = np.zeros(ncvrounds)
-            cv_trainclasspredictions = list()
-            cv_trainroc_curve = list()
-            cv_trainconfusionmatrix = list()
-            cv_trainmisclassifiedsamples = list()
+            keep_parameters = collect == 'all'
+            if keep_parameters:
+                cv_loadings_p = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_loadings_q = np.zeros((ncvrounds, y_nvars, self.n_components))
+                cv_weights_w = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_weights_c = np.zeros((ncvrounds, y_nvars, self.n_components))
+                cv_train_scores_t = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
+                cv_train_scores_u = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
+
+                # CV test scores more informative for ShuffleSplit than KFold but kept here anyway
+                cv_test_scores_t = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
+                cv_test_scores_u = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
+
+                cv_rotations_ws = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_rotations_cs = np.zeros((ncvrounds, y_nvars, self.n_components))
+                cv_betacoefs = np.zeros((ncvrounds, y_nvars, x_nvars))
+                cv_ssy_comp = np.zeros((ncvrounds, self.n_components))
+
+                cv_trainprecision = np.zeros(ncvrounds)
+                cv_trainrecall = np.zeros(ncvrounds)
+                cv_trainaccuracy = np.zeros(ncvrounds)
+                cv_trainauc = np.zeros((ncvrounds, y_nvars))
+                cv_trainmatthews_mcc = np.zeros(ncvrounds)
+                cv_trainzerooneloss = np.zeros(ncvrounds)
+                cv_trainf1 = np.zeros(ncvrounds)
+                cv_trainclasspredictions = np.full((ncvrounds, x.shape[0]), np.nan)
+                cv_trainroc_curve = list()
+                cv_trainconfusionmatrix = list()
+                cv_trainmisclassifiedsamples = list()
 
             cv_testprecision = np.zeros(ncvrounds)
             cv_testrecall = np.zeros(ncvrounds)
             cv_testaccuracy = np.zeros(ncvrounds)
             cv_testauc = np.zeros((ncvrounds, y_nvars))
+            cv_testexactauc = np.zeros((ncvrounds, y_nvars))
             cv_testmatthews_mcc = np.zeros(ncvrounds)
             cv_testzerooneloss = np.zeros(ncvrounds)
             cv_testf1 = np.zeros(ncvrounds)
-            cv_testclasspredictions = list()
-            cv_testroc_curve = list()
-            cv_testconfusionmatrix = list()
-            cv_testmisclassifiedsamples = list()
+            if keep_parameters:
+                cv_testclasspredictions = np.full((ncvrounds, x.shape[0]), np.nan)
+                cv_testroc_curve = list()
+                cv_testconfusionmatrix = list()
+                cv_testmisclassifiedsamples = list()
             
             # Initialise predictive residual sum of squares variable (for whole CV routine)
             pressy = 0
@@ -706,7 +746,7 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                     xtrain = x[train, :]
                     xtest = x[test, :]
 
-                cv_pipeline.fit(xtrain, ytrain, **crossval_kwargs)
+                cv_pipeline.fit(xtrain, ytrain, diagnostics=keep_parameters, **crossval_kwargs)
                 # Prepare the scaled X and Y test data
 
                 # Comply with the sklearn scaler behaviour
@@ -744,37 +784,45 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                 pressx += curr_pressx
                 pressy += curr_pressy
 
-                cv_loadings_p[cvround, :, :] = cv_pipeline.loadings_p
-                cv_loadings_q[cvround, :, :] = cv_pipeline.loadings_q
-                cv_weights_w[cvround, :, :] = cv_pipeline.weights_w
-                cv_weights_c[cvround, :, :] = cv_pipeline.weights_c
-                cv_rotations_ws[cvround, :, :] = cv_pipeline.rotations_ws
-                cv_rotations_cs[cvround, :, :] = cv_pipeline.rotations_cs
-                cv_betacoefs[cvround, :, :] = cv_pipeline.beta_coeffs.T
-                cv_vipsw[cvround, :] = cv_pipeline.VIP()
-
-                # Training metrics
-                cv_trainaccuracy[cvround] = cv_pipeline.modelParameters['DA']['Accuracy']
-                cv_trainprecision[cvround] = cv_pipeline.modelParameters['DA']['Precision']
-                cv_trainrecall[cvround] = cv_pipeline.modelParameters['DA']['Recall']
-                cv_trainauc[cvround, :] = cv_pipeline.modelParameters['DA']['AUC']
-                cv_trainf1[cvround] = cv_pipeline.modelParameters['DA']['F1']
-                cv_trainmatthews_mcc[cvround] = cv_pipeline.modelParameters['DA']['MatthewsMCC']
-                cv_trainzerooneloss[cvround] = cv_pipeline.modelParameters['DA']['0-1Loss']
-
-                # Check this indexes, same as CV scores
-                cv_trainmisclassifiedsamples.append(
-                    train[cv_pipeline.modelParameters['DA']['MisclassifiedSamples']])
-                cv_trainclasspredictions.append(
-                    [*zip(train, cv_pipeline.modelParameters['DA']['ClassPredictions'])])
-
-                cv_trainroc_curve.append(cv_pipeline.modelParameters['DA']['ROC'])
-
-                fpr_grid = np.linspace(0, 1, num=20)
-
-                y_pred = cv_pipeline.predict(xtest)
-                # Obtain the class score
-                class_score = ChemometricsOrthogonalPLS.predict(cv_pipeline, xtest)
+                if keep_parameters:
+                    cv_loadings_p[cvround, :, :] = cv_pipeline.loadings_p
+                    cv_loadings_q[cvround, :, :] = cv_pipeline.loadings_q
+                    cv_weights_w[cvround, :, :] = cv_pipeline.weights_w
+                    cv_weights_c[cvround, :, :] = cv_pipeline.weights_c
+                    cv_rotations_ws[cvround, :, :] = cv_pipeline.rotations_ws
+                    cv_rotations_cs[cvround, :, :] = cv_pipeline.rotations_cs
+                    cv_betacoefs[cvround, :, :] = cv_pipeline.beta_coeffs.T
+                    cv_ssy_comp[cvround, :] = cv_pipeline.modelParameters['SSYcomp']
+
+                    # Scores of the samples used in this round, the ones left out stay NaN
+                    cv_train_scores_t[cvround, train, :] = cv_pipeline.t
+                    cv_train_scores_u[cvround, train, :] = cv_pipeline.u
+                    cv_test_scores_t[cvround, test, :] = cv_pipeline.transform(xtest, None)
+                    cv_test_scores_u[cvround, test, :] = cv_pipeline.transform(None, ytest)
+
+                    # Training metrics
+                    cv_trainaccuracy[cvround] = cv_pipeline.modelParameters['DA']['Accuracy']
+                    cv_trainprecision[cvround] = cv_pipeline.modelParameters['DA']['Precision']
+                    cv_trainrecall[cvround] = cv_pipeline.modelParameters['DA']['Recall']
+                    cv_trainauc[cvround, :] = cv_pipeline.modelParameters['DA']['AUC']
+                    cv_trainf1[cvround] = cv_pipeline.modelParameters['DA']['F1']
+                    cv_trainmatthews_mcc[cvround] = cv_pipeline.modelParameters['DA']['MatthewsMCC']
+                    cv_trainzerooneloss[cvround] = cv_pipeline.modelParameters['DA']['0-1Loss']
+
+                    # Check this indexes, same as CV scores
+                    cv_trainmisclassifiedsamples.append(
+                        train[cv_pipeline.modelParameters['DA']['MisclassifiedSamples']])
+                    cv_trainclasspredictions[cvround, train] = cv_pipeline.modelParameters['DA']['ClassPredictions']
+
+                    cv_trainroc_curve.append(cv_pipeline.modelParameters['DA']['ROC'])
+
+                fpr_grid = np.linspace(0, 1, num=20) if keep_parameters else None
+
+                # Obtain the class score, and the class predictions from it
+                class_score = cv_pipeline.decision_function(xtest)
+                y_pred = cv_pipeline._decision_to_class(class_score)
+                # Interpolated ROC curves and rank-based AUC, one-vs-rest for all the classes at once
+                test_roc_curve, test_auc_area, test_exact_auc_area = _roc_curves(ytest, class_score, fpr_grid)
 
                 if n_classes == 2:
                     test_accuracy = metrics.accuracy_score(ytest, y_pred)
@@ -783,15 +831,6 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                     test_f1_score = metrics.f1_score(ytest, y_pred)
                     test_zero_oneloss = metrics.zero_one_loss(ytest, y_pred)
                     test_matthews_mcc = metrics.matthews_corrcoef(ytest, y_pred)
-                    test_roc_curve = metrics.roc_curve(ytest, class_score.ravel())
-
-                    # Interpolated ROC curve and AUC
-                    tpr = test_roc_curve[1]
-                    fpr = test_roc_curve[0]
-                    interpolated_tpr = np.zeros_like(fpr_grid)
-                    interpolated_tpr += interp(fpr_grid, fpr, tpr)
-                    test_roc_curve = (fpr_grid, interpolated_tpr, test_roc_curve[2])
-                    test_auc_area = metrics.auc(fpr_grid, interpolated_tpr)
 
                 else:
                     test_accuracy = metrics.accuracy_score(ytest, y_pred)
@@ -800,38 +839,22 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                     test_f1_score = metrics.f1_score(ytest, y_pred, average='weighted')
                     test_zero_oneloss = metrics.zero_one_loss(ytest, y_pred)
                     test_matthews_mcc = np.nan
-                    test_roc_curve = list()
-                    test_auc_area = list()
-                    # Generate multiple ROC curves - one for each class the multiple class case
-                    for predclass in range(cv_pipeline.n_classes):
-                        roc_curve = metrics.roc_curve(ytest, class_score[:, predclass], pos_label=predclass)
-                        # Interpolate all ROC curves to a finite grid
-                        #  Makes it easier to average and compare multiple models - with CV in mind
-                        tpr = roc_curve[1]
-                        fpr = roc_curve[0]
-                        interpolated_tpr = np.zeros_like(fpr_grid)
-                        interpolated_tpr += interp(fpr_grid, fpr, tpr)
-                        test_roc_curve.append(fpr_grid, interpolated_tpr, roc_curve[2])
-                        test_auc_area.append(metrics.auc(fpr_grid, interpolated_tpr))
-
-                # Check the actual indexes in the original samples
-                test_misclassified_samples = test[np.where(ytest.ravel() != y_pred.ravel())[0]]
-                test_classpredictions = [*zip(test, y_pred)]
-                test_conf_matrix = metrics.confusion_matrix(ytest, y_pred)
 
                 # Test metrics
                 cv_testaccuracy[cvround] = test_accuracy
                 cv_testprecision[cvround] = test_precision
                 cv_testrecall[cvround] = test_recall
                 cv_testauc[cvround, :] = test_auc_area
+                cv_testexactauc[cvround, :] = test_exact_auc_area
                 cv_testf1[cvround] = test_f1_score
                 cv_testmatthews_mcc[cvround] = test_matthews_mcc
                 cv_testzerooneloss[cvround] = test_zero_oneloss
-                # Check this indexes, same as CV scores
-                cv_testmisclassifiedsamples.append(test_misclassified_samples)
-                cv_testroc_curve.append(test_roc_curve)
-                cv_testconfusionmatrix.append(test_conf_matrix)
-                cv_testclasspredictions.append(test_classpredictions)
+                if keep_parameters:
+                    # Check the actual indexes in the original samples
+                    cv_testmisclassifiedsamples.append(test[np.where(ytest.ravel() != y_pred.ravel())[0]])
+                    cv_testroc_curve.append(test_roc_curve)
+                    cv_testconfusionmatrix.append(metrics.confusion_matrix(ytest, y_pred))
+                    cv_testclasspredictions[cvround, test] = y_pred
             
             # Do a proper investigation on how to get CV scores decently
             # Align model parameters to account for sign indeterminacy.
@@ -839,29 +862,13 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
             # on the model fitted with the whole data. Any other parameter can be used, but since the loadings in X capture
             # the covariance structure in the X data block, in theory they should have more pronounced features even in cases of
             # null X-Y association, making the sign flip more resilient.
-            for cvround in range(0, ncvrounds):
-                for currload in range(0, self.n_components):
-                    # evaluate based on loadings _p
-                    choice = np.argmin(
-                        np.array([np.sum(np.abs(self.loadings_p[:, currload] - cv_loadings_p[cvround, :, currload])),
-                                  np.sum(np.abs(
-                                      self.loadings_p[:, currload] - cv_loadings_p[cvround, :, currload] * -1))]))
-                    if choice == 1:
-                        cv_loadings_p[cvround, :, currload] = -1 * cv_loadings_p[cvround, :, currload]
-                        cv_loadings_q[cvround, :, currload] = -1 * cv_loadings_q[cvround, :, currload]
-                        cv_weights_w[cvround, :, currload] = -1 * cv_weights_w[cvround, :, currload]
-                        cv_weights_c[cvround, :, currload] = -1 * cv_weights_c[cvround, :, currload]
-                        cv_rotations_ws[cvround, :, currload] = -1 * cv_rotations_ws[cvround, :, currload]
-                        cv_rotations_cs[cvround, :, currload] = -1 * cv_rotations_cs[cvround, :, currload]
-                        cv_train_scores_t.append([*zip(train, -1 * cv_pipeline.scores_t)])
-                        cv_train_scores_u.append([*zip(train, -1 * cv_pipeline.scores_u)])
-                        cv_test_scores_t.append([*zip(test, -1 * cv_pipeline.scores_t)])
-                        cv_test_scores_u.append([*zip(test, -1 * cv_pipeline.scores_u)])
-                    else:
-                        cv_train_scores_t.append([*zip(train, cv_pipeline.scores_t)])
-                        cv_train_scores_u.append([*zip(train, cv_pipeline.scores_u)])
-                        cv_test_scores_t.append([*zip(test, cv_pipeline.scores_t)])
-                        cv_test_scores_u.append([*zip(test, cv_pipeline.scores_u)])
+            if keep_parameters:
+                # VIP of all the rounds in a single matrix product
+                cv_vipsw = _vip(cv_weights_w, cv_ssy_comp)
+                signs = _align_signs(self.loadings_p, cv_loadings_p, cv_loadings_q, cv_weights_w, cv_weights_c)
+                # The rotations and scores have the orthogonal components first and the predictive component last
+                _apply_signs(np.roll(signs, -1, axis=1), cv_rotations_ws, cv_rotations_cs, cv_train_scores_t,
+                             cv_train_scores_u, cv_test_scores_t, cv_test_scores_u)
 
             # Calculate Q-squareds
             q_squaredy = 1 - (pressy / ssy)
@@ -878,22 +885,23 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                                  'StdevR2X_Test': np.std(R2X_test),
                                  'StdevR2Y_Test': np.std(R2Y_test), 'DA': {}}
             # Means and standard deviations...
-            self.cvParameters['Mean_Loadings_q'] = cv_loadings_q.mean(0)
-            self.cvParameters['Stdev_Loadings_q'] = cv_loadings_q.std(0)
-            self.cvParameters['Mean_Loadings_p'] = cv_loadings_p.mean(0)
-            self.cvParameters['Stdev_Loadings_p'] = cv_loadings_q.std(0)
-            self.cvParameters['Mean_Weights_c'] = cv_weights_c.mean(0)
-            self.cvParameters['Stdev_Weights_c'] = cv_weights_c.std(0)
-            self.cvParameters['Mean_Weights_w'] = cv_weights_w.mean(0)
-            self.cvParameters['Stdev_Weights_w'] = cv_weights_w.std(0)
-            self.cvParameters['Mean_Rotations_ws'] = cv_rotations_ws.mean(0)
-            self.cvParameters['Stdev_Rotations_ws'] = cv_rotations_ws.std(0)
-            self.cvParameters['Mean_Rotations_cs'] = cv_rotations_cs.mean(0)
-            self.cvParameters['Stdev_Rotations_cs'] = cv_rotations_cs.std(0)
-            self.cvParameters['Mean_Beta'] = cv_betacoefs.mean(0)
-            self.cvParameters['Stdev_Beta'] = cv_betacoefs.std(0)
-            self.cvParameters['Mean_VIP'] = cv_vipsw.mean(0)
-            self.cvParameters['Stdev_VIP'] = cv_vipsw.std(0)
+            if keep_parameters:
+                self.cvParameters['Mean_Loadings_q'] = cv_loadings_q.mean(0)
+                self.cvParameters['Stdev_Loadings_q'] = cv_loadings_q.std(0)
+                self.cvParameters['Mean_Loadings_p'] = cv_loadings_p.mean(0)
+                self.cvParameters['Stdev_Loadings_p'] = cv_loadings_q.std(0)
+                self.cvParameters['Mean_Weights_c'] = cv_weights_c.mean(0)
+                self.cvParameters['Stdev_Weights_c'] = cv_weights_c.std(0)
+                self.cvParameters['Mean_Weights_w'] = cv_weights_w.mean(0)
+                self.cvParameters['Stdev_Weights_w'] = cv_weights_w.std(0)
+                self.cvParameters['Mean_Rotations_ws'] = cv_rotations_ws.mean(0)
+                self.cvParameters['Stdev_Rotations_ws'] = cv_rotations_ws.std(0)
+                self.cvParameters['Mean_Rotations_cs'] = cv_rotations_cs.mean(0)
+                self.cvParameters['Stdev_Rotations_cs'] = cv_rotations_cs.std(0)
+                self.cvParameters['Mean_Beta'] = cv_betacoefs.mean(0)
+                self.cvParameters['Stdev_Beta'] = cv_betacoefs.std(0)
+                self.cvParameters['Mean_VIP'] = cv_vipsw.mean(0)
+                self.cvParameters['Stdev_VIP'] = cv_vipsw.std(0)
             self.cvParameters['Ypred'] = Ypred
             self.cvParameters['DA']['Mean_MCC'] = cv_testmatthews_mcc.mean(0)
             self.cvParameters['DA']['Stdev_MCC'] = cv_testmatthews_mcc.std(0)
@@ -909,9 +917,12 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
             self.cvParameters['DA']['Stdev_0-1Loss'] = cv_testzerooneloss.std(0)
             self.cvParameters['DA']['Mean_AUC'] = cv_testauc.mean(0)
             self.cvParameters['DA']['Stdev_AUC'] = cv_testauc.std(0)
+            self.cvParameters['DA']['Mean_ExactAUC'] = cv_testexactauc.mean(0)
+            self.cvParameters['DA']['Stdev_ExactAUC'] = cv_testexactauc.std(0)
 
-            self.cvParameters['DA']['Mean_ROC'] = np.mean(np.array([x[1] for x in cv_testroc_curve]), axis=0)
-            self.cvParameters['DA']['Stdev_ROC'] = np.std(np.array([x[1] for x in cv_testroc_curve]), axis=0)
+            if keep_parameters:
+                self.cvParameters['DA']['Mean_ROC'] = np.mean(np.array([x[1] for x in cv_testroc_curve]), axis=0)
+                self.cvParameters['DA']['Stdev_ROC'] = np.std(np.array([x[1] for x in cv_testroc_curve]), axis=0)
             # Means and standard deviations...
             # self.cvParameters['Mean_Scores_t'] = cv_scores_t.mean(0)
             # self.cvParameters['Stdev_Scores_t'] = cv_scores_t.std(0)
@@ -923,18 +934,6 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                 self.cvParameters['CVR2Y_Training'] = R2Y_training
                 self.cvParameters['CVR2X_Test'] = R2X_test
                 self.cvParameters['CVR2Y_Test'] = R2Y_test
-                self.cvParameters['CV_Loadings_q'] = cv_loadings_q
-                self.cvParameters['CV_Loadings_p'] = cv_loadings_p
-                self.cvParameters['CV_Weights_c'] = cv_weights_c
-                self.cvParameters['CV_Weights_w'] = cv_weights_w
-                self.cvParameters['CV_Rotations_ws'] = cv_rotations_ws
-                self.cvParameters['CV_Rotations_cs'] = cv_rotations_cs
-                self.cvParameters['CV_TestScores_t'] = cv_test_scores_t
-                self.cvParameters['CV_TestScores_u'] = cv_test_scores_u
-                self.cvParameters['CV_TrainScores_t'] = cv_train_scores_t
-                self.cvParameters['CV_TrainScores_u'] = cv_train_scores_u
-                self.cvParameters['CV_Beta'] = cv_betacoefs
-                self.cvParameters['CV_VIPw'] = cv_vipsw
 
                 # CV Test set metrics - The metrics which matter to benchmark classifier
                 self.cvParameters['DA']['CV_TestMCC'] = cv_testmatthews_mcc
@@ -943,23 +942,39 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                 self.cvParameters['DA']['CV_TestAccuracy'] = cv_testaccuracy
                 self.cvParameters['DA']['CV_Testf1'] = cv_testf1
                 self.cvParameters['DA']['CV_Test0-1Loss'] = cv_testzerooneloss
-                self.cvParameters['DA']['CV_TestROC'] = cv_testroc_curve
-                self.cvParameters['DA']['CV_TestConfusionMatrix'] = cv_testconfusionmatrix
-                self.cvParameters['DA']['CV_TestSamplePrediction'] = cv_testclasspredictions
-                self.cvParameters['DA']['CV_TestMisclassifiedsamples'] = cv_testmisclassifiedsamples
                 self.cvParameters['DA']['CV_TestAUC'] = cv_testauc
-                # CV Train parameters - so we can keep a look on model performance in training set
-                self.cvParameters['DA']['CV_TrainMCC'] = cv_trainmatthews_mcc
-                self.cvParameters['DA']['CV_TrainRecall'] = cv_trainrecall
-                self.cvParameters['DA']['CV_TrainPrecision'] = cv_trainprecision
-                self.cvParameters['DA']['CV_TrainAccuracy'] = cv_trainaccuracy
-                self.cvParameters['DA']['CV_Trainf1'] = cv_trainf1
-                self.cvParameters['DA']['CV_Train0-1Loss'] = cv_trainzerooneloss
-                self.cvParameters['DA']['CV_TrainROC'] = cv_trainroc_curve
-                self.cvParameters['DA']['CV_TrainConfusionMatrix'] = cv_trainconfusionmatrix
-                self.cvParameters['DA']['CV_TrainSamplePrediction'] = cv_trainclasspredictions
-                self.cvParameters['DA']['CV_TrainMisclassifiedsamples'] = cv_trainmisclassifiedsamples
-                self.cvParameters['DA']['CV_TrainAUC'] = cv_trainauc
+                self.cvParameters['DA']['CV_TestExactAUC'] = cv_testexactauc
+
+                if keep_parameters:
+                    self.cvParameters['CV_Loadings_q'] = cv_loadings_q
+                    self.cvParameters['CV_Loadings_p'] = cv_loadings_p
+                    self.cvParameters['CV_Weights_c'] = cv_weights_c
+                    self.cvParameters['CV_Weights_w'] = cv_weights_w
+                    self.cvParameters['CV_Rotations_ws'] = cv_rotations_ws
+                    self.cvParameters['CV_Rotations_cs'] = cv_rotations_cs
+                    self.cvParameters['CV_TestScores_t'] = cv_test_scores_t
+                    self.cvParameters['CV_TestScores_u'] = cv_test_scores_u
+                    self.cvParameters['CV_TrainScores_t'] = cv_train_scores_t
+                    self.cvParameters['CV_TrainScores_u'] = cv_train_scores_u
+                    self.cvParameters['CV_Beta'] = cv_betacoefs
+                    self.cvParameters['CV_VIPw'] = cv_vipsw
+
+                    self.cvParameters['DA']['CV_TestROC'] = cv_testroc_curve
+                    self.cvParameters['DA']['CV_TestConfusionMatrix'] = cv_testconfusionmatrix
+                    self.cvParameters['DA']['CV_TestSamplePrediction'] = cv_testclasspredictions
+                    self.cvParameters['DA']['CV_TestMisclassifiedsamples'] = cv_testmisclassifiedsamples
+                    # CV Train parameters - so we can keep a look on model performance in training set
+                    self.cvParameters['DA']['CV_TrainMCC'] = cv_trainmatthews_mcc
+                    self.cvParameters['DA']['CV_TrainRecall'] = cv_trainrecall
+                    self.cvParameters['DA']['CV_TrainPrecision'] = cv_trainprecision
+                    self.cvParameters['DA']['CV_TrainAccuracy'] = cv_trainaccuracy
+                    self.cvParameters['DA']['CV_Trainf1'] = cv_trainf1
+                    self.cvParameters['DA']['CV_Train0-1Loss'] = cv_trainzerooneloss
+                    self.cvParameters['DA']['CV_TrainROC'] = cv_trainroc_curve
+                    self.cvParameters['DA']['CV_TrainConfusionMatrix'] = cv_trainconfusionmatrix
+                    self.cvParameters['DA']['CV_TrainSamplePrediction'] = cv_trainclasspredictions
+                    self.cvParameters['DA']['CV_TrainMisclassifiedsamples'] = cv_trainmisclassifiedsamples
+                    self.cvParameters['DA']['CV_TrainAUC'] = cv_trainauc
 
             # super().cross_validation(x, y)
             return None
@@ -1016,7 +1031,7 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
             perm_rotations_cs = np.zeros((nperms, y_nvars, self.n_components))
             perm_rotations_ws = np.zeros((nperms, x_nvars, self.n_components))
             perm_beta = np.zeros((nperms, y_nvars, x_nvars))
-            perm_vipsw = np.zeros((nperms, x_nvars))
+            perm_ssy_comp = np.zeros((nperms, self.n_components))
 
             permuted_R2Y = np.zeros(nperms)
             permuted_R2X = np.zeros(nperms)
@@ -1038,7 +1053,7 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                 perm_y = np.random.permutation(y)
                 # ... Fit model and replace original data
                 permute_class.fit(x, perm_y, **permtest_kwargs)
-                permute_class.cross_validation(x, perm_y, cv_method=cv_method, **permtest_kwargs)
+                permute_class.cross_validation(x, perm_y, cv_method=cv_method, collect='metrics', **permtest_kwargs)
                 permuted_R2Y[permutation] = permute_class.modelParameters['R2Y']
                 permuted_R2X[permutation] = permute_class.modelParameters['R2X']
                 permuted_Q2Y[permutation] = permute_class.cvParameters['Q2Y']
@@ -1057,7 +1072,7 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                 # except:
                 perm_beta[permutation, :, :] = permute_class.beta_coeffs.T
                     
-                perm_vipsw[permutation, :] = permute_class.VIP()
+                perm_ssy_comp[permutation, :] = permute_class.modelParameters['SSYcomp']
                 perm_testauc[permutation] = permute_class.cvParameters['DA']['Mean_AUC']
                 perm_testprecision[permutation] = permute_class.cvParameters['DA']['Mean_Precision']
                 perm_testrecall[permutation] = permute_class.cvParameters['DA']['Mean_Recall']
@@ -1065,22 +1080,15 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                 perm_testzerooneloss[permutation] = permute_class.cvParameters['DA']['Mean_0-1Loss']
                 perm_testaccuracy[permutation] = permute_class.cvParameters['DA']['Mean_Accuracy']
 
+            # VIP of all the permuted models in a single matrix product
+            perm_vipsw = _vip(perm_weights_w, perm_ssy_comp)
+
             # Align model parameters due to sign indeterminacy.
             # Solution provided is to select the sign that gives a more similar profile to the
             # Loadings calculated with the whole data.
-            for perm_round in range(0, nperms):
-                for currload in range(0, self.n_components):
-                    # evaluate based on loadings _p
-                    choice = np.argmin(np.array(
-                        [np.sum(np.abs(self.loadings_p[:, currload] - perm_loadings_p[perm_round, :, currload])),
-                         np.sum(np.abs(self.loadings_p[:, currload] - perm_loadings_p[perm_round, :, currload] * -1))]))
-                    if choice == 1:
-                        perm_loadings_p[perm_round, :, currload] = -1 * perm_loadings_p[perm_round, :, currload]
-                        perm_loadings_q[perm_round, :, currload] = -1 * perm_loadings_q[perm_round, :, currload]
-                        perm_weights_w[perm_round, :, currload] = -1 * perm_weights_w[perm_round, :, currload]
-                        perm_weights_c[perm_round, :, currload] = -1 * perm_weights_c[perm_round, :, currload]
-                        perm_rotations_ws[perm_round, :, currload] = -1 * perm_rotations_ws[perm_round, :, currload]
-                        perm_rotations_cs[perm_round, :, currload] = -1 * perm_rotations_cs[perm_round, :, currload]
+            signs = _align_signs(self.loadings_p, perm_loadings_p, perm_loadings_q, perm_weights_w, perm_weights_c)
+            # The rotations have the orthogonal components first and the predictive component last
+            _apply_signs(np.roll(signs, -1, axis=1), perm_rotations_ws, perm_rotations_cs)
 
             # Pack everything into a dictionary data structure and return
 
@@ -1128,12 +1136,7 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
         :param x: Data matrix [n samples, m variables]
         :return: The residual Sum of Squares per sample
         """
-        pred_scores = self.transform(x)
-
-        x_reconstructed = self.scaler.transform(self.inverse_transform(pred_scores))
-        xscaled = self.scaler.transform(x)
-        residuals = np.sum(np.square(xscaled - x_reconstructed), axis=1)
-        return residuals
+        return self.score_samples(x)['RSS']
 
     def scree_plot(self, x, y, total_comps=5):
         """
@@ -1149,7 +1152,7 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
             currmodel = deepcopy(self)
             currmodel.n_components = n_components
             currmodel.fit(x, y)
-            currmodel.cross_validation(x, y)
+            currmodel.cross_validation(x, y, collect='metrics')
             models.append(currmodel)
 
         q2 = np.array([x.cvParameters['Q2Y'] for x in models])
@@ -1213,7 +1216,7 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
                 currmodel = deepcopy(self)
                 currmodel.n_components = n_components
                 currmodel.fit(x, y)
-                currmodel.cross_validation(x, y, cv_method=cv_method, outputdist=False)
+                currmodel.cross_validation(x, y, cv_method=cv_method, outputdist=False, collect='metrics')
                 q2y[n_components - 1, rep] = currmodel.cvParameters['Q2Y']
                 q2x[n_components - 1, rep] = currmodel.cvParameters['Q2X']
                 auc[n_components - 1, rep] = currmodel.cvParameters['DA']['Mean_AUC']
@@ -1387,44 +1390,67 @@ class ChemometricsOrthogonalPLSDA(ChemometricsOrthogonalPLS, ClassifierMixin):
         ax.set(xlabel="Predicted Label", ylabel="True Label")
         
     
+    def splot_statistics(self, x, component=0, chunk_size=None):
+        """
+
+        Covariance and correlation between the scores of each component and each X variable, the values shown in the
+        S-plot. All the components are obtained with one matrix product and one pass over the columns of X for their
+        norms. The variables are mean centred and processed in blocks of chunk_size columns, so only one block of X is
+        copied at a time.
+
+        :param x: Data matrix used to fit the model [n samples, m variables]
+        :param int component: Component used to select the variables in 'Index'
+        :param int chunk_size: Number of variables processed at a time, for very wide datasets. If None, all at once.
+        :return: Dictionary with the 'Covariance' and 'Correlation' of each component and variable
+        [n_components, n_features], with the components in the column order of t (orthogonal components first and
+        the predictive component last), the variable indices of each component ranked by decreasing absolute covariance
+        ('Ranking', [n_components, n_features]) and the 'Index' list, with the variables whose covariance in component
+        is beyond 1, 2 and 3 standard deviations.
+        :rtype: dict
+        :raise AttributeError: If the model is not fitted.
+        :raise ValueError: If x does not have the samples used to fit the model.
+        """
+        try:
+            if self._isfitted is False:
+                raise AttributeError('Model not fitted')
+            x = np.asarray(x, dtype=float)
+            n_samples, n_features = x.shape
+            if n_samples != self.t.shape[0]:
+                raise ValueError("x must have the {0} samples used to fit the model".format(self.t.shape[0]))
+
+            # Scores of each component divided by their sum of squares
+            scaled_t = self.t / np.einsum('ij,ij->j', self.t, self.t)
+            cov = np.empty((self.n_components, n_features))
+            x_var = np.empty(n_features)
+            for block in _row_blocks(n_features, chunk_size):
+                # Centre the block before the products, so large offsets in X do not cancel out the variance
+                x_block = x[:, block] - np.mean(x[:, block], axis=0)
+                cov[:, block] = np.dot(scaled_t.T, x_block)
+                x_var[block] = np.einsum('ij,ij->j', x_block, x_block) / n_samples
+            cov /= n_samples - 1
+            corr = cov / np.outer(np.std(scaled_t, axis=0), np.sqrt(x_var))
+
+            ranking = np.argsort(-np.abs(cov), axis=1, kind='mergesort')
+            cov_std = np.std(cov[component])
+            index = [np.r_[np.flatnonzero(cov[component] > level * cov_std),
+                           np.flatnonzero(cov[component] < -level * cov_std)] for level in range(1, 4)]
+
+            return {'Covariance': cov, 'Correlation': corr, 'Ranking': ranking, 'Index': index}
+
+        except AttributeError as atre:
+            raise atre
+        except ValueError as verr:
+            raise verr
+
     def splot(self, x, xaxis=None, label_variables=False, standard=3):
 
         """
         :return: Figure with the S-plot for variable selection
         """
-        #Mean center data
-        xpp = x - np.mean(x, axis=0)
-
-        #Define variables
-        n = np.shape(x)[0]
-        ncomps = self.n_components
-        cov = np.zeros((ncomps,np.shape(x)[1]))
-        corr = np.zeros((ncomps,np.shape(x)[1]))
-        
-        #Calculate correlation and covariance
-        for i in range(ncomps):
-            #Scale scores
-            T = np.dot(self.t[:,i],
-                       (1/np.dot(self.t[:,i].T,self.t[:,i])))
-            
-            #Calculate the s-plot values
-            cov[i,:] = np.dot(T.T,xpp)/(n-1)
-            corr[i,:] = np.divide(cov[i,:],np.dot(np.std(T,axis=0),np.std(xpp,axis=0)))   
-        
-                
-        #Create index variables
-        cov_vec = cov[0,]
-        points=np.arange(np.shape(cov_vec)[0])
-        std_pos=np.std(cov_vec);
-        std_neg=-1*np.std(cov_vec);
-        
-        #Calculate 1 to 3 x SDs and store the indexes
-        Ind = [] #initialize Ind
-        for j in range(3):   
-            ind_pos=points[cov_vec>((j+1)*std_pos)]
-            ind_neg=points[cov_vec<((j+1)*std_neg)]
-        
-            Ind.append(np.concatenate((ind_pos, ind_neg), axis=0))
+        splot_stats = self.splot_statistics(x)
+        cov = splot_stats['Covariance']
+        corr = splot_stats['Correlation']
+        Ind = splot_stats['Index']
 
         #Plot itself
         fig, ax = plt.subplots()
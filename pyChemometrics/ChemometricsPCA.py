@@ -6,6 +6,8 @@ from sklearn.decomposition._base import _BasePCA
 from sklearn.model_selection import BaseCrossValidator, KFold
 from sklearn.model_selection._split import BaseShuffleSplit
 from .ChemometricsScaler import ChemometricsScaler
+from ._model_utils import leverages as _leverages, score_samples as _score_samples, _row_blocks, \
+    align_signs as _align_signs
 import seaborn as sns
 import matplotlib.pyplot as plt
 from matplotlib.colors import Normalize
@@ -316,12 +318,7 @@ class ChemometricsPCA(_BasePCA, BaseEstimator):
         :param x: Data matrix [n samples, m variables]
         :return: The residual Sum of Squares per sample
         """
-        pred_scores = self.transform(x)
-
-        x_reconstructed = self.scaler.transform(self.inverse_transform(pred_scores))
-        xscaled = self.scaler.transform(x)
-        residuals = np.sum((xscaled - x_reconstructed)**2, axis=1)
-        return residuals
+        return self.score_samples(x)['RSS']
 
     def x_residuals(self, x, scale=True):
         """
@@ -348,22 +345,86 @@ class ChemometricsPCA(_BasePCA, BaseEstimator):
         :param x: data matrix [n samples, m variables]
         :return: The Normalised DmodX measure for each sample
         """
-        resids_ssx = self._residual_ssx(x)
-        s = np.sqrt(resids_ssx/(self.loadings.shape[1] - self.ncomps))
-        dmodx = np.sqrt((s/self.modelParameters['S0'])**2)
-        return dmodx
+        return self.score_samples(x)['DmodX']
 
-    def leverages(self):
+    def leverages(self, x=None, chunk_size=None):
         """
 
-        Calculate the leverages for each observation
+        Calculate the leverages for each observation. The diagonal of the hat matrix T(T'T)^-1T' is computed row
+        by row, so the n x n hat matrix is never formed.
 
+        :param x: New observations to calculate the leverage for, relative to the training scores. If None, the
+        leverages of the training observations are returned.
+        :type x: numpy.ndarray, shape [n_samples, n_features] or None
+        :param int chunk_size: Number of observations processed at a time. If None, all at once.
         :return: The leverage (H) for each observation
         :rtype: numpy.ndarray
         """
-        return np.diag(np.dot(self.scores, np.dot(np.linalg.inv(np.dot(self.scores.T, self.scores)), self.scores.T)))
+        try:
+            if self._isfitted is False:
+                raise AttributeError("Model is not fitted")
+            if x is None:
+                return _leverages(self.scores, chunk_size=chunk_size)
+
+            lev = np.empty(x.shape[0])
+            for block in _row_blocks(x.shape[0], chunk_size):
+                lev[block] = _leverages(self.scores, self.transform(x[block]))
+            return lev
+
+        except AttributeError as atter:
+            raise atter
+        except ValueError as verr:
+            raise verr
+
+    def _projection_parameters(self):
+        """
+
+        Linear projection used by the model: the scaler, the offset removed after scaling, the rotations and loadings,
+        the training scores and the S0 used to normalise the DmodX.
+
+        :return: Dictionary with the keyword arguments of :py:func:`pyChemometrics._model_utils.score_samples`
+        :rtype: dict
+        :raise AttributeError: If the model is not fitted or the pca_algorithm has no explicit loadings
+        """
+        if not hasattr(self.pca_algorithm, 'components_'):
+            raise AttributeError("Model is not fitted or has no explicit loadings")
+        components = self.pca_algorithm.components_.T
+        rotations = components
+        loadings = components
+        # Whitened scores are divided by the standard deviation of each component
+        if getattr(self.pca_algorithm, 'whiten', False):
+            component_sd = np.sqrt(self.pca_algorithm.explained_variance_)
+            rotations = components / component_sd
+            loadings = components * component_sd
+        s0 = None
+        if self.modelParameters is not None:
+            s0 = self.modelParameters.get('S0', None)
+
+        return {'rotations': rotations, 'loadings': loadings, 'reference_scores': self.scores, 's0': s0,
+                'scaler': self.scaler, 'offset': getattr(self.pca_algorithm, 'mean_', None)}
+
+    def score_samples(self, x, chunk_size=1000):
+        """
+
+        Calculate the scores, Hotelling T2, normalised DmodX and residual sum of squares of each observation in a
+        single pass. The data is processed in blocks of chunk_size rows with preallocated buffers, so large batches
+        can be screened in bounded memory.
+
+        :param x: Data matrix [n samples, m variables]
+        :param int chunk_size: Number of observations processed at a time. If None, all at once.
+        :return: Dictionary with the 'Scores', 'T2', 'DmodX' and 'RSS' of each observation
+        :rtype: dict
+        :raise AttributeError: If the model is not fitted or the pca_algorithm has no explicit loadings
+        """
+        try:
+            return _score_samples(x, chunk_size=chunk_size, **self._projection_parameters())
 
-    def cross_validation(self, x, cv_method=KFold(n_splits=7,shuffle=True), outputdist=False):
+        except AttributeError as atter:
+            raise atter
+        except ValueError as verr:
+            raise verr
+
+    def cross_validation(self, x, cv_method=KFold(n_splits=7,shuffle=True), outputdist=False, collect='all'):
         """
 
         Cross-validation method for the model. Calculates cross-validated estimates for Q2X and other
@@ -375,16 +436,20 @@ class ChemometricsPCA(_BasePCA, BaseEstimator):
         :type cv_method: BaseCrossValidator
         :param bool outputdist: Output the whole distribution for the cross validated parameters.
         Useful when using ShuffleSplit or CrossValidators other than KFold.
+        :param str collect: 'all' to calculate the cross-validated loadings, or 'metrics' to calculate only the Q2 and
+        variance explained, which is faster when only these are needed (for example, to choose the number of components).
         :return: Adds a dictionary cvParameters to the object, containing the cross validation results
         :rtype: dict
         :raise TypeError: If the cv_method passed is not a scikit-learn CrossValidator object.
-        :raise ValueError: If the x data matrix is invalid.
+        :raise ValueError: If the x data matrix is invalid or collect is not 'all' or 'metrics'.
         """
 
         try:
 
             if not (isinstance(cv_method, BaseCrossValidator) or isinstance(cv_method, BaseShuffleSplit)):
                 raise TypeError("Scikit-learn cross-validation object please")
+            if collect not in ('all', 'metrics'):
+                raise ValueError("collect must be 'all' or 'metrics'")
 
             # Check if global model is fitted... and if not, fit it using all of X
             if self._isfitted is False or self.loadings is None:
@@ -395,13 +460,14 @@ class ChemometricsPCA(_BasePCA, BaseEstimator):
 
             # Initialise predictive residual sum of squares variable (for whole CV routine)
             total_press = 0
-            press = np.empty((0,np.shape(x)[1]), int)
+            pressv = np.zeros(np.shape(x)[1])
             # Calculate Sum of Squares SS in whole dataset
             ssv = np.sum((cv_pipeline.scaler.transform(x)) ** 2, axis=0)
             ss = np.sum(ssv)
             # Initialise list for loadings and for the VarianceExplained in the test set values
             # Check if model has loadings, as in case of kernelPCA these are not available
-            if hasattr(self.pca_algorithm, 'components_'):
+            keep_loadings = collect == 'all' and hasattr(self.pca_algorithm, 'components_')
+            if keep_loadings:
                 loadings = []
 
             # cv_varexplained_training is a list containing lists with the SingularValue/Variance Explained metric
@@ -424,7 +490,7 @@ class ChemometricsPCA(_BasePCA, BaseEstimator):
                 tss = np.sum((xtest_scaled) ** 2)
                 # Append the var explained in training set for this round and loadings for this round
                 cv_varexplained_training.append(cv_pipeline.pca_algorithm.explained_variance_ratio_)
-                if hasattr(self.pca_algorithm, 'components_'):
+                if keep_loadings:
                     loadings.append(cv_pipeline.loadings)
 
                 # RSS for row wise cross-validation
@@ -432,11 +498,9 @@ class ChemometricsPCA(_BasePCA, BaseEstimator):
                 pred_x = cv_pipeline.scaler.transform(cv_pipeline.inverse_transform(pred_scores))
                 # To perform the Q2v
                 rs = np.square(xtest_scaled - pred_x)
-                rss = np.sum(rs)
-                # press = np.append(press,rs,axis=1)
-                press = np.append(press,rs,axis=0) 
+                pressv += np.sum(rs, axis=0)
 
-                rss = np.sum(np.square(xtest_scaled - pred_x))
+                rss = np.sum(rs)
                 total_press += rss
                 cv_varexplained_test.append(1 - (rss / tss))
             
@@ -445,27 +509,20 @@ class ChemometricsPCA(_BasePCA, BaseEstimator):
             # Create matrices for each component loading containing the cv values in each round
             # nrows = nrounds, ncolumns = n_variables
             # Check that the PCA model has loadings
-            if hasattr(self.pca_algorithm, 'components_'):
-                cv_loads = []
-                for comp in range(0, self.ncomps):
-                    cv_loads.append(np.array([x[comp] for x in loadings]))
+            if keep_loadings:
+                # Loadings of every round, [n_rounds, n_components, n_variables]
+                cv_loadings = np.array(loadings)
 
                 # Align loadings due to sign indeterminacy.
                 # The solution followed here is to select the sign that gives a more similar profile to the
                 # Loadings calculated with the whole data.
-                for cvround in range(0, cv_method.n_splits):
-                    for currload in range(0, self.ncomps):
-                        choice = np.argmin(np.array([np.sum(np.abs(self.loadings - cv_loads[currload][cvround, :])),
-                                                     np.sum(
-                                                         np.abs(self.loadings - cv_loads[currload][cvround, :] * -1))]))
-                        if choice == 1:
-                            cv_loads[currload][cvround, :] = -1 * cv_loads[currload][cvround, :]
+                _align_signs(self.loadings.T, cv_loadings.transpose(0, 2, 1))
+                cv_loads = [cv_loadings[:, comp, :] for comp in range(0, self.ncomps)]
 
             # Calculate total sum of squares
             # Q^2X
             q_squared = 1 - (total_press / ss)
             # Q^2X for each variable
-            pressv = np.sum(press,axis=0)
             q_squared_variable = 1 - (pressv / ssv)
             # Assemble the dictionary and data matrices
 
@@ -480,7 +537,7 @@ class ChemometricsPCA(_BasePCA, BaseEstimator):
                 self.cvParameters['CV_VarExpRatio_Training'] = cv_varexplained_training
                 self.cvParameters['CV_VarExp_Test'] = cv_varexplained_test
             # Check that the PCA model has loadings
-            if hasattr(self.pca_algorithm, 'components_'):
+            if keep_loadings:
                 self.cvParameters['Mean_Loadings'] = [np.mean(x, 0) for x in cv_loads]
                 self.cvParameters['Stdev_Loadings'] = [np.std(x, 0) for x in cv_loads]
                 if outputdist is True:
@@ -630,7 +687,7 @@ class ChemometricsPCA(_BasePCA, BaseEstimator):
             currmodel = deepcopy(self)
             currmodel.ncomps = ncomps
             currmodel.fit(x)
-            currmodel.cross_validation(x, outputdist=False, cv_method=cv_method)
+            currmodel.cross_validation(x, outputdist=False, cv_method=cv_method, collect='metrics')
             models.append(currmodel)
 
         q2 = np.array([x.cvParameters['Q2'] for x in models])
@@ -678,7 +735,7 @@ class ChemometricsPCA(_BasePCA, BaseEstimator):
                 currmodel = deepcopy(self)
                 currmodel.ncomps = ncomps
                 currmodel.fit(x)
-                currmodel.cross_validation(x, cv_method=cv_method, outputdist=False)
+                currmodel.cross_validation(x, cv_method=cv_method, outputdist=False, collect='metrics')
                 q2x[ncomps - 1, rep] = currmodel.cvParameters['Q2']
 
         fig, ax = plt.subplots()
@@ -6,6 +6,8 @@ from sklearn.cross_decomposition._pls import PLSRegression, _PLS
 from sklearn.model_selection import BaseCrossValidator, KFold
 from sklearn.model_selection._split import BaseShuffleSplit
 from .ChemometricsScaler import ChemometricsScaler
+from ._model_utils import leverages as _leverages, score_samples as _score_samples, _row_blocks, \
+    cv_sample_list as _cv_sample_list, align_signs as _align_signs, vip as _vip
 import scipy.stats as st
 import matplotlib as mpl
 import matplotlib.cm as cm
@@ -195,7 +197,7 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
              raise atre
 
 
-    def fit(self, x, y, **fit_params):
+    def fit(self, x, y, diagnostics=True, **fit_params):
         """
 
         Perform model fitting on the provided x and y data and calculate basic goodness-of-fit metrics.
@@ -205,6 +207,9 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
         :type x: numpy.ndarray, shape [n_samples, n_features].
         :param y: Data matrix to fit the PLS model.
         :type y: numpy.ndarray, shape [n_samples, n_features].
+        :param bool diagnostics: If False, stop after the model parameters needed for prediction and skip all the
+        goodness-of-fit metrics (modelParameters is set to None). Useful when the model is only used to predict,
+        as in simulations.
         :param kwargs fit_params: Keyword arguments to be passed to the .fit() method of the core sklearn model.
         :raise ValueError: If any problem occurs during fitting.
         """
@@ -248,6 +253,11 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
             # Needs to come here for the method shortcuts down the line to work...
             self._isfitted = True
 
+            # Lean fit, nothing else is needed to predict new samples
+            if diagnostics is False:
+                self.modelParameters = None
+                return None
+
             # Calculate RSSy/RSSx, R2Y/R2X
             R2Y = ChemometricsPLS.score(self, x=x, y=y, block_to_score='y')
             R2X = ChemometricsPLS.score(self, x=x, y=y, block_to_score='x')
@@ -256,7 +266,8 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
             cm_fit = self._cummulativefit(x, y)
 
             self.modelParameters = {'R2Y': R2Y, 'R2X': R2X, 'SSX': cm_fit['SSX'], 'SSY': cm_fit['SSY'],
-                                    'SSXcomp': cm_fit['SSXcomp'], 'SSYcomp': cm_fit['SSYcomp']}
+                                    'SSXcomp': cm_fit['SSXcomp'], 'SSYcomp': cm_fit['SSYcomp'],
+                                    'SSYcompResponse': cm_fit['SSYcompResponse']}
 
             resid_ssx = self._residual_ssx(x)
             s0 = np.sqrt(resid_ssx.sum() / ((self.scores_t.shape[0] - self.n_components - 1) * (x.shape[1] - self.n_components)))
@@ -548,37 +559,27 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
         except TypeError as typerr:
             raise typerr
 
-    def VIP(self):
+    def VIP(self, per_response=False):
         """
 
-        Output the Variable importance for projection metric (VIP). With the default values it is calculated
-        using the x variable weights and the variance explained of y.
-
-        Note: Code not adequate to obtain a VIP for each individual variable in the multi-Y case, as SSY should be changed
-        so that it is calculated for each y and not for the whole Y matrix
+        Output the Variable importance for projection metric (VIP). It is calculated using the x variable weights
+        and the Y sum of squares of each component, as a single matrix product.
 
-        :param mode: The type of model parameter to use in calculating the VIP. Default value is weights (w), and other acceptable arguments are p, ws, cs, c and q.
-        :type mode: str
-        :param str direction: The data block to be used to calculated the model fit and regression sum of squares.
+        :param bool per_response: If True, calculate a VIP for each Y variable (multi-Y models), using the sum of
+        squares of each Y variable instead of the whole Y matrix.
         :return numpy.ndarray VIP: The vector with the calculated VIP values.
-        :rtype: numpy.ndarray, shape [n_features]
-        :raise ValueError: If mode or direction is not a valid option.
-        :raise AttributeError: Calling method without a fitted model.
+        :rtype: numpy.ndarray, shape [n_features], or [n_features, n_responses] if per_response is True
+        :raise AttributeError: Calling method without a fitted model, or fitted with diagnostics=False.
         """
         try:
-            # Code not really adequate for each Y variable in the multi-Y case - SSy should be changed so
-            # that it is calculated for each y and not for the whole bloc
             if self._isfitted is False:
                 raise AttributeError("Model is not fitted")
+            if self.modelParameters is None:
+                raise AttributeError("The VIP needs the model fitted with diagnostics=True")
 
-            nvars = self.loadings_p.shape[0]
-            vipnum = np.zeros(nvars)
-            for comp in range(0, self.n_components):
-                vipnum += (self.weights_w[:, comp] ** 2) * (self.modelParameters['SSYcomp'][comp])
-
-            vip = np.sqrt(vipnum * nvars / self.modelParameters['SSYcomp'].sum())
-
-            return vip
+            if per_response:
+                return _vip(self.weights_w, self.modelParameters['SSYcompResponse'])
+            return _vip(self.weights_w, self.modelParameters['SSYcomp'])
 
         except AttributeError as atter:
             raise atter
@@ -636,26 +637,93 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
         :param x: data matrix [n samples, m variables]
         :return: The Normalised DmodX measure for each sample
         """
-        resids_ssx = self._residual_ssx(x)
-        s = np.sqrt(resids_ssx/(self.loadings_p.shape[0] - self.n_components))
-        dmodx = np.sqrt((s/self.modelParameters['S0X'])**2)
-        return dmodx
+        return self.score_samples(x)['DmodX']
 
-    def leverages(self, block='X'):
+    def leverages(self, block='X', x=None, y=None, chunk_size=None):
         """
-        Calculate the leverages for each observation
-        :return:
-        :rtype:
+
+        Calculate the leverages for each observation. The diagonal of the hat matrix T(T'T)^-1T' (or U(U'U)^-1U' for
+        the Y block) is computed row by row, so the n x n hat matrix is never formed.
+
+        :param str block: Data block of the scores used, 'X' (T scores) or 'Y' (U scores).
+        :param x: New observations to calculate the X block leverage for, relative to the training scores.
+        :type x: numpy.ndarray, shape [n_samples, n_features] or None
+        :param y: New observations to calculate the Y block leverage for, relative to the training scores.
+        :type y: numpy.ndarray, shape [n_samples, n_features] or None
+        :param int chunk_size: Number of observations processed at a time. If None, all at once.
+        :return: The leverage (H) for each observation
+        :rtype: numpy.ndarray
+        :raise ValueError: If block is not 'X' or 'Y'.
         """
         try:
+            if self._isfitted is False:
+                raise AttributeError("Model is not fitted")
             if block == 'X':
-                return np.dot(self.scores_t, np.dot(np.linalg.inv(np.dot(self.scores_t.T, self.scores_t), self.scores_t.T)))
+                reference_scores = self.scores_t
+                new_data = x
             elif block == 'Y':
-                return np.dot(self.scores_u, np.dot(np.linalg.inv(np.dot(self.scores_u.T, self.scores_u), self.scores_u.T)))
+                reference_scores = self.scores_u
+                new_data = y
             else:
-                raise ValueError
+                raise ValueError('block option must be either X or Y')
+
+            if new_data is None:
+                return _leverages(reference_scores, chunk_size=chunk_size)
+
+            lev = np.empty(new_data.shape[0])
+            for rows in _row_blocks(new_data.shape[0], chunk_size):
+                if block == 'X':
+                    new_scores = self.transform(new_data[rows], None)
+                else:
+                    new_scores = self.transform(None, new_data[rows])
+                lev[rows] = _leverages(reference_scores, new_scores)
+            return lev
+
+        except AttributeError as atter:
+            raise atter
+        except ValueError as verr:
+            raise verr
+
+    def _projection_parameters(self):
+        """
+
+        Linear projection of the X block used by the model: the scaler, the rotations and loadings, the training
+        scores and the S0X used to normalise the DmodX.
+
+        :return: Dictionary with the keyword arguments of :py:func:`pyChemometrics._model_utils.score_samples`
+        :rtype: dict
+        :raise AttributeError: If the model is not fitted
+        """
+        if self._isfitted is False:
+            raise AttributeError("Model is not fitted")
+        s0 = None
+        if self.modelParameters is not None:
+            s0 = self.modelParameters.get('S0X', None)
+
+        return {'rotations': self.rotations_ws, 'loadings': self.loadings_p, 'reference_scores': self.scores_t,
+                's0': s0, 'scaler': self.x_scaler, 'offset': None}
+
+    def score_samples(self, x, chunk_size=1000):
+        """
+
+        Calculate the T scores, Hotelling T2, normalised DmodX and X residual sum of squares of each observation in a
+        single pass. The data is processed in blocks of chunk_size rows with preallocated buffers, so large batches
+        can be screened in bounded memory.
+
+        :param x: Data matrix [n samples, m variables]
+        :param int chunk_size: Number of observations processed at a time. If None, all at once.
+        :return: Dictionary with the 'Scores', 'T2', 'DmodX' and 'RSS' of each observation. The DmodX is NaN if the
+        model was fitted with diagnostics=False.
+        :rtype: dict
+        :raise AttributeError: If the model is not fitted
+        """
+        try:
+            return _score_samples(x, chunk_size=chunk_size, **self._projection_parameters())
+
+        except AttributeError as atter:
+            raise atter
         except ValueError as verr:
-            raise ValueError('block option must be either X or Y')
+            raise verr
 
     def outlier(self, x, comps=None, measure='T2', alpha=0.05):
         """
@@ -687,7 +755,7 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
             raise exp
 
     def cross_validation(self, x, y, cv_method=KFold(n_splits=7, shuffle=True), outputdist=False,
-                         **crossval_kwargs):
+                         collect='all', **crossval_kwargs):
         """
 
         Cross-validation method for the model. Calculates Q2 and cross-validated estimates for all model parameters.
@@ -699,16 +767,21 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
         :param cv_method: An instance of a scikit-learn CrossValidator object.
         :type cv_method: BaseCrossValidator or BaseShuffleSplit
         :param bool outputdist: Output the whole distribution for. Useful when ShuffleSplit or CrossValidators other than KFold.
+        :param str collect: 'all' to calculate cross-validated estimates of all the model parameters, or 'metrics' to
+        calculate only the Q2 and R2, which is faster when only these are needed (for example, to choose the number
+        of components or in permutation tests).
         :param kwargs crossval_kwargs: Keyword arguments to be passed to the sklearn.Pipeline during cross-validation
         :return:
         :rtype: dict
         :raise TypeError: If the cv_method passed is not a scikit-learn CrossValidator object.
-        :raise ValueError: If the x and y data matrices are invalid.
+        :raise ValueError: If the x and y data matrices are invalid or collect is not 'all' or 'metrics'.
         """
 
         try:
             if not (isinstance(cv_method, BaseCrossValidator) or isinstance(cv_method, BaseShuffleSplit)):
                 raise TypeError("Scikit-learn cross-validation object please")
+            if collect not in ('all', 'metrics'):
+                raise ValueError("collect must be 'all' or 'metrics'")
 
             # Check if global model is fitted... and if not, fit it using all of X
             if self._isfitted is False:
@@ -731,19 +804,21 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
                 y = y.reshape(-1, 1)
 
             # Initialize list structures to contain the fit
-            cv_loadings_p = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_loadings_q = np.zeros((ncvrounds, y_nvars, self.n_components))
-            cv_weights_w = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_weights_c = np.zeros((ncvrounds, y_nvars, self.n_components))
-            cv_rotations_ws = np.zeros((ncvrounds, x_nvars, self.n_components))
-            cv_rotations_cs = np.zeros((ncvrounds, y_nvars, self.n_components))
-            cv_betacoefs = np.zeros((ncvrounds, x_nvars))
-            cv_vipsw = np.zeros((ncvrounds, x_nvars))
-
-            cv_train_scores_t = list()
-            cv_train_scores_u = list()
-            cv_test_scores_t = list()
-            cv_test_scores_u = list()
+            keep_parameters = collect == 'all'
+            if keep_parameters:
+                cv_loadings_p = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_loadings_q = np.zeros((ncvrounds, y_nvars, self.n_components))
+                cv_weights_w = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_weights_c = np.zeros((ncvrounds, y_nvars, self.n_components))
+                cv_rotations_ws = np.zeros((ncvrounds, x_nvars, self.n_components))
+                cv_rotations_cs = np.zeros((ncvrounds, y_nvars, self.n_components))
+                cv_betacoefs = np.zeros((ncvrounds, x_nvars))
+                cv_ssy_comp = np.zeros((ncvrounds, self.n_components))
+
+                cv_train_scores_t = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
+                cv_train_scores_u = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
+                cv_test_scores_t = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
+                cv_test_scores_u = np.full((ncvrounds, x.shape[0], self.n_components), np.nan)
 
             # Initialise predictive residual sum of squares variable (for whole CV routine)
             pressy = 0
@@ -779,7 +854,7 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
                     xtrain = x[train, :]
                     xtest = x[test, :]
 
-                cv_pipeline.fit(xtrain, ytrain, **crossval_kwargs)
+                cv_pipeline.fit(xtrain, ytrain, diagnostics=keep_parameters, **crossval_kwargs)
                 # Prepare the scaled X and Y test data
                 # If testset_scale is True, these are scaled individually...
 
@@ -814,43 +889,32 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
                 pressx += curr_pressx
                 pressy += curr_pressy
 
-                cv_loadings_p[cvround, :, :] = cv_pipeline.loadings_p
-                cv_loadings_q[cvround, :, :] = cv_pipeline.loadings_q
-                cv_weights_w[cvround, :, :] = cv_pipeline.weights_w
-                cv_weights_c[cvround, :, :] = cv_pipeline.weights_c
-                cv_rotations_ws[cvround, :, :] = cv_pipeline.rotations_ws
-                cv_rotations_cs[cvround, :, :] = cv_pipeline.rotations_cs
-                cv_betacoefs[cvround, :] = cv_pipeline.beta_coeffs.T
-                cv_vipsw[cvround, :] = cv_pipeline.VIP()
+                if keep_parameters:
+                    cv_loadings_p[cvround, :, :] = cv_pipeline.loadings_p
+                    cv_loadings_q[cvround, :, :] = cv_pipeline.loadings_q
+                    cv_weights_w[cvround, :, :] = cv_pipeline.weights_w
+                    cv_weights_c[cvround, :, :] = cv_pipeline.weights_c
+                    cv_rotations_ws[cvround, :, :] = cv_pipeline.rotations_ws
+                    cv_rotations_cs[cvround, :, :] = cv_pipeline.rotations_cs
+                    cv_betacoefs[cvround, :] = cv_pipeline.beta_coeffs.T
+                    cv_ssy_comp[cvround, :] = cv_pipeline.modelParameters['SSYcomp']
+
+                    # Scores of the samples used in this round, the ones left out stay NaN
+                    cv_train_scores_t[cvround, train, :] = cv_pipeline.scores_t
+                    cv_train_scores_u[cvround, train, :] = cv_pipeline.scores_u
+                    cv_test_scores_t[cvround, test, :] = cv_pipeline.transform(xtest, None)
+                    cv_test_scores_u[cvround, test, :] = cv_pipeline.transform(None, ytest)
 
             # Align model parameters to account for sign indeterminacy.
             # The criteria here used is to select the sign that gives a more similar profile (by L1 distance) to the loadings fitted
             # on the model fitted with the whole data. Any other parameter can be used, but since the loadings in X capture
             # the covariance structure in X data block, in theory they should have more pronounced features even in cases of
             # null X-Y association, making the sign flip more resilient.
-            for cvround in range(0, ncvrounds):
-                for currload in range(0, self.n_components):
-                    # evaluate based on loadings _p
-                    choice = np.argmin(
-                        np.array([np.sum(np.abs(self.loadings_p[:, currload] - cv_loadings_p[cvround, :, currload])),
-                                  np.sum(np.abs(
-                                      self.loadings_p[:, currload] - cv_loadings_p[cvround, :, currload] * -1))]))
-                    if choice == 1:
-                        cv_loadings_p[cvround, :, currload] = -1 * cv_loadings_p[cvround, :, currload]
-                        cv_loadings_q[cvround, :, currload] = -1 * cv_loadings_q[cvround, :, currload]
-                        cv_weights_w[cvround, :, currload] = -1 * cv_weights_w[cvround, :, currload]
-                        cv_weights_c[cvround, :, currload] = -1 * cv_weights_c[cvround, :, currload]
-                        cv_rotations_ws[cvround, :, currload] = -1 * cv_rotations_ws[cvround, :, currload]
-                        cv_rotations_cs[cvround, :, currload] = -1 * cv_rotations_cs[cvround, :, currload]
-                        cv_train_scores_t.append([*zip(train, -1 * cv_pipeline.scores_t)])
-                        cv_train_scores_u.append([*zip(train, -1 * cv_pipeline.scores_u)])
-                        cv_test_scores_t.append([*zip(test, -1 * cv_pipeline.scores_t)])
-                        cv_test_scores_u.append([*zip(test, -1 * cv_pipeline.scores_u)])
-                    else:
-                        cv_train_scores_t.append([*zip(train, cv_pipeline.scores_t)])
-                        cv_train_scores_u.append([*zip(train, cv_pipeline.scores_u)])
-                        cv_test_scores_t.append([*zip(test, cv_pipeline.scores_t)])
-                        cv_test_scores_u.append([*zip(test, cv_pipeline.scores_u)])
+            if keep_parameters:
+                # VIP of all the rounds in a single matrix product
+                cv_vipsw = _vip(cv_weights_w, cv_ssy_comp)
+                _align_signs(self.loadings_p, cv_loadings_p, cv_loadings_q, cv_weights_w, cv_weights_c, cv_rotations_ws,
+                             cv_rotations_cs, cv_train_scores_t, cv_train_scores_u, cv_test_scores_t, cv_test_scores_u)
 
             # Calculate total sum of squares
             q_squaredy = 1 - (pressy / ssy)
@@ -861,16 +925,20 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
                                  'MeanR2Y_Training': np.mean(R2Y_training), 'StdevR2X_Training': np.std(R2X_training),
                                  'StdevR2Y_Training': np.std(R2Y_training), 'MeanR2X_Test': np.mean(R2X_test),
                                  'MeanR2Y_Test': np.mean(R2Y_test), 'StdevR2X_Test': np.std(R2X_test),
-                                 'StdevR2Y_Test': np.std(R2Y_test), 'Mean_Loadings_q': cv_loadings_q.mean(0),
-                                 'Stdev_Loadings_q': cv_loadings_q.std(0), 'Mean_Loadings_p': cv_loadings_p.mean(0),
-                                 'Stdev_Loadings_p': cv_loadings_q.std(0), 'Mean_Weights_c': cv_weights_c.mean(0),
-                                 'Stdev_Weights_c': cv_weights_c.std(0), 'Mean_Weights_w': cv_weights_w.mean(0),
-                                 'Stdev_Weights_w': cv_weights_w.std(0), 'Mean_Rotations_ws': cv_rotations_ws.mean(0),
-                                 'Stdev_Rotations_ws': cv_rotations_ws.std(0),
-                                 'Mean_Rotations_cs': cv_rotations_cs.mean(0),
-                                 'Stdev_Rotations_cs': cv_rotations_cs.std(0), 'Mean_Beta': cv_betacoefs.mean(0),
-                                 'Stdev_Beta': cv_betacoefs.std(0), 'Mean_VIP': cv_vipsw.mean(0),
-                                 'Stdev_VIP': cv_vipsw.std(0)}
+                                 'StdevR2Y_Test': np.std(R2Y_test)}
+            if keep_parameters:
+                self.cvParameters.update({'Mean_Loadings_q': cv_loadings_q.mean(0),
+                                          'Stdev_Loadings_q': cv_loadings_q.std(0),
+                                          'Mean_Loadings_p': cv_loadings_p.mean(0),
+                                          'Stdev_Loadings_p': cv_loadings_q.std(0),
+                                          'Mean_Weights_c': cv_weights_c.mean(0), 'Stdev_Weights_c': cv_weights_c.std(0),
+                                          'Mean_Weights_w': cv_weights_w.mean(0), 'Stdev_Weights_w': cv_weights_w.std(0),
+                                          'Mean_Rotations_ws': cv_rotations_ws.mean(0),
+                                          'Stdev_Rotations_ws': cv_rotations_ws.std(0),
+                                          'Mean_Rotations_cs': cv_rotations_cs.mean(0),
+                                          'Stdev_Rotations_cs': cv_rotations_cs.std(0),
+                                          'Mean_Beta': cv_betacoefs.mean(0), 'Stdev_Beta': cv_betacoefs.std(0),
+                                          'Mean_VIP': cv_vipsw.mean(0), 'Stdev_VIP': cv_vipsw.std(0)})
 
             # Means and standard deviations...
             # self.cvParameters['Mean_Scores_t'] = cv_scores_t.mean(0)
@@ -883,22 +951,50 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
                 self.cvParameters['CVR2Y_Training'] = R2Y_training
                 self.cvParameters['CVR2X_Test'] = R2X_test
                 self.cvParameters['CVR2Y_Test'] = R2Y_test
-                self.cvParameters['CV_Loadings_q'] = cv_loadings_q
-                self.cvParameters['CV_Loadings_p'] = cv_loadings_p
-                self.cvParameters['CV_Weights_c'] = cv_weights_c
-                self.cvParameters['CV_Weights_w'] = cv_weights_w
-                self.cvParameters['CV_Rotations_ws'] = cv_rotations_ws
-                self.cvParameters['CV_Rotations_cs'] = cv_rotations_cs
-                self.cvParameters['CV_Train_Scores_t'] = cv_train_scores_t
-                self.cvParameters['CV_Train_Scores_u'] = cv_test_scores_u
-                self.cvParameters['CV_Beta'] = cv_betacoefs
-                self.cvParameters['CV_VIPw'] = cv_vipsw
+                if keep_parameters:
+                    self.cvParameters['CV_Loadings_q'] = cv_loadings_q
+                    self.cvParameters['CV_Loadings_p'] = cv_loadings_p
+                    self.cvParameters['CV_Weights_c'] = cv_weights_c
+                    self.cvParameters['CV_Weights_w'] = cv_weights_w
+                    self.cvParameters['CV_Rotations_ws'] = cv_rotations_ws
+                    self.cvParameters['CV_Rotations_cs'] = cv_rotations_cs
+                    self.cvParameters['CV_Train_Scores_t'] = cv_train_scores_t
+                    self.cvParameters['CV_Train_Scores_u'] = cv_train_scores_u
+                    self.cvParameters['CV_Test_Scores_t'] = cv_test_scores_t
+                    self.cvParameters['CV_Test_Scores_u'] = cv_test_scores_u
+                    self.cvParameters['CV_Beta'] = cv_betacoefs
+                    self.cvParameters['CV_VIPw'] = cv_vipsw
 
             return None
 
         except TypeError as terp:
             raise terp
 
+    def cv_sample_list(self, parameter):
+        """
+
+        Per sample cross-validation output (for example 'CV_TestScores_t' or 'CV_TestSamplePrediction') as lists of
+        (sample index, value) pairs for each cross-validation round. The cross_validation method stores these as arrays
+        [n_rounds, n_samples, ...] with NaN for the samples not used in a round.
+
+        :param str parameter: Key of the parameter in cvParameters (or in cvParameters['DA'])
+        :return: List (one per round) of lists of (sample index, value) tuples
+        :rtype: list
+        :raise AttributeError: If the model has not been cross-validated
+        :raise KeyError: If the parameter was not stored by the cross-validation (requires outputdist=True)
+        """
+        try:
+            if self.cvParameters is None:
+                raise AttributeError("Run cross_validation with outputdist=True first")
+            if parameter in self.cvParameters:
+                return _cv_sample_list(self.cvParameters[parameter])
+            return _cv_sample_list(self.cvParameters['DA'][parameter])
+
+        except AttributeError as atter:
+            raise atter
+        except KeyError as kerr:
+            raise kerr
+
     def permutation_test(self, x, y, nperms=1000, cv_method=KFold(n_splits=7, shuffle=True), **permtest_kwargs):
         """
 
@@ -944,7 +1040,7 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
             perm_rotations_cs = np.zeros((nperms, y_nvars, self.n_components))
             perm_rotations_ws = np.zeros((nperms, x_nvars, self.n_components))
             perm_beta = np.zeros((nperms, x_nvars, y_nvars))
-            perm_vipsw = np.zeros((nperms, x_nvars))
+            perm_ssy_comp = np.zeros((nperms, self.n_components))
 
             permuted_R2Y = np.zeros(nperms)
             permuted_R2X = np.zeros(nperms)
@@ -958,7 +1054,7 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
                 perm_y = np.random.permutation(y)
                 # ... Fit model and replace original data
                 permute_class.fit(x, perm_y, **permtest_kwargs)
-                permute_class.cross_validation(x, perm_y, cv_method=cv_method, **permtest_kwargs)
+                permute_class.cross_validation(x, perm_y, cv_method=cv_method, collect='metrics', **permtest_kwargs)
                 permuted_R2Y[permutation] = permute_class.modelParameters['R2Y']
                 permuted_R2X[permutation] = permute_class.modelParameters['R2X']
                 permuted_Q2Y[permutation] = permute_class.cvParameters['Q2Y']
@@ -972,23 +1068,15 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
                 perm_rotations_cs[permutation, :, :] = permute_class.rotations_cs
                 perm_rotations_ws[permutation, :, :] = permute_class.rotations_ws
                 perm_beta[permutation, :, :] = permute_class.beta_coeffs
-                perm_vipsw[permutation, :] = permute_class.VIP()
+                perm_ssy_comp[permutation, :] = permute_class.modelParameters['SSYcomp']
+            # VIP of all the permuted models in a single matrix product
+            perm_vipsw = _vip(perm_weights_w, perm_ssy_comp)
+
             # Align model parameters due to sign indeterminacy.
             # Solution provided is to select the sign that gives a more similar profile to the
             # Loadings calculated with the whole data.
-            for perm_round in range(0, nperms):
-                for currload in range(0, self.n_components):
-                    # evaluate based on loadings _p
-                    choice = np.argmin(np.array(
-                        [np.sum(np.abs(self.loadings_p[:, currload] - perm_loadings_p[perm_round, :, currload])),
-                         np.sum(np.abs(self.loadings_p[:, currload] - perm_loadings_p[perm_round, :, currload] * -1))]))
-                    if choice == 1:
-                        perm_loadings_p[perm_round, :, currload] = -1 * perm_loadings_p[perm_round, :, currload]
-                        perm_loadings_q[perm_round, :, currload] = -1 * perm_loadings_q[perm_round, :, currload]
-                        perm_weights_w[perm_round, :, currload] = -1 * perm_weights_w[perm_round, :, currload]
-                        perm_weights_c[perm_round, :, currload] = -1 * perm_weights_c[perm_round, :, currload]
-                        perm_rotations_ws[perm_round, :, currload] = -1 * perm_rotations_ws[perm_round, :, currload]
-                        perm_rotations_cs[perm_round, :, currload] = -1 * perm_rotations_cs[perm_round, :, currload]
+            _align_signs(self.loadings_p, perm_loadings_p, perm_loadings_q, perm_weights_w, perm_weights_c,
+                         perm_rotations_ws, perm_rotations_cs)
 
             # Pack everything into a nice data structure and return
             # Calculate p-value for Q2Y as well
@@ -1024,12 +1112,7 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
         :param x: Data matrix [n samples, m variables]
         :return: The residual Sum of Squares per sample
         """
-        pred_scores = self.transform(x)
-
-        x_reconstructed = self.x_scaler.transform(self.inverse_transform(pred_scores))
-        xscaled = self.x_scaler.transform(x)
-        residuals = np.sum(np.square(xscaled - x_reconstructed), axis=1)
-        return residuals
+        return self.score_samples(x)['RSS']
 
     def _cummulativefit(self, x, y):
         """
@@ -1040,7 +1123,8 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
         :param y: Data matrix to fit the PLS model.
         :type y: numpy.ndarray, shape [n_samples, n_features]
         :return: dictionary object containing the total Regression Sum of Squares and the Sum of Squares
-        per components, for both the X and Y data blocks.
+        per components, for both the X and Y data blocks, and the Y Sum of Squares per component for each
+        response ('SSYcompResponse', shape [n_components, n_responses]).
         :rtype: dict
         """
 
@@ -1065,12 +1149,14 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
 
             ypred = self.y_scaler.transform(ChemometricsPLS.predict(model, x, y=None))
             xpred = self.x_scaler.transform(ChemometricsPLS.predict(model, x=None, y=y))
-            rssy = np.sum(np.square(yscaled - ypred))
+            rssy_response = np.sum(np.square(yscaled - ypred), axis=0)
             rssx = np.sum(np.square(xscaled - xpred))
             ssx_comp.append(rssx)
-            ssy_comp.append(rssy)
+            ssy_comp.append(rssy_response)
 
-        cumulative_fit = {'SSX': SSX, 'SSY': SSY, 'SSXcomp': np.array(ssx_comp), 'SSYcomp': np.array(ssy_comp)}
+        ssy_comp = np.array(ssy_comp)
+        cumulative_fit = {'SSX': SSX, 'SSY': SSY, 'SSXcomp': np.array(ssx_comp), 'SSYcomp': ssy_comp.sum(axis=1),
+                          'SSYcompResponse': ssy_comp}
 
         return cumulative_fit
 
@@ -1179,7 +1265,7 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
             currmodel = deepcopy(self)
             currmodel.n_components = n_components
             currmodel.fit(x, y)
-            currmodel.cross_validation(x, y)
+            currmodel.cross_validation(x, y, collect='metrics')
             models.append(currmodel)
 
         q2 = np.array([x.cvParameters['PLS']['Q2Y'] for x in models])
@@ -1255,7 +1341,7 @@ class ChemometricsPLS(BaseEstimator, RegressorMixin, TransformerMixin):
                 currmodel = deepcopy(self)
                 currmodel.n_components = n_components
                 currmodel.fit(x, y)
-                currmodel.cross_validation(x, y, cv_method=cv_method, outputdist=False)
+                currmodel.cross_validation(x, y, cv_method=cv_method, outputdist=False, collect='metrics')
                 q2y[n_components - 1, rep] = currmodel.cvParameters['Q2Y']
 
         fig, ax = plt.subplots()
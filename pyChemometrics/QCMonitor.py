@@ -0,0 +1,239 @@
+import numpy as np
+import scipy.stats as st
+
+"""
+
+Real time quality control of incoming samples with a fitted ChemometricsPCA, ChemometricsPLS or
+ChemometricsOrthogonalPLS model.
+
+"""
+
+
+def _scaler_constants(scaler, n_features):
+    """
+    Column means and scales of a fitted ChemometricsScaler (or scikit-learn StandardScaler-like) object.
+    """
+    mean = np.zeros(n_features)
+    scale = np.ones(n_features)
+    if scaler is None:
+        return mean, scale
+    if getattr(scaler, 'with_mean', True) and getattr(scaler, 'mean_', None) is not None:
+        mean = mean + scaler.mean_
+    if getattr(scaler, 'with_std', True) and getattr(scaler, 'scale_', None) is not None:
+        scale = scale * scaler.scale_
+    return mean, scale
+
+
+class QCMonitor:
+    """
+
+    Streaming outlier and drift monitor for samples arriving one at a time (or in small batches) during
+    acquisition, built from a fitted model.
+
+    All the constants are calculated once when the monitor is created: the scaling is folded into the rotation
+    matrix, and the Hotelling T2 and DmodX limits are obtained from the F distribution. Scoring a sample then costs
+    O(n_features * n_components). For each sample the monitor:
+
+        - flags a 'T2' or 'DmodX' alert if the sample exceeds the limit at significance level alpha
+        - updates an exponentially weighted moving average (EWMA) of the T2 and DmodX, and flags a 'T2 Drift' or
+          'DmodX Drift' alert when the EWMA crosses its control limit. Drift alerts are only raised when the EWMA goes
+          out of control, not for every sample while it stays out.
+        - keeps the T2 and DmodX of the last window samples for the control chart statistics
+
+    Alerts are dictionaries with the 'sample' number (counting from 0 since the monitor was created or reset), the
+    alert 'type', the 'value' and the 'limit'. They are stored in the alerts attribute and passed to the callback.
+
+    :param model: Fitted ChemometricsPCA, ChemometricsPLS or ChemometricsOrthogonalPLS model
+    :param float alpha: Significance level of the T2 and DmodX limits
+    :param int window: Number of recent samples used for the control chart statistics
+    :param float ewma_lambda: Weight of the newest sample in the EWMA, between 0 and 1
+    :param float ewma_width: Width of the EWMA control limits, in standard deviations of the EWMA
+    :param callback: Function called with each alert
+    :raise AttributeError: If the model is not fitted
+    :raise ValueError: If the model has no S0 for the DmodX or the parameters are out of range
+
+    :Example:
+
+    >>> monitor = QCMonitor(pca_model, alpha=0.01, callback=print)
+    >>> for spectrum in acquisition:
+    >>>     monitor.update(spectrum)
+    """
+
+    def __init__(self, model, alpha=0.05, window=100, ewma_lambda=0.2, ewma_width=3, callback=None):
+        try:
+            if not 0 < alpha < 1:
+                raise ValueError("alpha must be between 0 and 1")
+            if not 0 < ewma_lambda <= 1:
+                raise ValueError("ewma_lambda must be between 0 and 1")
+            if window < 1:
+                raise ValueError("window must be a positive integer")
+
+            projection = model._projection_parameters()
+            if projection['s0'] is None:
+                raise ValueError("The model has no S0 to normalise the DmodX, fit it with diagnostics=True")
+
+            rotations = projection['rotations']
+            n_features, n_components = rotations.shape
+            reference_scores = projection['reference_scores']
+            n_samples = reference_scores.shape[0]
+
+            # Fold the scaling and the offset into a single centre and scale: scaled x = (x - centre) / scale
+            mean, scale = _scaler_constants(projection['scaler'], n_features)
+            if projection['offset'] is not None:
+                mean = mean + projection['offset'] * scale
+            self.centre = mean
+            self.inverse_scale = 1 / scale
+            self.rotations = np.ascontiguousarray(rotations)
+            self.loadings_t = np.ascontiguousarray(projection['loadings'].T)
+            self.score_variance = np.mean(reference_scores ** 2, axis=0)
+            self.s0 = projection['s0']
+            self.n_features = n_features
+            self.n_components = n_components
+
+            # Same limits as the hotelling_T2 and outlier methods of the models, with the training set size.
+            # As in outlier(measure='DmodX'), the normalised DmodX is compared directly with the F quantile
+            fs = (n_samples - 1) / n_samples * n_components * (n_samples ** 2 - 1) / \
+                 (n_samples * (n_samples - n_components))
+            self.t2_limit = fs * st.f.ppf(1 - alpha, n_components, n_samples - n_components)
+            self.dmodx_limit = st.f.ppf(1 - alpha, n_features - n_components,
+                                        (n_samples - n_components - 1) * (n_features - n_components))
+
+            # In control levels of the EWMA: the T2 of the training samples, and the DmodX distribution
+            # (sqrt(chi2(d)/d) when the denominator degrees of freedom are large)
+            reference_t2 = np.sum(reference_scores ** 2 / self.score_variance, axis=1)
+            dmodx_dist = st.chi(n_features - n_components)
+            ewma_sd = np.sqrt(ewma_lambda / (2 - ewma_lambda))
+            self.t2_target = float(np.mean(reference_t2))
+            self.dmodx_target = float(dmodx_dist.mean() / np.sqrt(n_features - n_components))
+            self.t2_ewma_limit = self.t2_target + ewma_width * ewma_sd * float(np.std(reference_t2))
+            self.dmodx_ewma_limit = self.dmodx_target + \
+                                    ewma_width * ewma_sd * float(dmodx_dist.std() / np.sqrt(n_features - n_components))
+
+            self.alpha = alpha
+            self.window = int(window)
+            self.ewma_lambda = ewma_lambda
+            self.callback = callback
+            self.reset()
+
+        except AttributeError as atter:
+            raise atter
+        except ValueError as verr:
+            raise verr
+
+    def reset(self):
+        """
+        Clear the sample count, the EWMA, the control chart window and the alerts.
+        """
+        self.n_samples = 0
+        self.alerts = list()
+        self.t2_ewma = self.t2_target
+        self.dmodx_ewma = self.dmodx_target
+        self._t2_window = np.zeros(self.window)
+        self._dmodx_window = np.zeros(self.window)
+        self._drifting = {'T2 Drift': False, 'DmodX Drift': False}
+
+    def score(self, x):
+        """
+
+        Calculate the scores, Hotelling T2 and normalised DmodX of new samples without updating the monitor.
+
+        :param x: Single sample [n_features] or batch of samples [n_samples, n_features]
+        :return: Dictionary with the 'Scores', 'T2' and 'DmodX' of each sample
+        :rtype: dict
+        :raise ValueError: If the number of variables does not match the model
+        """
+        try:
+            x = np.asarray(x, dtype=float)
+            if x.ndim == 1:
+                x = x.reshape(1, -1)
+            if x.shape[1] != self.n_features:
+                raise ValueError("The model expects {0} variables, got {1}".format(self.n_features, x.shape[1]))
+
+            scaled = (x - self.centre) * self.inverse_scale
+            scores = np.dot(scaled, self.rotations)
+            residuals = scaled - np.dot(scores, self.loadings_t)
+            rss = np.einsum('ij,ij->i', residuals, residuals)
+            t2 = np.dot(scores ** 2, 1 / self.score_variance)
+            dmodx = np.sqrt(rss / (self.n_features - self.n_components)) / self.s0
+
+            return {'Scores': scores, 'T2': t2, 'DmodX': dmodx}
+
+        except ValueError as verr:
+            raise verr
+
+    def _alert(self, alert_type, value, limit):
+        alert = {'sample': self.n_samples, 'type': alert_type, 'value': float(value), 'limit': float(limit)}
+        self.alerts.append(alert)
+        if self.callback is not None:
+            self.callback(alert)
+        return alert
+
+    def _drift(self, alert_type, ewma, limit, alerts):
+        if ewma > limit:
+            if not self._drifting[alert_type]:
+                alerts.append(self._alert(alert_type, ewma, limit))
+            self._drifting[alert_type] = True
+        else:
+            self._drifting[alert_type] = False
+
+    def update(self, x):
+        """
+
+        Score new samples, in order of acquisition, and update the monitor with them.
+
+        :param x: Single sample [n_features] or batch of samples [n_samples, n_features]
+        :return: Dictionary with the 'Scores', 'T2' and 'DmodX' of each sample and the 'Alerts' they raised
+        :rtype: dict
+        :raise ValueError: If the number of variables does not match the model
+        """
+        try:
+            result = self.score(x)
+            alerts = list()
+            keep = 1 - self.ewma_lambda
+            for t2, dmodx in zip(result['T2'], result['DmodX']):
+                if t2 > self.t2_limit:
+                    alerts.append(self._alert('T2', t2, self.t2_limit))
+                if dmodx > self.dmodx_limit:
+                    alerts.append(self._alert('DmodX', dmodx, self.dmodx_limit))
+
+                self.t2_ewma = self.ewma_lambda * t2 + keep * self.t2_ewma
+                self.dmodx_ewma = self.ewma_lambda * dmodx + keep * self.dmodx_ewma
+                self._drift('T2 Drift', self.t2_ewma, self.t2_ewma_limit, alerts)
+                self._drift('DmodX Drift', self.dmodx_ewma, self.dmodx_ewma_limit, alerts)
+
+                position = self.n_samples % self.window
+                self._t2_window[position] = t2
+                self._dmodx_window[position] = dmodx
+                self.n_samples += 1
+
+            result['Alerts'] = alerts
+            return result
+
+        except ValueError as verr:
+            raise verr
+
+    def statistics(self):
+        """
+
+        Control chart statistics of the most recent samples.
+
+        :return: Dictionary with the number of 'Samples' seen, the number in the 'Window', the mean and standard
+        deviation of the T2 and DmodX in the window ('T2 Mean', 'T2 SD', 'DmodX Mean', 'DmodX SD'), the fraction of
+        samples in the window over the limits ('T2 Exceedance', 'DmodX Exceedance', expected to be about alpha),
+        the current 'T2 EWMA' and 'DmodX EWMA' and the number of 'Alerts'
+        :rtype: dict
+        """
+        in_window = min(self.n_samples, self.window)
+        t2 = self._t2_window[:in_window]
+        dmodx = self._dmodx_window[:in_window]
+        if in_window == 0:
+            t2_stats = dmodx_stats = (np.nan, np.nan, np.nan)
+        else:
+            t2_stats = (np.mean(t2), np.std(t2), np.mean(t2 > self.t2_limit))
+            dmodx_stats = (np.mean(dmodx), np.std(dmodx), np.mean(dmodx > self.dmodx_limit))
+
+        return {'Samples': self.n_samples, 'Window': in_window,
+                'T2 Mean': float(t2_stats[0]), 'T2 SD': float(t2_stats[1]), 'T2 Exceedance': float(t2_stats[2]),
+                'DmodX Mean': float(dmodx_stats[0]), 'DmodX SD': float(dmodx_stats[1]),
+                'DmodX Exceedance': float(dmodx_stats[2]),
+                'T2 EWMA': float(self.t2_ewma), 'DmodX EWMA': float(self.dmodx_ewma), 'Alerts': len(self.alerts)}
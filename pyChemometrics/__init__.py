@@ -3,11 +3,12 @@ from .ChemometricsPLS import ChemometricsPLS
 from .ChemometricsScaler import ChemometricsScaler
 from .ChemometricsPLSDA import ChemometricsPLSDA
 from .ChemometricsOrthogonalPLS import ChemometricsOrthogonalPLS
+from .QCMonitor import QCMonitor
 
 __version__ = '0.1'
 
 __all__ = ['ChemometricsScaler', 'ChemometricsPCA', 'ChemometricsPLS',
-           'ChemometricsPLSDA', 'ChemometricsOrthogonalPLS']
+           'ChemometricsPLSDA', 'ChemometricsOrthogonalPLS', 'QCMonitor']
 
 """
 
@@ -0,0 +1,321 @@
+"""
+
+Numerical routines shared by the pyChemometrics model objects.
+
+"""
+import numpy as np
+
+
+def _row_blocks(n_rows, chunk_size=None):
+    """
+    Slices covering n_rows rows in blocks of at most chunk_size rows (a single block if chunk_size is None).
+    """
+    if chunk_size is None or chunk_size >= n_rows:
+        return [slice(0, n_rows)]
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+    return [slice(start, min(start + chunk_size, n_rows)) for start in range(0, n_rows, chunk_size)]
+
+
+def leverages(reference_scores, scores=None, chunk_size=None):
+    """
+
+    Leverage of each observation, h_i = t_i (T'T)^-1 t_i', where T are the scores of the observations used to fit
+    the model. Computed as row-wise quadratic forms, in O(n k^2) time and without forming the n x n hat matrix.
+
+    :param numpy.ndarray reference_scores: Scores of the training observations T, shape [n_samples, n_components]
+    :param numpy.ndarray scores: Scores of the observations to calculate the leverage for, for example new samples.
+    If None, the leverages of the training observations are returned.
+    :param int chunk_size: Number of observations processed at a time. If None, all at once.
+    :return: The leverage of each observation
+    :rtype: numpy.ndarray, shape [n_samples]
+    """
+    if scores is None:
+        scores = reference_scores
+    if scores.ndim == 1:
+        scores = scores.reshape(-1, 1)
+    inv_gram = np.linalg.inv(np.dot(reference_scores.T, reference_scores))
+
+    lev = np.empty(scores.shape[0])
+    for block in _row_blocks(scores.shape[0], chunk_size):
+        lev[block] = np.einsum('ij,ij->i', np.dot(scores[block], inv_gram), scores[block])
+    return lev
+
+
+def score_samples(x, rotations, loadings, reference_scores, s0=None, scaler=None, offset=None, chunk_size=1000):
+    """
+
+    Project observations on a fitted latent variable model and calculate their outlier diagnostics in a single pass.
+    The observations are processed in blocks of rows, reusing two preallocated [chunk_size, n_features] buffers, so
+    the memory used does not grow with the number of observations beyond the outputs.
+
+    The scores are T = (scaled X - offset) R and the X residuals E = (scaled X - offset) - T P'.
+
+    :param numpy.ndarray x: Data matrix [n_samples, n_features]
+    :param numpy.ndarray rotations: Rotation (R) matrix mapping the scaled data to the scores, [n_features, n_components]
+    :param numpy.ndarray loadings: Loadings (P) used to reconstruct the scaled data, [n_features, n_components]
+    :param numpy.ndarray reference_scores: Scores of the training observations, used for the Hotelling T2
+    :param float s0: Pooled residual standard deviation of the training set, to normalise the DmodX.
+    If None, the DmodX is not calculated (returned as NaN).
+    :param scaler: Fitted scaler applied to each block before projection, or None
+    :param numpy.ndarray offset: Vector subtracted from the scaled data before projection, for example the mean
+    removed by a scikit-learn PCA object. If None, no offset is removed.
+    :param int chunk_size: Number of observations processed at a time. If None, all at once.
+    :return: Dictionary with the 'Scores', the Hotelling 'T2', the normalised 'DmodX' and the residual sum of
+    squares 'RSS' of each observation
+    :rtype: dict
+    """
+    if x.ndim == 1:
+        x = x.reshape(-1, 1)
+    n_samples, n_features = x.shape
+    n_components = rotations.shape[1]
+
+    scores = np.empty((n_samples, n_components))
+    rss = np.empty(n_samples)
+    blocks = _row_blocks(n_samples, chunk_size)
+    buffer_rows = blocks[0].stop - blocks[0].start
+    scaled_buffer = np.empty((buffer_rows, n_features))
+    residual_buffer = np.empty((buffer_rows, n_features))
+
+    for block in blocks:
+        n_rows = block.stop - block.start
+        scaled = scaled_buffer[:n_rows]
+        residuals = residual_buffer[:n_rows]
+        scaled[...] = x[block]
+        if scaler is not None:
+            scaled = scaler.transform(scaled, copy=False)
+        if offset is not None:
+            scaled -= offset
+        np.dot(scaled, rotations, out=scores[block])
+        np.dot(scores[block], loadings.T, out=residuals)
+        np.subtract(scaled, residuals, out=residuals)
+        rss[block] = np.einsum('ij,ij->i', residuals, residuals)
+
+    # Hotelling T2 with the variance of each component in the training set, as in the hotelling_T2 methods
+    t2 = np.sum(scores ** 2 / np.mean(reference_scores ** 2, axis=0), axis=1)
+    if s0 is None:
+        dmodx = np.full(n_samples, np.nan)
+    else:
+        dmodx = np.sqrt(rss / (n_features - n_components)) / s0
+
+    return {'Scores': scores, 'T2': t2, 'DmodX': dmodx, 'RSS': rss}
+
+
+def centroid_distances(scores, centroids):
+    """
+
+    Squared euclidean distance between each observation and each centroid, computed as
+    ||t||^2 - 2 t M' + ||M||^2 with a single matrix product.
+
+    :param numpy.ndarray scores: Observations, shape [n_samples, n_components]
+    :param numpy.ndarray centroids: Centroids (for example, class means), shape [n_centroids, n_components]
+    :return: Squared distances
+    :rtype: numpy.ndarray, shape [n_samples, n_centroids]
+    """
+    distances = np.dot(scores, centroids.T)
+    distances *= -2
+    distances += np.einsum('ij,ij->i', scores, scores)[:, None]
+    distances += np.einsum('ij,ij->i', centroids, centroids)[None, :]
+    # Rounding can give tiny negative values for observations on a centroid
+    np.maximum(distances, 0, out=distances)
+    return distances
+
+
+def class_probabilities(decision):
+    """
+
+    Turn the decision function of a PLS-DA model into class membership scores that sum to one for each observation.
+    For two classes the decision is the predicted class value, clipped to [0, 1]. For more classes it is minus the
+    squared distance to each class centroid, and the scores are its softmax (a gaussian kernel on the distances).
+    These are not calibrated probabilities.
+
+    :param numpy.ndarray decision: Decision function, shape [n_samples] for two classes or [n_samples, n_classes]
+    :return: Class membership scores
+    :rtype: numpy.ndarray, shape [n_samples, n_classes]
+    """
+    if decision.ndim == 1:
+        positive = np.clip(decision, 0, 1)
+        return np.c_[1 - positive, positive]
+    log_kernel = decision / 2
+    log_kernel = log_kernel - np.max(log_kernel, axis=1, keepdims=True)
+    kernel = np.exp(log_kernel)
+    return kernel / np.sum(kernel, axis=1, keepdims=True)
+
+
+def class_means(scores, y, n_classes):
+    """
+
+    Mean scores of each class, accumulated in one pass over the observations.
+
+    :param numpy.ndarray scores: Scores, shape [n_samples, n_components]
+    :param numpy.ndarray y: Class labels, encoded as 0, 1, ..., n_classes - 1
+    :param int n_classes: Number of classes
+    :return: Class means (centroids)
+    :rtype: numpy.ndarray, shape [n_classes, n_components]
+    """
+    labels = np.asarray(y).ravel().astype(int)
+    sums = np.zeros((n_classes, scores.shape[1]))
+    np.add.at(sums, labels, scores)
+    counts = np.bincount(labels, minlength=n_classes)
+    return sums / counts[:, None]
+
+
+# False positive rates the ROC curves are interpolated to, and the AUC is integrated over
+roc_fpr_grid = np.linspace(0, 1, num=20)
+
+
+def roc_curves(y, class_score, fpr_grid=roc_fpr_grid):
+    """
+
+    One-vs-rest ROC curves and AUC of every class, from a single column-wise argsort of the class score matrix.
+    The curves keep the same points and thresholds as metrics.roc_curve (with drop_intermediate=True), and are
+    interpolated to fpr_grid, so curves of different models can be averaged. The AUC is the trapezoid area under
+    the curve interpolated to the 20 point roc_fpr_grid, which is the 'AUC' the models report. The exact rank-based
+    (Mann-Whitney) AUC, with tied scores given their average rank, is also returned.
+
+    :param numpy.ndarray y: Class labels, encoded as 0, 1, ..., n_classes - 1
+    :param numpy.ndarray class_score: Class scores, higher for the more likely classes. A vector [n_samples] (or a
+    single column) scores class 1 against class 0, a matrix [n_samples, n_classes] scores each class against the rest.
+    :param numpy.ndarray fpr_grid: False positive rates the ROC curves are interpolated to. If None, only the AUC is
+    calculated and the curves are returned as None.
+    :return: For two classes, the ROC curve as a (fpr_grid, tpr, thresholds) tuple, the AUC and the exact AUC.
+    Otherwise, a list with a [fpr_grid, tpr, thresholds] list per class, and lists with the AUC and the exact AUC of
+    each class.
+    :rtype: tuple
+    """
+    labels = np.asarray(y).ravel()
+    binary = class_score.ndim == 1 or class_score.shape[1] == 1
+    scores = class_score.reshape(-1, 1) if binary else class_score
+    classes = np.array([1]) if binary else np.arange(scores.shape[1])
+    n_samples, n_curves = scores.shape
+
+    # Sort all the columns at once, in decreasing score
+    order = np.argsort(-scores, axis=0, kind='mergesort')
+    sorted_scores = np.take_along_axis(scores, order, axis=0)
+    positive = labels[order] == classes[None, :]
+    tps = np.cumsum(positive, axis=0)
+    fps = np.arange(1, n_samples + 1)[:, None] - tps
+    n_pos = tps[-1]
+    n_neg = n_samples - n_pos
+
+    # First and last position of each group of tied scores
+    last = np.ones((n_samples, n_curves), dtype=bool)
+    last[:-1] = sorted_scores[:-1] != sorted_scores[1:]
+    first = np.ones((n_samples, n_curves), dtype=bool)
+    first[1:] = last[:-1]
+    position = np.arange(n_samples)[:, None]
+    group_start = np.maximum.accumulate(np.where(first, position, 0), axis=0)
+    group_end = np.minimum.accumulate(np.where(last, position, n_samples)[::-1], axis=0)[::-1]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Average ascending rank (1 based) of each sorted position
+        ranks = n_samples - (group_start + group_end) / 2
+        exact_auc = (np.sum(ranks * positive, axis=0) - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+
+    curves = list()
+    auc = list()
+    for curve in range(n_curves):
+        # The curve only moves at the end of a group of tied scores. As in metrics.roc_curve, the points in the
+        # middle of a straight segment are dropped
+        ends = np.flatnonzero(last[:, curve])
+        if ends.size > 2:
+            corners = np.logical_or(np.diff(fps[ends, curve], 2), np.diff(tps[ends, curve], 2))
+            ends = ends[np.r_[True, corners, True]]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fpr = np.r_[0, fps[ends, curve]] / n_neg[curve]
+            tpr = np.r_[0, tps[ends, curve]] / n_pos[curve]
+        auc.append(float(np.trapz(np.interp(roc_fpr_grid, fpr, tpr), roc_fpr_grid)))
+        if fpr_grid is not None:
+            thresholds = np.r_[np.inf, sorted_scores[ends, curve]]
+            curves.append([fpr_grid, np.interp(fpr_grid, fpr, tpr), thresholds])
+
+    exact_auc = [float(area) for area in exact_auc]
+    if fpr_grid is None:
+        curves = None
+    elif binary:
+        curves = tuple(curves[0])
+    if binary:
+        return curves, auc[0], exact_auc[0]
+    return curves, auc, exact_auc
+
+
+def cv_sample_list(values):
+    """
+
+    Per sample values of a cross-validation, stored as an array [n_rounds, n_samples, ...] with NaN for the samples
+    left out of each round, as a list with the (sample index, value) pairs of the samples used in each round.
+
+    :param numpy.ndarray values: Per sample values of each cross-validation round, NaN for the samples not used
+    :return: List (one per round) of lists of (sample index, value) tuples
+    :rtype: list
+    """
+    samples = list()
+    for round_values in values:
+        used = ~np.all(np.isnan(round_values.reshape(round_values.shape[0], -1)), axis=1)
+        index = np.flatnonzero(used)
+        samples.append([*zip(index, round_values[index])])
+    return samples
+
+
+def align_signs(reference, parameter, *others):
+    """
+
+    Align the signs of the components of a set of cross-validated or permuted models to a reference model, in
+    place. The sign of each component of each model is chosen to give the smallest L1 distance between the compared
+    parameter (usually the X loadings) and the reference, for all the models and components at once. The same signs
+    are applied to the other parameters.
+
+    :param numpy.ndarray reference: Parameter of the reference model, shape [n_features, n_components]
+    :param numpy.ndarray parameter: Same parameter for each model, shape [n_models, n_features, n_components]
+    :param numpy.ndarray others: Other parameters of each model, with the models on the first axis and the components on
+    the last axis, for example weights [n_models, n_features, n_components] or scores [n_models, n_samples, n_components]
+    :return: The sign applied to each component of each model
+    :rtype: numpy.ndarray, shape [n_models, n_components]
+    """
+    same = np.sum(np.abs(reference[None, :, :] - parameter), axis=1)
+    flipped = np.sum(np.abs(reference[None, :, :] + parameter), axis=1)
+    signs = np.where(flipped < same, -1.0, 1.0)
+
+    apply_signs(signs, parameter, *others)
+    return signs
+
+
+def apply_signs(signs, *values):
+    """
+
+    Multiply each component of each model by its sign, in place.
+
+    :param numpy.ndarray signs: Sign of each component of each model, shape [n_models, n_components], as returned by
+    align_signs
+    :param numpy.ndarray values: Parameters of each model, with the models on the first axis and the components on the
+    last axis
+    """
+    for value in values:
+        value *= signs.reshape((signs.shape[0],) + (1,) * (value.ndim - 2) + (signs.shape[1],))
+
+
+def vip(weights, ssy_comp):
+    """
+
+    Variable importance for projection (VIP) from the squared X weights, as a single matrix product
+    VIP = sqrt(n_features * W^2 SSY / sum(SSY)). Stacked weights of several models (for example the cross-validation
+    rounds or the permuted models) are handled in the same product.
+
+    :param numpy.ndarray weights: X weights, shape [n_features, n_components], or [n_models, n_features, n_components]
+    :param numpy.ndarray ssy_comp: Y sum of squares of each component, shape [n_components] (or [n_models, n_components]
+    for stacked weights). With a trailing response axis, [n_components, n_responses] (or
+    [n_models, n_components, n_responses]), a VIP is calculated for each response.
+    :return: VIP of each variable, and of each model and response if given
+    :rtype: numpy.ndarray, shape [n_features], [n_models, n_features] or with a trailing [n_responses] axis
+    """
+    weights = np.asarray(weights, dtype=float)
+    ssy_comp = np.asarray(ssy_comp, dtype=float)
+    per_response = ssy_comp.ndim == weights.ndim
+    if not per_response:
+        ssy_comp = ssy_comp[..., None]
+
+    vip_values = np.sqrt(weights.shape[-2] * np.matmul(np.square(weights), ssy_comp) /
+                         np.sum(ssy_comp, axis=-2, keepdims=True))
+    if per_response:
+        return vip_values
+    return vip_values[..., 0]
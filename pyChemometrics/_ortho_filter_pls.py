@@ -246,14 +246,17 @@ class _orthogonal_pls(six.with_metaclass(ABCMeta), BaseEstimator, TransformerMix
                 c_ss_red = np.dot(c_ortho_red.T, c_ortho_red)
                 u_ortho = np.divide(np.dot(Yk_red, c_ortho_red),c_ss_red)
             # End here
-                
+            # An orthogonal component can have exactly no covariance with Y (c_ortho = 0), then it has no Y scores
+            if not np.all(np.isfinite(u_ortho)):
+                u_ortho = np.zeros_like(u_ortho)
+
             # test for null variance on X
             if np.dot(x_scores.T, x_scores) < np.finfo(np.double).eps or np.dot(t_ortho.T, t_ortho) < np.finfo(np.double).eps:
                 warnings.warn('X scores are null at iteration %s' % k)
                 break
             
-            # test for null variance on Y
-            if np.dot(y_scores.T, y_scores) < np.finfo(np.double).eps or np.dot(u_ortho.T, u_ortho) < np.finfo(np.double).eps:
+            # test for null variance on Y (the orthogonal Y scores can be null, see above)
+            if np.dot(y_scores.T, y_scores) < np.finfo(np.double).eps:
                 warnings.warn('Y scores are null at iteration %s' % k)
                 break
 
@@ -0,0 +1,209 @@
+import os
+import sys
+from contextlib import contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from scipy import sparse
+from threadpoolctl import threadpool_limits
+
+"""
+Helpers shared by the parallel (joblib) entry points of pyChemometrics and power_analysis.
+"""
+
+
+def available_cores():
+    """
+    Number of cores this process is allowed to run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def thread_budget(n_jobs=-1, inner_threads=None, n_tasks=None):
+    """
+
+    Split the available cores between joblib worker processes and the BLAS/OpenMP threads used inside each worker,
+    so that n_jobs * inner_threads does not exceed the number of cores.
+
+    If inner_threads is None, the number of processes follows n_jobs (with the joblib convention for negative
+    values, capped by the number of tasks) and the remaining cores are given to the BLAS threads. If inner_threads is
+    given and n_jobs is negative, the number of processes is chosen to fill the remaining cores.
+
+    :param int n_jobs: Number of worker processes, negative values count back from the number of cores as in joblib
+    :param int inner_threads: Number of BLAS/OpenMP threads per worker, or None to choose automatically
+    :param int n_tasks: Number of tasks to run, there is no point in starting more processes than tasks
+    :return: Dictionary with the number of 'n_jobs', 'inner_threads' and available 'cores'
+    :rtype: dict
+    """
+    try:
+        n_cores = available_cores()
+        if n_jobs is None or n_jobs == 0:
+            n_jobs = 1
+        if inner_threads is not None:
+            inner_threads = int(inner_threads)
+            if inner_threads < 1:
+                raise ValueError("inner_threads must be a positive integer")
+
+        if n_jobs < 0:
+            if inner_threads is not None:
+                n_jobs = n_cores // inner_threads
+            else:
+                n_jobs = n_cores + 1 + n_jobs
+        n_jobs = max(1, n_jobs)
+        if n_tasks is not None:
+            n_jobs = max(1, min(n_jobs, n_tasks))
+
+        if inner_threads is None:
+            inner_threads = max(1, n_cores // n_jobs)
+
+        return {'n_jobs': int(n_jobs), 'inner_threads': int(inner_threads), 'cores': int(n_cores)}
+
+    except TypeError as terp:
+        raise terp
+    except ValueError as verr:
+        raise verr
+    except Exception as exp:
+        raise exp
+
+
+def call_with_thread_limit(function, inner_threads, *args, **kwargs):
+    """
+
+    Call function with the BLAS/OpenMP thread pools limited to inner_threads. Meant to be wrapped with
+    joblib.delayed, so the limit is applied inside the worker process.
+
+    :param function: Function to call
+    :param int inner_threads: Maximum number of threads in each thread pool, None for no limit
+    :return: The return value of function
+    """
+    with threadpool_limits(limits=inner_threads):
+        return function(*args, **kwargs)
+
+
+class SharedArrays:
+    """
+
+    Owner of a set of numpy arrays (and scipy sparse matrices) placed in shared memory, so parallel workers can attach
+    them without copying or writing them to disk. Use it as a context manager: the shared memory blocks are released
+    when the block exits, also if an exception is raised.
+
+    The handles attribute is a small, picklable dictionary describing the shared arrays. Pass it to the workers and
+    use :py:func:`attach_shared_arrays` inside them to get the arrays back.
+
+    :Example:
+
+    >>> with SharedArrays() as shared:
+    >>>     shared.add('data', data)
+    >>>     output = Parallel(n_jobs=4)(delayed(worker)(shared.handles, idx) for idx in range(10))
+    """
+
+    def __init__(self):
+        self.handles = dict()
+        self._blocks = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _share(self, array):
+        array = np.ascontiguousarray(array)
+        block = SharedMemory(create=True, size=max(array.nbytes, 1))
+        self._blocks.append(block)
+        shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        shared_array[...] = array
+        return {'name': block.name, 'shape': array.shape, 'dtype': array.dtype.str, 'pid': os.getpid()}
+
+    def add(self, name, array):
+        """
+
+        Copy an array or sparse matrix into shared memory.
+
+        :param str name: Name used to retrieve the array in the workers
+        :param array: numpy.ndarray or scipy.sparse matrix (stored in CSC format)
+        :return: The handle of the shared array
+        """
+        try:
+            if sparse.issparse(array):
+                array = sparse.csc_matrix(array)
+                handle = {'format': 'csc', 'shape': array.shape, 'data': self._share(array.data),
+                          'indices': self._share(array.indices), 'indptr': self._share(array.indptr)}
+            else:
+                handle = self._share(array)
+            self.handles[name] = handle
+            return handle
+
+        except Exception as exp:
+            self.close()
+            raise exp
+
+    def close(self):
+        """
+        Release and remove all the shared memory blocks.
+        """
+        for block in self._blocks:
+            try:
+                block.close()
+            except BufferError:
+                # numpy views of the block are still alive, the mapping is released when they are garbage collected
+                pass
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+        self._blocks = list()
+        self.handles = dict()
+
+
+def _attach(handle, blocks):
+    # The block belongs to the process that created it, attaching must not leave it registered with a resource
+    # tracker that would remove it when a worker exits. Processes started by the creator (joblib or multiprocessing
+    # workers) share its tracker, where the block is already registered, so only a process that runs its own
+    # tracker unregisters it
+    if sys.version_info >= (3, 13):
+        block = SharedMemory(name=handle['name'], track=False)
+    else:
+        block = SharedMemory(name=handle['name'])
+        own_tracker = getattr(resource_tracker._resource_tracker, '_pid', None) is not None
+        if os.name == 'posix' and own_tracker and os.getpid() != handle.get('pid'):
+            resource_tracker.unregister(block._name, 'shared_memory')
+    blocks.append(block)
+    array = np.ndarray(handle['shape'], dtype=np.dtype(handle['dtype']), buffer=block.buf)
+    # Read only, so a worker cannot corrupt the data seen by the others
+    array.flags.writeable = False
+    return array
+
+
+@contextmanager
+def attach_shared_arrays(handles):
+    """
+
+    Attach the arrays described by the handles of a :py:class:`SharedArrays` object, without copying them.
+    The arrays are read only, and only valid inside the with block.
+
+    :param dict handles: The handles attribute of a SharedArrays object
+    :return: Dictionary with the shared arrays, by name
+    """
+    blocks = list()
+    arrays = dict()
+    try:
+        for name, handle in handles.items():
+            if handle.get('format', None) == 'csc':
+                arrays[name] = sparse.csc_matrix((_attach(handle['data'], blocks), _attach(handle['indices'], blocks),
+                                                  _attach(handle['indptr'], blocks)), shape=tuple(handle['shape']),
+                                                 copy=False)
+            else:
+                arrays[name] = _attach(handle, blocks)
+        yield arrays
+    finally:
+        arrays.clear()
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                pass